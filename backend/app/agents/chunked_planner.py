@@ -0,0 +1,265 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+import logging
+
+from pydantic import ValidationError
+
+from app.models.schemas import TripPlanRequest, TripPlan, DayPlan, Budget, Attraction, POI, Location
+from app.agents.plan_parser import parse_object
+from app.services.itinerary_optimizer import plan_routes
+
+logger = logging.getLogger(__name__)
+
+# 长行程分块规划: 先用一次轻量调用筛选候选景点,由本地路线优化器分配到每天并排好顺序,
+# 再为每天并发生成 DayPlan,最后按确定的规则合并并计算预算。输出 token 数不再随天数线性增长。
+
+ALLOCATION_AGENT_PROMPT = """你是景点筛选专家。你的任务是从候选景点中挑选适合用户的景点。
+
+**输出格式:**
+只返回以下JSON,不要输出其他内容:
+{
+  "attractions": [
+    {"name": "景点名称", "address": "地址", "location": {"longitude": 0, "latitude": 0}, "visit_duration": 120}
+  ],
+  "overall_suggestions": "总体建议(100字以内)"
+}
+
+**筛选要求:**
+1. 按推荐程度从高到低排列,越符合用户偏好越靠前
+2. 景点不要重复,只使用候选景点中的景点,保留其坐标
+3. visit_duration 为建议游览时间(分钟)
+4. 不需要分配到每一天,分天和游览顺序由系统根据位置计算
+"""
+
+DAY_PLANNER_AGENT_PROMPT = """你是单日行程规划专家。你的任务是根据分配好的景点生成某一天的详细行程。
+
+**输出格式:**
+只返回以下JSON,不要输出其他内容:
+{
+  "date": "YYYY-MM-DD",
+  "day_index": 0,
+  "description": "行程描述",
+  "transportation": "交通方式",
+  "accommodation": "住宿安排",
+  "hotel": {
+    "name": "酒店名称",
+    "address": "地址",
+    "estimated_cost": 0
+  },
+  "attractions": [
+    {
+      "name": "景点名称",
+      "address": "地址",
+      "location": {"longitude": 0, "latitude": 0},
+      "visit_duration": 60,
+      "description": "描述",
+      "ticket_price": 0
+    }
+  ],
+  "meals": [
+    {
+      "type": "lunch",
+      "name": "餐厅名称",
+      "estimated_cost": 0
+    }
+  ]
+}
+
+**规划要求:**
+1. 只安排给定的景点,保持给定的游览顺序(路线已优化),保留其名称、地址、坐标和游览时间
+2. 包含早中晚三餐
+3. 包含酒店信息,酒店价格符合住宿类型
+4. 门票和餐饮费用为纯数字(元)
+"""
+
+# 未给出游览时间的景点按此估算(分钟)
+DEFAULT_VISIT_DURATION = 120
+# 每天安排的景点数,用于确定候选景点数量
+ATTRACTIONS_PER_DAY = 3
+
+# 不同交通方式的每日交通费用估算(元),按关键词匹配
+TRANSPORT_DAILY_COST = (
+    (("自驾", "租车"), 200),
+    (("打车", "出租", "网约车"), 150),
+    (("地铁", "公交", "公共交通"), 40),
+    (("步行", "骑行"), 10),
+)
+DEFAULT_TRANSPORT_DAILY_COST = 60
+
+def trip_dates(request: TripPlanRequest) -> List[str]:
+    """请求日期范围内每天的日期,开始日期不是 ISO 格式时使用相对日期(如"下周一起第1天")"""
+    try:
+        start = date.fromisoformat(request.start_date.strip())
+    except ValueError:
+        return [f"{request.start_date}起第{i + 1}天" for i in range(request.days)]
+    return [(start + timedelta(days=i)).isoformat() for i in range(request.days)]
+
+def build_allocation_query(request: TripPlanRequest, attraction_response: str) -> str:
+    return f"""
+请从以下候选景点中为{request.city}的{request.days}天行程挑选约{request.days * ATTRACTIONS_PER_DAY}个景点:
+
+**用户需求:**
+- 天数: {request.days}天
+- 偏好: {request.preferences}
+- 交通方式: {request.transportation}
+
+**候选景点:**
+{attraction_response}
+"""
+
+def _parse_candidate(item: Any) -> Attraction:
+    data = {"description": "", "visit_duration": DEFAULT_VISIT_DURATION, **item}
+    if not isinstance(data["visit_duration"], int) or data["visit_duration"] <= 0:
+        data["visit_duration"] = DEFAULT_VISIT_DURATION
+    return Attraction(**data)
+
+def poi_attraction(poi: POI) -> Attraction:
+    """把有坐标的POI转换为待排路线的景点,游览时间按默认值估算"""
+    return Attraction(
+        name=poi.name,
+        address=poi.address,
+        location=poi.location,
+        visit_duration=DEFAULT_VISIT_DURATION,
+        description="",
+        rating=poi.rating,
+    )
+
+def parse_allocation(text: str, days: int, hotel: Optional[Location] = None) -> Dict[str, Any]:
+    """
+    解析候选景点并用路线优化器分配到各天,返回 {"days": [每天按顺序排列的景点], "overall_suggestions": str}
+    缺少坐标等无效的候选景点被跳过,超出每日游览时间预算的低优先级景点被舍弃。
+    给定酒店坐标时,每天的路线按从酒店出发并返回优化
+    """
+    try:
+        data = parse_object(text)
+    except ValueError as e:
+        logger.warning(f"景点筛选结果无法解析,按空分配处理: {e}")
+        data = {}
+
+    candidates: List[Attraction] = []
+    seen = set()
+    for item in data.get("attractions") or []:
+        try:
+            attraction = _parse_candidate(item)
+        except (TypeError, ValidationError) as e:
+            logger.warning(f"跳过无效的候选景点: {e}")
+            continue
+        if attraction.name not in seen:
+            seen.add(attraction.name)
+            candidates.append(attraction)
+
+    return {
+        "days": plan_routes(candidates, days, hotel=hotel),
+        "overall_suggestions": str(data.get("overall_suggestions") or ""),
+    }
+
+def render_stops(attractions: List[Attraction]) -> str:
+    """按游览顺序列出一天的景点"""
+    return "\n".join(
+        f"{i + 1}. {a.name} | {a.address} | 经度{a.location.longitude},纬度{a.location.latitude} | {a.visit_duration}分钟"
+        for i, a in enumerate(attractions)
+    ) or "- (未分配景点,请安排城市漫步或自由活动)"
+
+def render_routes(dates: List[str], routes: List[List[Attraction]]) -> str:
+    """按天列出路线优化器分好组、排好顺序的景点"""
+    return "\n\n".join(
+        f"第{i + 1}天({day_date}):\n{render_stops(route)}"
+        for i, (day_date, route) in enumerate(zip(dates, routes))
+    )
+
+def build_day_query(
+    request: TripPlanRequest,
+    day_index: int,
+    day_date: str,
+    attractions: List[Attraction],
+    hotel_response: str
+) -> str:
+    return f"""
+请生成{request.city}旅行第{day_index + 1}天({day_date})的详细行程:
+
+**用户需求:**
+- 日期: {day_date}
+- day_index: {day_index}
+- 偏好: {request.preferences}
+- 预算: {request.budget}
+- 交通方式: {request.transportation}
+- 住宿类型: {request.accommodation}
+
+**当日景点(按游览顺序):**
+{render_stops(attractions)}
+
+**候选酒店:**
+{hotel_response}
+"""
+
+def parse_day_plan(text: str, day_index: int, day_date: str) -> DayPlan:
+    """
+    解析单日行程,日期和序号以分配结果为准
+
+    景点顺序在生成前已由 plan_routes 优化并要求模型保持,这里不再调整,
+    否则当天的描述和交通安排会与景点顺序对不上
+    """
+    data = parse_object(text)
+    data["day_index"] = day_index
+    data["date"] = day_date
+    try:
+        return DayPlan(**data)
+    except ValidationError as e:
+        raise ValueError(f"第{day_index + 1}天行程校验失败: {e}")
+
+def fallback_day_plan(
+    request: TripPlanRequest,
+    day_index: int,
+    day_date: str,
+    attractions: List[Attraction]
+) -> DayPlan:
+    """单日生成失败时的占位行程:保留分配好的景点和路线"""
+    return DayPlan(
+        date=day_date,
+        day_index=day_index,
+        description="游览" + "、".join(a.name for a in attractions) if attractions else "自由活动",
+        transportation=request.transportation,
+        accommodation=request.accommodation,
+        attractions=attractions,
+    )
+
+def daily_transport_cost(transportation: str) -> int:
+    for keywords, cost in TRANSPORT_DAILY_COST:
+        if any(keyword in transportation for keyword in keywords):
+            return cost
+    return DEFAULT_TRANSPORT_DAILY_COST
+
+def compute_budget(days: List[DayPlan], transportation: str) -> Budget:
+    """
+    根据每日行程确定性地计算预算:
+    门票与餐饮逐项求和,酒店按住宿晚数(天数-1,至少1晚)计算,交通按交通方式的每日估算
+    """
+    total_attractions = sum(a.ticket_price for day in days for a in day.attractions)
+    total_meals = sum(meal.estimated_cost for day in days for meal in day.meals)
+    nights = days[:max(1, len(days) - 1)]
+    total_hotels = sum(day.hotel.estimated_cost for day in nights if day.hotel is not None)
+    total_transportation = daily_transport_cost(transportation) * len(days)
+    return Budget(
+        total_attractions=total_attractions,
+        total_hotels=total_hotels,
+        total_meals=total_meals,
+        total_transportation=total_transportation,
+        total=total_attractions + total_hotels + total_meals + total_transportation,
+    )
+
+def merge_day_plans(
+    request: TripPlanRequest,
+    days: List[DayPlan],
+    overall_suggestions: str
+) -> TripPlan:
+    """合并各天的行程为完整计划,天气由调用方单独补充"""
+    ordered = sorted(days, key=lambda day: day.day_index)
+    return TripPlan(
+        city=request.city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        days=ordered,
+        weather_info=[],
+        overall_suggestions=overall_suggestions,
+        budget=compute_budget(ordered, request.transportation),
+    )
@@ -0,0 +1,238 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from pydantic import BaseModel, ValidationError
+
+from app.models.schemas import TripPlan, DayPlan, WeatherInfo, Budget
+from hello_agents import metrics
+
+logger = logging.getLogger(__name__)
+
+# 需要逐项校验并推送的数组字段
+_ITEM_MODELS = {"days": DayPlan, "weather_info": WeatherInfo}
+
+# 字符串之外的 "16°C" / "16℃" / "16°" 温度写法
+_TEMPERATURE = re.compile(r"(-?\d+(?:\.\d+)?)\s*(?:°C|℃|°)")
+
+class _Frame:
+    """扫描过程中的一层容器(对象或数组)"""
+
+    __slots__ = ("kind", "key", "start", "expect_key", "pending_key")
+
+    def __init__(self, kind: str, key: Optional[str], start: int):
+        self.kind = kind
+        self.key = key
+        self.start = start
+        self.expect_key = kind == "{"
+        self.pending_key: Optional[str] = None
+
+def repair_json(text: str) -> str:
+    """
+    修复LLM输出中常见的JSON缺陷(只处理字符串之外的内容):
+    - 对象/数组末尾多余的逗号
+    - 未加引号的 "16°C" 温度
+    """
+    out: List[str] = []
+    i, n = 0, len(text)
+    in_string = escape = False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in "}]":
+                i += 1
+                continue
+        elif ch.isdigit() or ch == "-":
+            match = _TEMPERATURE.match(text, i)
+            if match:
+                out.append(match.group(1))
+                i = match.end()
+                continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+class PlanStreamParser:
+    """
+    增量解析规划Agent的输出
+
+    逐段喂入LLM的文本，自动定位JSON对象(无论是否包在代码块中)，
+    每当 days[i] / weather_info[i] 完整时立即校验并返回，对象结束后的多余内容会被忽略。
+    输出被截断时，`finish` 会回退到最后一个完整的值并补齐括号。
+    """
+
+    def __init__(self, validate_items: bool = True):
+        self.buffer = ""
+        # 为 False 时只定位JSON对象,不逐项校验 days / weather_info
+        self.validate_items = validate_items
+        self.root_start: Optional[int] = None
+        self.root_end: Optional[int] = None
+        self.items: Dict[str, List[BaseModel]] = {key: [] for key in _ITEM_MODELS}
+
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        # 截断时可安全回退的位置,以及此时需要补齐的括号
+        self._safe_point: Optional[Tuple[int, str]] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, BaseModel]]:
+        """喂入一段文本，返回本次新完成并通过校验的 (字段名, 模型) 列表"""
+        self.buffer += chunk
+        completed: List[Tuple[str, BaseModel]] = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and self.root_end is None:
+            i = self._pos
+            ch = buf[i]
+            self._pos += 1
+
+            if self.root_start is None:
+                if ch == "{":
+                    self.root_start = i
+                    self._stack.append(_Frame("{", None, i))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buf[self._string_start + 1:i]
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and frame.kind == "{":
+                frame.pending_key = self._last_string
+                frame.expect_key = False
+            elif ch == ",":
+                if frame.kind == "{":
+                    frame.expect_key = True
+                self._mark_safe(i)
+            elif ch in "{[":
+                key = frame.pending_key if frame.kind == "{" else frame.key
+                self._stack.append(_Frame(ch, key, i))
+            elif ch in "}]":
+                closed = self._stack.pop()
+                if not self._stack:
+                    self.root_end = i + 1
+                    break
+                self._mark_safe(i + 1)
+                item = self._complete_item(closed, i)
+                if item is not None:
+                    completed.append(item)
+
+        return completed
+
+    def _mark_safe(self, index: int):
+        closers = "".join("}" if f.kind == "{" else "]" for f in reversed(self._stack))
+        self._safe_point = (index, closers)
+
+    def _complete_item(self, frame: _Frame, end: int) -> Optional[Tuple[str, BaseModel]]:
+        # 只处理根对象下 days / weather_info 数组中的对象元素
+        if not self.validate_items or frame.kind != "{" or len(self._stack) != 2:
+            return None
+        parent = self._stack[-1]
+        if parent.kind != "[" or parent.key not in _ITEM_MODELS:
+            return None
+
+        model = self._validate(parent.key, self.buffer[frame.start:end + 1])
+        if model is None:
+            return None
+        self.items[parent.key].append(model)
+        return parent.key, model
+
+    @staticmethod
+    def _validate(field: str, text: str) -> Optional[BaseModel]:
+        try:
+            return _ITEM_MODELS[field](**json.loads(repair_json(text)))
+        except (ValueError, TypeError, ValidationError) as e:
+            logger.warning(f"跳过无效的{field}元素: {e}")
+            metrics.STAGE_ERRORS.inc(stage=f"plan_parse.{field}")
+            return None
+
+    def _root_text(self) -> str:
+        if self.root_start is None:
+            raise ValueError("输出中未找到JSON对象")
+        if self.root_end is not None:
+            return self.buffer[self.root_start:self.root_end]
+
+        # 输出被截断:回退到最后一个完整的值并补齐括号
+        if self._safe_point is None:
+            raise ValueError("JSON输出被截断且没有可恢复的内容")
+        index, closers = self._safe_point
+        logger.warning("规划输出被截断,已回退到最后一个完整的值")
+        return self.buffer[self.root_start:index] + closers
+
+    def finish(self, defaults: Optional[Dict[str, Any]] = None) -> TripPlan:
+        """
+        解析完整计划。逐项校验失败的元素会被丢弃，
+        缺失的顶层字段使用 defaults(如请求中的城市和日期)补齐。
+        """
+        data = json.loads(repair_json(self._root_text()))
+        if not isinstance(data, dict):
+            raise ValueError("规划输出不是JSON对象")
+
+        for key, value in (defaults or {}).items():
+            data.setdefault(key, value)
+
+        # 已在流式过程中校验过的元素直接复用
+        for field in _ITEM_MODELS:
+            raw_items = data.get(field) or []
+            if len(self.items[field]) < len(raw_items):
+                self.items[field] = [
+                    model for model in (
+                        self._validate(field, json.dumps(item, ensure_ascii=False)) for item in raw_items
+                    ) if model is not None
+                ]
+            data[field] = self.items[field]
+
+        budget = data.get("budget")
+        if isinstance(budget, dict):
+            try:
+                data["budget"] = Budget(**budget)
+            except ValidationError as e:
+                logger.warning(f"忽略无效的预算信息: {e}")
+                data["budget"] = None
+
+        data.setdefault("overall_suggestions", "")
+        return TripPlan(**data)
+
+def parse_plan(text: str, defaults: Optional[Dict[str, Any]] = None) -> TripPlan:
+    """一次性解析完整的规划输出"""
+    parser = PlanStreamParser()
+    parser.feed(text)
+    return parser.finish(defaults)
+
+def parse_object(text: str) -> Dict[str, Any]:
+    """定位并解析输出中的第一个JSON对象(修复常见缺陷,截断时回退到最后一个完整的值)"""
+    parser = PlanStreamParser(validate_items=False)
+    parser.feed(text)
+    data = json.loads(repair_json(parser._root_text()))
+    if not isinstance(data, dict):
+        raise ValueError("输出不是JSON对象")
+    return data
@@ -1,73 +1,28 @@
-import json
-from typing import List, Dict, Any
-from hello_agents.core import SimpleAgent, HelloAgentsLLM
-from hello_agents.tools import MCPTool
-from app.models.schemas import TripPlanRequest, TripPlan, DayPlan, WeatherInfo, Budget
+import asyncio
+import os
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
+from hello_agents.core import SimpleAgent, HelloAgentsLLM, estimate_tokens
+from hello_agents.tools import Tool
+from hello_agents.workflow import Workflow, Step, WorkflowResult
+from hello_agents import metrics
+from app.models.schemas import TripPlanRequest, TripPlan, DayPlan, WeatherInfo, Attraction, POI, Location
 from app.config import get_settings
+from app.services.poi_digest import (
+    PoiDigest, build_digest, render_digest, split_keywords, CANDIDATES_PER_DAY, MAX_HOTELS, NEARBY_HOTELS
+)
+from app.services.itinerary_optimizer import plan_routes
+from app.services.poi_index import PoiIndex
+from app.services.plan_cache import PlanCache, redate_plan
+from app.services.amap_parser import parse_weather_forecasts, parse_pois
+from app.services.amap_mcp import create_tool_cache, create_mcp_tool
+from app.agents.plan_parser import PlanStreamParser, parse_plan
+from app.agents.chunked_planner import (
+    ALLOCATION_AGENT_PROMPT, DAY_PLANNER_AGENT_PROMPT,
+    trip_dates, build_allocation_query, parse_allocation, build_day_query, parse_day_plan,
+    fallback_day_plan, merge_day_plans, poi_attraction, render_routes
+)
 
 # Prompts
-ATTRACTION_AGENT_PROMPT = """你是景点搜索专家。你的任务是根据城市和用户偏好搜索合适的景点。
-
-**重要提示:**
-你必须使用工具来搜索景点!不要自己编造景点信息!
-
-**工具调用格式:**
-使用maps_text_search工具时,必须严格按照以下格式:
-`[TOOL_CALL:maps_text_search:keywords=景点关键词,city=城市名]`
-
-**示例:**
-用户: "搜索北京的历史文化景点"
-你的回复: [TOOL_CALL:maps_text_search:keywords=历史文化,city=北京]
-
-用户: "搜索上海的公园"
-你的回复: [TOOL_CALL:maps_text_search:keywords=公园,city=上海]
-
-**注意:**
-1. 必须使用工具,不要直接回答
-2. 格式必须完全正确,包括方括号和冒号
-3. 参数用逗号分隔
-"""
-
-WEATHER_AGENT_PROMPT = """你是天气查询专家。你的任务是查询指定城市的天气信息。
-
-**重要提示:**
-你必须使用工具来查询天气!不要自己编造天气信息!
-
-**工具调用格式:**
-使用maps_weather工具时,必须严格按照以下格式:
-`[TOOL_CALL:maps_weather:city=城市名]`
-
-**示例:**
-用户: "查询北京天气"
-你的回复: [TOOL_CALL:maps_weather:city=北京]
-
-用户: "上海的天气怎么样"
-你的回复: [TOOL_CALL:maps_weather:city=上海]
-
-**注意:**
-1. 必须使用工具,不要直接回答
-2. 格式必须完全正确,包括方括号和冒号
-"""
-
-HOTEL_AGENT_PROMPT = """你是酒店推荐专家。你的任务是根据城市和景点位置推荐合适的酒店。
-
-**重要提示:**
-你必须使用工具来搜索酒店!不要自己编造酒店信息!
-
-**工具调用格式:**
-使用maps_text_search工具搜索酒店时,必须严格按照以下格式:
-`[TOOL_CALL:maps_text_search:keywords=酒店,city=城市名]`
-
-**示例:**
-用户: "搜索北京的酒店"
-你的回复: [TOOL_CALL:maps_text_search:keywords=酒店,city=北京]
-
-**注意:**
-1. 必须使用工具,不要直接回答
-2. 格式必须完全正确,包括方括号和冒号
-3. 关键词使用"酒店"或"宾馆"
-"""
-
 PLANNER_AGENT_PROMPT = """你是行程规划专家。
 
 **输出格式:**
@@ -107,17 +62,6 @@ PLANNER_AGENT_PROMPT = """你是行程规划专家。
       ]
     }
   ],
-  "weather_info": [
-    {
-      "date": "YYYY-MM-DD",
-      "day_weather": "晴",
-      "night_weather": "多云",
-      "day_temp": 25,
-      "night_temp": 18,
-      "wind_direction": "东南",
-      "wind_power": "3级"
-    }
-  ],
   "overall_suggestions": "总体建议",
   "budget": {
     "total_attractions": 0,
@@ -129,65 +73,181 @@ PLANNER_AGENT_PROMPT = """你是行程规划专家。
 }
 
 **规划要求:**
-1. weather_info必须包含每天的天气
-2. 温度为纯数字(不带°C)
-3. 每天安排2-3个景点
-4. 考虑景点距离和游览时间
-5. 包含早中晚三餐
-6. 包含酒店信息
-7. 提供实用建议
-8. 包含预算信息,根据景点门票、酒店价格、餐饮标准和交通方式估算
+1. 每天从当天给定的景点中安排2-3个,雨雪天气优先安排室内景点
+2. 保持给定的分天和游览顺序(路线已优化),描述和交通安排与该顺序一致
+3. 包含早中晚三餐
+4. 包含酒店信息
+5. 提供实用建议
+6. 包含预算信息,根据景点门票、酒店价格、餐饮标准和交通方式估算
+7. 不需要输出天气信息,天气由系统直接查询后补充
 """
 
+NO_ATTRACTIONS = "暂无景点搜索结果,请推荐该城市的知名景点"
+NO_HOTELS = "暂无酒店信息,请根据住宿类型推荐合适的酒店"
+
 class TripPlannerAgent:
     def __init__(self):
         settings = get_settings()
+        self.step_timeout = settings.agent_step_timeout
+        self.planner_timeout = settings.planner_step_timeout
+        self.chunked_min_days = settings.chunked_plan_min_days
+        self.plan_cache = PlanCache(
+            max_size=settings.plan_cache_size,
+            ttl=settings.plan_cache_ttl,
+            disk_path=settings.shared_cache_db or None
+        )
         self.llm = HelloAgentsLLM()
 
+        # 城市POI本地索引:景点和酒店搜索优先在本地完成
+        self.poi_index_path = settings.poi_index_path
+        self.poi_index = PoiIndex(refresh_after=settings.poi_index_refresh)
+        if self.poi_index_path and os.path.exists(self.poi_index_path):
+            try:
+                print(f"已从 {self.poi_index_path} 加载 {self.poi_index.load_seed(self.poi_index_path)} 个POI")
+            except (OSError, ValueError) as e:
+                print(f"加载POI索引失败: {e}")
+
+        # MCP工具结果缓存:天气短TTL,POI搜索长TTL,可选SQLite磁盘层。
+        # 经MCP代理调用时磁盘层在代理进程中,本进程只保留内存层
+        broker_address = settings.mcp_broker_address or None
+        self.tool_cache = create_tool_cache(settings, disk=broker_address is None)
+
         # 创建共享的MCP工具实例
-        self.mcp_tool = MCPTool(
-            name="amap_mcp",
-            command="npx",
-            args=["-y", "@amap/amap-maps-mcp-server"],
-            env={"AMAP_MAPS_API_KEY": settings.amap_api_key},
-            auto_expand=True
-        )
+        self.mcp_tool = create_mcp_tool(settings, self.tool_cache, broker_address)
 
-        self.attraction_agent = SimpleAgent(
-            name="AttractionSearchAgent",
+        self.planner_agent = SimpleAgent(
+            name="PlannerAgent",
             llm=self.llm,
-            system_prompt=ATTRACTION_AGENT_PROMPT
+            system_prompt=PLANNER_AGENT_PROMPT
         )
-        self.attraction_agent.add_tool(self.mcp_tool)
 
-        self.weather_agent = SimpleAgent(
-            name="WeatherQueryAgent",
+        # 长行程分块规划: 景点分配 + 按天并发生成
+        self.allocation_agent = SimpleAgent(
+            name="AllocationAgent",
             llm=self.llm,
-            system_prompt=WEATHER_AGENT_PROMPT
+            system_prompt=ALLOCATION_AGENT_PROMPT
         )
-        self.weather_agent.add_tool(self.mcp_tool)
-
-        self.hotel_agent = SimpleAgent(
-            name="HotelAgent",
+        self.day_planner_agent = SimpleAgent(
+            name="DayPlannerAgent",
             llm=self.llm,
-            system_prompt=HOTEL_AGENT_PROMPT
+            system_prompt=DAY_PLANNER_AGENT_PROMPT
         )
-        self.hotel_agent.add_tool(self.mcp_tool)
 
-        self.planner_agent = SimpleAgent(
-            name="PlannerAgent",
-            llm=self.llm,
-            system_prompt=PLANNER_AGENT_PROMPT
+    async def start(self):
+        """发现MCP工具目录(启动时执行一次),各Agent按需注册其中的工具;失败时抛出异常由调用方决定是否重试"""
+        await self.mcp_tool.discover()
+
+    async def close(self):
+        """释放MCP会话池和LLM连接池等长期持有的资源"""
+        await self.poi_index.close()
+        if self.poi_index_path:
+            try:
+                self.poi_index.save(self.poi_index_path)
+            except OSError as e:
+                print(f"保存POI索引失败: {e}")
+        await self.mcp_tool.close()
+        await self.llm.aclose()
+        self.plan_cache.close()
+
+    def _tool(self, name: str) -> Optional[Tool]:
+        """直接调用的MCP工具(不经过LLM);工具目录尚未发现时为 None"""
+        tools = self.mcp_tool.view([name])
+        return tools[0] if tools else None
+
+    @property
+    def weather_tool(self) -> Optional[Tool]:
+        return self._tool("maps_weather")
+
+    async def _fetch_pois(self, city: str, category: str, keyword: str) -> Tuple[List[POI], int]:
+        """调用maps_text_search并把结果写入POI索引,返回 (POI列表, 原始结果的token估算)"""
+        tool = self._tool("maps_text_search")
+        if tool is None:
+            raise RuntimeError("maps_text_search 工具不可用")
+        text = await tool.run({"keywords": keyword, "city": city})
+        pois = parse_pois(text)
+        raw_tokens = estimate_tokens(text)
+        if pois:
+            self.poi_index.add(city, category, keyword, pois, raw_tokens)
+        return pois, raw_tokens
+
+    async def _search_pois(self, city: str, category: str, keyword: str, min_results: int) -> Tuple[List[POI], int]:
+        """优先从POI索引查找,过期的结果照常返回并在后台刷新;未命中时调用maps_text_search"""
+        found = self.poi_index.lookup(city, category, keyword, min_results)
+        if found is None:
+            return await self._fetch_pois(city, category, keyword)
+
+        pois, entry = found
+        if self.poi_index.is_stale(entry):
+            self.poi_index.refresh(city, category, keyword, lambda: self._fetch_pois(city, category, keyword))
+        return pois, entry.raw_tokens
+
+    async def search_digest(self, city: str, keywords: List[str], limit: int, kind: str) -> PoiDigest:
+        """按关键词并发查找POI(本地索引或maps_text_search),返回去重排序后的POI摘要"""
+        results = await asyncio.gather(*[
+            self._search_pois(city, kind, keyword, limit) for keyword in keywords
+        ])
+        with metrics.span("poi_digest"):
+            digest = build_digest(
+                [pois for pois, _ in results], limit, kind, sum(raw_tokens for _, raw_tokens in results)
+            )
+        return digest
+
+    def _nearby_hotels(self, request: TripPlanRequest, attractions: List[Attraction]) -> str:
+        """离当天景点中心最近的酒店摘要;索引中没有时返回空字符串"""
+        if not attractions:
+            return ""
+        center = Location(
+            longitude=sum(a.location.longitude for a in attractions) / len(attractions),
+            latitude=sum(a.location.latitude for a in attractions) / len(attractions)
+        )
+        hotels = self.poi_index.nearest(
+            request.city, "hotels", center, k=NEARBY_HOTELS, keyword=request.accommodation or "酒店"
         )
+        return render_digest(hotels) if hotels else ""
+
+    async def fetch_weather(self, request: TripPlanRequest) -> List[WeatherInfo]:
+        """调用maps_weather并转换为行程日期范围内的 WeatherInfo 列表,不经过LLM"""
+        tool = self.weather_tool
+        if tool is None:
+            raise RuntimeError("maps_weather 工具不可用")
+        dates = set(trip_dates(request))
+        forecasts = parse_weather_forecasts(await tool.run({"city": request.city}))
+        return [w for w in forecasts if w.date in dates]
+
+    @staticmethod
+    def _format_weather(weather: List[WeatherInfo]) -> str:
+        if not weather:
+            return "暂无天气预报,请根据季节合理安排室内外活动"
+        return "\n".join(
+            f"- {w.date}: 白天{w.day_weather} {w.day_temp}°C, 夜间{w.night_weather} {w.night_temp}°C, "
+            f"{w.wind_direction}风{w.wind_power}"
+            for w in weather
+        )
+
+    @staticmethod
+    def _hotel_location(hotels: PoiDigest) -> Optional[Location]:
+        """排名第一的有坐标候选酒店,作为每天路线的起终点"""
+        return next((poi.location for poi in hotels.pois if poi.location is not None), None)
+
+    @staticmethod
+    def _route_days(request: TripPlanRequest, attractions: PoiDigest, hotels: PoiDigest) -> List[List[Attraction]]:
+        """用路线优化器把有坐标的候选景点分配到各天并排好顺序"""
+        candidates = [poi_attraction(poi) for poi in attractions.pois if poi.location is not None]
+        return plan_routes(candidates, request.days, hotel=TripPlannerAgent._hotel_location(hotels))
 
     def _build_planner_query(
         self,
         request: TripPlanRequest,
-        attraction_response: str,
-        weather_response: str,
-        hotel_response: str
+        attractions: PoiDigest,
+        weather: List[WeatherInfo],
+        hotels: PoiDigest
     ) -> str:
-        """构建规划Agent的查询"""
+        """构建规划Agent的查询:景点先由路线优化器分天并排好顺序,没有带坐标的候选景点时提供原始摘要"""
+        routes = self._route_days(request, attractions, hotels)
+        if any(routes):
+            attraction_section = f"**每天的景点(已按位置分天并按游览顺序排列):**\n{render_routes(trip_dates(request), routes)}"
+        else:
+            attraction_section = f"**候选景点:**\n{attractions.text or NO_ATTRACTIONS}"
         return f"""
 请根据以下信息生成{request.city}的{request.days}日旅行计划:
 
@@ -200,57 +260,309 @@ class TripPlannerAgent:
 - 交通方式: {request.transportation}
 - 住宿类型: {request.accommodation}
 
-**景点信息:**
-{attraction_response}
+{attraction_section}
 
-**天气信息:**
-{weather_response}
+**天气预报:**
+{self._format_weather(weather)}
 
-**酒店信息:**
-{hotel_response}
+**候选酒店:**
+{hotels.text or NO_HOTELS}
 
 请生成详细的旅行计划,包括每天的景点安排、餐饮推荐、住宿信息和预算明细。
 """
 
+    async def _merge_fresh_weather(self, plan: TripPlan, request: TripPlanRequest):
+        """直接调用maps_weather,用最新天气覆盖计划日期范围内的天气信息"""
+        try:
+            fresh = await self.fetch_weather(request)
+        except RuntimeError as e:
+            print(f"无法刷新天气: {e}")
+            return
+        dates = {day.date for day in plan.days}
+        merged = {w.date: w for w in plan.weather_info}
+        merged.update({w.date: w for w in fresh if w.date in dates})
+        plan.weather_info = [merged[d] for d in sorted(merged) if d in dates]
+
+    async def reuse_plan(self, plan: TripPlan, request: TripPlanRequest) -> TripPlan:
+        """复用为同类请求生成的计划(如合并的在途请求):返回按本请求日期排期的副本"""
+        adopted = redate_plan(plan, request)
+        if adopted.start_date != plan.start_date:
+            await self._merge_fresh_weather(adopted, request)
+        return adopted
+
     async def plan_trip(self, request: TripPlanRequest) -> TripPlan:
-        # 步骤1: 景点搜索
-        attraction_response = await self.attraction_agent.run(
-            f"请搜索{request.city}的{request.preferences}景点"
+        with metrics.span("plan_trip"):
+            return await self._plan_trip(request)
+
+    async def _plan_trip(self, request: TripPlanRequest) -> TripPlan:
+        # 相同(天数+季节)的请求直接复用缓存的计划,仅重新排期并合并最新天气
+        cached = self.plan_cache.get(request)
+        if cached is not None:
+            await self._merge_fresh_weather(cached, request)
+            return cached
+
+        plan = await self._generate_plan(request)
+        self.plan_cache.set(request, plan)
+        return plan
+
+    def _research_steps(self, request: TripPlanRequest) -> List[Step]:
+        """
+        步骤1-3: 景点搜索、天气查询、酒店推荐互不依赖,并发执行
+        三者都直接调用高德MCP工具,不经过LLM:POI搜索结果整理为紧凑摘要,天气转换为 WeatherInfo。
+        天气和酒店失败或超时时降级,规划Agent仍可生成计划
+        """
+        return [
+            Step(
+                "attractions",
+                lambda _: self._search_attractions(request),
+                timeout=self.step_timeout
+            ),
+            Step(
+                "weather",
+                lambda _: self.fetch_weather(request),
+                timeout=self.step_timeout,
+                required=False,
+                fallback=[]
+            ),
+            Step(
+                "hotels",
+                lambda _: self._search_hotels(request),
+                timeout=self.step_timeout,
+                required=False,
+                fallback=PoiDigest([], "", 0, 0)
+            ),
+        ]
+
+    async def _search_attractions(self, request: TripPlanRequest) -> PoiDigest:
+        keywords = split_keywords(request.preferences, default="景点")
+        return await self.search_digest(request.city, keywords, request.days * CANDIDATES_PER_DAY, "attractions")
+
+    async def _search_hotels(self, request: TripPlanRequest) -> PoiDigest:
+        return await self.search_digest(request.city, [request.accommodation or "酒店"], MAX_HOTELS, "hotels")
+
+    def _use_chunked(self, request: TripPlanRequest) -> bool:
+        return 0 < self.chunked_min_days <= request.days
+
+    def _chunked_steps(self, request: TripPlanRequest) -> List[Step]:
+        """
+        分块规划: 景点搜索和酒店推荐之后先筛选景点并由路线优化器分配到各天,再为每天并发生成行程
+        """
+        steps = self._research_steps(request)
+        steps.append(Step(
+            "allocation",
+            lambda results: self._allocate(request, results["attractions"], results["hotels"]),
+            deps=["attractions", "hotels"],
+            timeout=self.step_timeout
+        ))
+        for day_index, day_date in enumerate(trip_dates(request)):
+            steps.append(Step(
+                f"day_{day_index}",
+                lambda results, i=day_index, d=day_date: self._plan_day(
+                    request, i, d, results["allocation"]["days"][i], results["hotels"]
+                ),
+                deps=["allocation", "hotels"],
+                timeout=self.planner_timeout,
+                required=False
+            ))
+        return steps
+
+    async def _allocate(self, request: TripPlanRequest, attractions: PoiDigest, hotels: PoiDigest) -> Dict[str, Any]:
+        response = await self.allocation_agent.run(
+            build_allocation_query(request, attractions.text or NO_ATTRACTIONS)
         )
+        return parse_allocation(response, request.days, hotel=self._hotel_location(hotels))
 
-        # 步骤2: 天气查询
-        weather_response = await self.weather_agent.run(
-            f"请查询{request.city}的天气"
+    async def _plan_day(
+        self,
+        request: TripPlanRequest,
+        day_index: int,
+        day_date: str,
+        attractions: List[Attraction],
+        hotel_digest: PoiDigest
+    ) -> DayPlan:
+        # 优先推荐离当天景点最近的酒店
+        hotels = self._nearby_hotels(request, attractions) or hotel_digest.text or NO_HOTELS
+        response = await self.day_planner_agent.run(
+            build_day_query(request, day_index, day_date, attractions, hotels)
         )
+        with metrics.span("plan_parse"):
+            return parse_day_plan(response, day_index, day_date)
+
+    async def _merge_chunks(self, request: TripPlanRequest, results: WorkflowResult) -> TripPlan:
+        """合并各天的行程(失败的天使用占位行程),计算预算并补充天气"""
+        allocation = results["allocation"]
+        days = [
+            results[f"day_{i}"] or fallback_day_plan(request, i, day_date, allocation["days"][i])
+            for i, day_date in enumerate(trip_dates(request))
+        ]
+        plan = merge_day_plans(request, days, allocation["overall_suggestions"])
+        plan.weather_info = results["weather"]
+        return plan
+
+    async def _generate_plan(self, request: TripPlanRequest) -> TripPlan:
+        if self._use_chunked(request):
+            results = await Workflow(self._chunked_steps(request)).run()
+            return await self._merge_chunks(request, results)
+
+        # 步骤4: 整合生成计划,依赖前三步的结果
+        workflow = Workflow(self._research_steps(request) + [
+            Step(
+                "planner",
+                lambda results: self.planner_agent.run(
+                    self._build_planner_query(
+                        request, results["attractions"], results["weather"], results["hotels"]
+                    )
+                ),
+                deps=["attractions", "weather", "hotels"],
+                timeout=self.planner_timeout
+            ),
+        ])
+        results = await workflow.run()
+        plan = self._parse_plan(results["planner"], request)
+        plan.weather_info = results["weather"]
+        return plan
+
+    @staticmethod
+    def _plan_defaults(request: TripPlanRequest) -> Dict[str, Any]:
+        """规划输出缺少顶层字段时使用请求中的值"""
+        return {
+            "city": request.city,
+            "start_date": request.start_date,
+            "end_date": request.end_date,
+        }
 
-        # 步骤3: 酒店推荐
-        hotel_response = await self.hotel_agent.run(
-            f"请搜索{request.city}的{request.accommodation}酒店"
-        )
+    def _parse_plan(self, planner_response: str, request: TripPlanRequest) -> TripPlan:
+        # 步骤5: 解析JSON,自动定位代码块并修复常见格式问题
+        try:
+            with metrics.span("plan_parse"):
+                plan = parse_plan(planner_response, self._plan_defaults(request))
+        except Exception as e:
+            print(f"Error parsing plan: {e}")
+            print(f"Raw response: {planner_response}")
+            raise ValueError("Failed to generate valid trip plan")
+        return plan
+
+    @staticmethod
+    def _stage_events(name: str, value: Any, error: Any) -> List[Dict[str, Any]]:
+        return [{"event": "stage", "stage": name, "status": "failed" if error is not None else "done"}]
 
-        # 步骤4: 整合生成计划
+    async def _stream_workflow(
+        self,
+        workflow: Workflow,
+        to_events: Callable[[str, Any, Any], List[Dict[str, Any]]]
+    ) -> AsyncIterator[Any]:
+        """执行工作流,每个步骤结束时立即产出 to_events 转换的事件,最后产出 WorkflowResult"""
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_step_done(name: str, value: Any, error: Any):
+            for event in to_events(name, value, error):
+                events.put_nowait(event)
+
+        task = asyncio.create_task(workflow.run(on_step_done=on_step_done))
+        try:
+            while True:
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                while not events.empty():
+                    yield events.get_nowait()
+                break
+            yield task.result()
+        finally:
+            task.cancel()
+
+    async def _chunked_plan_stream(self, request: TripPlanRequest) -> AsyncIterator[Dict[str, Any]]:
+        """分块规划的流式版本:每天的行程生成后立即推送(可能乱序,以 day_index 为准)"""
+        def to_events(name: str, value: Any, error: Any) -> List[Dict[str, Any]]:
+            events = self._stage_events(name, value, error)
+            if name.startswith("day_") and error is None:
+                events.append({"event": "day", "data": value})
+            elif name == "weather":
+                events.extend({"event": "weather", "data": weather} for weather in value)
+            return events
+
+        async for item in self._stream_workflow(Workflow(self._chunked_steps(request)), to_events):
+            if isinstance(item, WorkflowResult):
+                results = item
+            else:
+                yield item
+
+        plan = await self._merge_chunks(request, results)
+        for day in plan.days:
+            if results.failed(f"day_{day.day_index}"):
+                yield {"event": "day", "data": day}
+        self.plan_cache.set(request, plan)
+        yield {"event": "plan", "data": plan}
+
+    async def plan_trip_stream(self, request: TripPlanRequest) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式生成旅行计划,依次产出事件:
+        - {"event": "stage", "stage": 阶段名, "status": "started" | "done" | "failed"}
+        - {"event": "token", "text": 规划Agent输出的文本片段}
+        - {"event": "day", "data": DayPlan} / {"event": "weather", "data": WeatherInfo}
+        - {"event": "plan", "data": TripPlan}
+        """
+        yield {"event": "stage", "stage": "research", "status": "started"}
+
+        cached = self.plan_cache.get(request)
+        if cached is not None:
+            await self._merge_fresh_weather(cached, request)
+            for day in cached.days:
+                yield {"event": "day", "data": day}
+            yield {"event": "plan", "data": cached}
+            return
+
+        if self._use_chunked(request):
+            async for event in self._chunked_plan_stream(request):
+                yield event
+            return
+
+        # 步骤1-3并发执行,每完成一步立即推送阶段事件
+        async for item in self._stream_workflow(Workflow(self._research_steps(request)), self._stage_events):
+            if isinstance(item, WorkflowResult):
+                results = item
+            else:
+                yield item
+        for weather in results["weather"]:
+            yield {"event": "weather", "data": weather}
+
+        # 步骤4: 流式输出规划Agent的回复
+        yield {"event": "stage", "stage": "planner", "status": "started"}
         planner_query = self._build_planner_query(
-            request, attraction_response, weather_response, hotel_response
+            request, results["attractions"], results["weather"], results["hotels"]
         )
-        planner_response = await self.planner_agent.run(planner_query)
-
-        # 步骤5: 解析JSON
-        # Clean up response to ensure it's valid JSON
-        json_str = planner_response
-        if "```json" in json_str:
-            start = json_str.find("```json") + 7
-            end = json_str.find("```", start)
-            json_str = json_str[start:end].strip()
-        elif "```" in json_str:
-            start = json_str.find("```") + 3
-            end = json_str.find("```", start)
-            json_str = json_str[start:end].strip()
-            
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.planner_timeout
+        parser = PlanStreamParser()
+        emitted_days = 0
+        stream = self.planner_agent.stream(planner_query).__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(0, deadline - loop.time()))
+            except StopAsyncIteration:
+                break
+            yield {"event": "token", "text": chunk}
+
+            # 步骤5: 增量解析,每完成一天立即推送(天气已由maps_weather给出,忽略LLM输出的天气)
+            for field, item in parser.feed(chunk):
+                if field == "days":
+                    emitted_days += 1
+                    yield {"event": "day", "data": item}
+
         try:
-            data = json.loads(json_str)
-            return TripPlan(**data)
+            with metrics.span("plan_parse"):
+                plan = parser.finish(self._plan_defaults(request))
         except Exception as e:
             print(f"Error parsing plan: {e}")
-            print(f"Raw response: {planner_response}")
-            # Return a dummy plan or raise error
+            print(f"Raw response: {parser.buffer}")
             raise ValueError("Failed to generate valid trip plan")
+
+        plan.weather_info = results["weather"]
+        # 收尾解析时才完成校验的天数也要推送
+        for day in plan.days[emitted_days:]:
+            yield {"event": "day", "data": day}
+        self.plan_cache.set(request, plan)
+        yield {"event": "plan", "data": plan}
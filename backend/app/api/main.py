@@ -1,15 +1,43 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.models.schemas import TripPlanRequest, TripPlan
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Callable, List, Dict, Any, Optional
+from app.models.schemas import TripPlanRequest, TripPlan, Attraction, PhotoBatchRequest, TripPlanJob
 from app.agents.trip_planner import TripPlannerAgent
-from app.services.unsplash_service import UnsplashService
+from app.container import AppContainer, ComponentUnavailable
+from app.services.admission import AdmissionRejected
+from app.services.plan_cache import PlanCache
+from app.services.jobs import IdempotencyConflict
 from app.config import get_settings
+from hello_agents import metrics
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Smart Trip Planner API")
+settings = get_settings()
+container = AppContainer(settings)
+
+HTTP_SECONDS = metrics.REGISTRY.histogram(
+    "trip_http_request_duration_seconds", "HTTP请求耗时", ["method", "route", "status"]
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台初始化各组件并预热缓存,服务立即开始接受请求(/health/ready 反映就绪状态)
+    container.start()
+    container.start_jobs(run_plan_job, recover_running=settings.job_recover_running)
+    yield
+    # 关闭时释放MCP会话池,结束常驻的MCP服务进程
+    await container.close()
+
+app = FastAPI(title="Smart Trip Planner API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,48 +45,300 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Location", "Retry-After"],
 )
 
-settings = get_settings()
-trip_planner_agent = TripPlannerAgent()
-unsplash_service = UnsplashService(settings.unsplash_access_key)
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    为每个请求开启阶段追踪,并通过 Server-Timing 响应头返回各阶段耗时
+    流式响应的响应头在生成开始前发送,只包含此前完成的阶段
+    """
+    trace = metrics.start_trace()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - trace.started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code)
+    )
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+async def get_trip_planner() -> TripPlannerAgent:
+    """等待规划依赖的组件就绪,超时或初始化失败时返回503"""
+    try:
+        return await container.get_trip_planner()
+    except ComponentUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def client_id(request: Request) -> str:
+    """客户端标识:优先使用 X-Client-Id 请求头,否则使用来源IP"""
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "unknown")
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(int(e.retry_after))}
+    )
+
+async def attach_photos(attractions: List[Attraction], city: str):
+    """为缺少图片的景点并发获取图片"""
+    missing = [attraction for attraction in attractions if not attraction.image_url]
+    photo_urls = await container.unsplash.get_photo_urls(
+        [f"{attraction.name} {city}" for attraction in missing]
+    )
+    for attraction in missing:
+        attraction.image_url = photo_urls.get(f"{attraction.name} {city}")
+
+def to_ndjson(event: Dict[str, Any]) -> str:
+    data = event.get("data")
+    if isinstance(data, BaseModel):
+        event = {**event, "data": data.model_dump()}
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    持有准入名额的流式响应,响应处理结束时归还名额
+
+    在 __call__ 中归还而不是在生成器的 finally 或 BackgroundTask 中:客户端在响应体发送前断开时,
+    生成器从未启动,BackgroundTask 也不会执行
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
 
 @app.post("/api/trip/plan", response_model=TripPlan)
-async def create_trip_plan(request: TripPlanRequest) -> TripPlan:
+async def create_trip_plan(
+    request: TripPlanRequest,
+    http_request: Request,
+    trip_planner_agent: TripPlannerAgent = Depends(get_trip_planner)
+) -> TripPlan:
     """
     创建旅行计划
+
+    经过准入控制:同类在途请求合并为一次执行,过载时返回429/503及Retry-After
     """
     logger.info(f"收到 {request.city} 的旅行计划请求")
     try:
-        # 生成旅行计划
-        trip_plan = await trip_planner_agent.plan_trip(request)
-
-        # 为每个景点获取图片
-        for day in trip_plan.days:
-            for attraction in day.attractions:
-                if not attraction.image_url:
-                    image_url = unsplash_service.get_photo_url(
-                        f"{attraction.name} {trip_plan.city}"
-                    )
-                    attraction.image_url = image_url
-        
+        # 生成旅行计划,合并的请求复用同一份计划并按各自日期排期
+        shared_plan = await container.plan_admission.run(
+            PlanCache.make_key(request),
+            client_id(http_request),
+            lambda: trip_planner_agent.plan_trip(request)
+        )
+        trip_plan = await trip_planner_agent.reuse_plan(shared_plan, request)
+
+        # 为每个景点并发获取图片
+        await attach_photos(
+            [attraction for day in trip_plan.days for attraction in day.attractions],
+            trip_plan.city
+        )
+
         return trip_plan
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         logger.error(f"生成旅行计划失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/trip/plan/stream")
+async def stream_trip_plan(
+    request: TripPlanRequest,
+    http_request: Request,
+    trip_planner_agent: TripPlannerAgent = Depends(get_trip_planner)
+):
+    """
+    流式创建旅行计划(NDJSON),逐步推送阶段进度、规划文本片段和每日行程
+    与非流式接口共享并发名额,名额在响应开始前获取,响应结束(包括客户端提前断开)时归还
+    """
+    logger.info(f"收到 {request.city} 的流式旅行计划请求")
+    client = client_id(http_request)
+    try:
+        await container.plan_admission.acquire(client)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+    async def event_stream():
+        try:
+            async for event in trip_planner_agent.plan_trip_stream(request):
+                if event["event"] == "day":
+                    await attach_photos(event["data"].attractions, request.city)
+                elif event["event"] == "plan":
+                    await attach_photos(
+                        [attraction for day in event["data"].days for attraction in day.attractions],
+                        event["data"].city
+                    )
+                yield to_ndjson(event)
+        except Exception as e:
+            logger.error(f"流式生成旅行计划失败: {e}")
+            yield to_ndjson({"event": "error", "message": str(e)})
+
+    return AdmittedStreamingResponse(
+        event_stream(), lambda: container.plan_admission.release(client), media_type="application/x-ndjson"
+    )
+
+async def run_plan_job(job: TripPlanJob) -> TripPlan:
+    """执行异步规划任务:与同步接口共享准入控制,过载时等待后重试而不是失败"""
+    trip_planner_agent = await container.get_trip_planner()
+    request = job.request
+
+    async def generate() -> TripPlan:
+        plan = None
+        async for event in trip_planner_agent.plan_trip_stream(request):
+            if event["event"] == "stage":
+                container.jobs.set_stage(job.job_id, event["stage"])
+            elif event["event"] == "day":
+                container.jobs.add_day(job.job_id, event["data"])
+            elif event["event"] == "plan":
+                plan = event["data"]
+        if plan is None:
+            raise ValueError("Failed to generate valid trip plan")
+        return plan
+
+    while True:
+        try:
+            shared_plan = await container.plan_admission.run(
+                PlanCache.make_key(request), job.client_id, generate
+            )
+            break
+        except AdmissionRejected as e:
+            container.jobs.set_stage(job.job_id, "waiting")
+            await asyncio.sleep(e.retry_after)
+
+    trip_plan = await trip_planner_agent.reuse_plan(shared_plan, request)
+    container.jobs.set_stage(job.job_id, "photos")
+    await attach_photos(
+        [attraction for day in trip_plan.days for attraction in day.attractions],
+        trip_plan.city
+    )
+    return trip_plan
+
+def get_job_or_404(job_id: str) -> TripPlanJob:
+    job = container.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {job_id}")
+    return job
+
+@app.post("/api/trip/jobs", response_model=TripPlanJob, status_code=202)
+async def submit_trip_plan_job(
+    request: TripPlanRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None)
+):
+    """
+    提交异步规划任务,立即返回任务ID
+
+    携带 Idempotency-Key 请求头时,重复提交(如网络重试)返回同一个任务
+    """
+    try:
+        job, created = container.jobs.submit(request, idempotency_key, client_id(http_request))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"{'创建' if created else '复用'}规划任务 {job.job_id} ({request.city})")
+    return JSONResponse(
+        job.model_dump(),
+        status_code=202 if created else 200,
+        headers={"Location": f"/api/trip/jobs/{job.job_id}"}
+    )
+
+@app.get("/api/trip/jobs/{job_id}", response_model=TripPlanJob)
+async def get_trip_plan_job(job_id: str, wait: float = 0):
+    """
+    查询任务状态,生成过程中包含已生成的每日行程,完成后包含规划结果
+    wait>0 时为长轮询:最多等待 wait 秒(上限30秒),任务状态变化时立即返回
+    """
+    get_job_or_404(job_id)
+    job = await container.jobs.wait(job_id, min(max(wait, 0), 30))
+    if job is None:
+        # 长轮询期间任务被清理(如其他进程提交任务时清理过期任务)
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {job_id}")
+    return job
+
+@app.get("/api/trip/jobs/{job_id}/result", response_model=TripPlan)
+async def get_trip_plan_job_result(job_id: str):
+    """获取已完成任务的规划结果,可重复获取"""
+    job = get_job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.result is None:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成: {job.status}", headers={"Retry-After": "2"})
+    return job.result
+
+@app.get("/api/trip/jobs/{job_id}/events")
+async def subscribe_trip_plan_job(job_id: str):
+    """订阅任务状态变化(NDJSON),每次状态、阶段变化或新生成一天行程时推送一行,任务完成后结束"""
+    get_job_or_404(job_id)
+
+    async def job_stream():
+        async for job in container.jobs.subscribe(job_id):
+            yield to_ndjson({"event": "job", "data": job})
+
+    return StreamingResponse(job_stream(), media_type="application/x-ndjson")
+
 @app.get("/api/poi/photo")
 async def get_poi_photo(name: str):
     """
     获取景点图片
     """
     try:
-        image_url = unsplash_service.get_photo_url(f"{name}")
+        image_url = await container.unsplash.aget_photo_url(f"{name}")
         return {"success": True, "data": {"photo_url": image_url}}
     except Exception as e:
         logger.error(f"获取景点图片失败: {e}")
         return {"success": False, "error": str(e)}
 
+@app.post("/api/poi/photos")
+async def get_poi_photos(request: PhotoBatchRequest):
+    """
+    批量获取景点图片,并发解析、去重并复用缓存
+    查询词与生成计划时一致("景点名 城市"),因此通常直接命中缓存
+    """
+    queries = {name: f"{name} {request.city}".strip() for name in dict.fromkeys(request.names) if name}
+
+    if request.stream:
+        names_by_query: Dict[str, List[str]] = {}
+        for name, query in queries.items():
+            names_by_query.setdefault(query, []).append(name)
+
+        async def photo_stream():
+            async for query, url in container.unsplash.iter_photo_urls(list(names_by_query)):
+                for name in names_by_query[query]:
+                    yield json.dumps({"name": name, "photo_url": url}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(photo_stream(), media_type="application/x-ndjson")
+
+    try:
+        urls = await container.unsplash.get_photo_urls(list(queries.values()))
+        photos = {name: urls.get(query) for name, query in queries.items()}
+        return {"success": True, "data": {"photos": photos}}
+    except Exception as e:
+        logger.error(f"批量获取景点图片失败: {e}")
+        return {"success": False, "error": str(e)}
+
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    """存活检查:进程能响应即返回200,不依赖任何外部组件"""
+    return container.liveness()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/ready")
+async def readiness_check():
+    """就绪检查:LLM客户端和MCP工具目录均已就绪时返回200,否则返回503及各组件状态"""
+    readiness = container.readiness()
+    status_code = 200 if readiness["status"] == "ready" else 503
+    return JSONResponse(readiness, status_code=status_code)
@@ -11,6 +11,44 @@ class Settings(BaseModel):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_base_url: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
     openai_model_name: str = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
+    amap_mcp_command: str = os.getenv("AMAP_MCP_COMMAND", "npx")
+    amap_mcp_args: str = os.getenv("AMAP_MCP_ARGS", "-y @amap/amap-maps-mcp-server")
+    mcp_pool_size: int = int(os.getenv("MCP_POOL_SIZE", "2"))
+    mcp_health_check_interval: float = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+    mcp_catalog_snapshot: str = os.getenv("MCP_CATALOG_SNAPSHOT", "")
+    mcp_catalog_snapshot_max_age: float = float(os.getenv("MCP_CATALOG_SNAPSHOT_MAX_AGE", "86400"))
+    tool_cache_size: int = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+    tool_cache_default_ttl: float = float(os.getenv("TOOL_CACHE_DEFAULT_TTL", "3600"))
+    tool_cache_ttls: str = os.getenv("TOOL_CACHE_TTLS", "maps_weather=1800,maps_text_search=86400")
+    tool_cache_db: str = os.getenv("TOOL_CACHE_DB", "")
+    # 各缓存共享的磁盘层(多 worker 部署时所有进程共用),单独配置的缓存数据库优先
+    shared_cache_db: str = os.getenv("SHARED_CACHE_DB", "")
+    # 设置后通过 MCP 代理进程调用工具,不在本进程启动MCP服务,如 .cache/mcp_broker.sock 或 127.0.0.1:8765
+    mcp_broker_address: str = os.getenv("MCP_BROKER_ADDRESS", "")
+    plan_cache_size: int = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+    plan_cache_ttl: float = float(os.getenv("PLAN_CACHE_TTL", "86400"))
+    poi_index_path: str = os.getenv("POI_INDEX_PATH", "")
+    poi_index_refresh: float = float(os.getenv("POI_INDEX_REFRESH", "604800"))
+    unsplash_base_url: str = os.getenv("UNSPLASH_BASE_URL", "https://api.unsplash.com")
+    unsplash_max_concurrency: int = int(os.getenv("UNSPLASH_MAX_CONCURRENCY", "8"))
+    unsplash_cache_size: int = int(os.getenv("UNSPLASH_CACHE_SIZE", "2048"))
+    unsplash_cache_ttl: float = float(os.getenv("UNSPLASH_CACHE_TTL", "604800"))
+    warmup_cities: str = os.getenv("WARMUP_CITIES", "")
+    ready_timeout: float = float(os.getenv("READY_TIMEOUT", "60"))
+    plan_max_concurrency: int = int(os.getenv("PLAN_MAX_CONCURRENCY", "4"))
+    plan_max_queue: int = int(os.getenv("PLAN_MAX_QUEUE", "16"))
+    plan_per_client_limit: int = int(os.getenv("PLAN_PER_CLIENT_LIMIT", "2"))
+    plan_queue_timeout: float = float(os.getenv("PLAN_QUEUE_TIMEOUT", "30"))
+    plan_retry_after: float = float(os.getenv("PLAN_RETRY_AFTER", "10"))
+    job_store: str = os.getenv("JOB_STORE", "memory")
+    job_db: str = os.getenv("JOB_DB", "")
+    job_workers: int = int(os.getenv("JOB_WORKERS", "4"))
+    job_ttl: float = float(os.getenv("JOB_TTL", "86400"))
+    # 启动时把上次退出时执行中的任务重新排队;多 worker 部署时由启动器统一处理
+    job_recover_running: bool = os.getenv("JOB_RECOVER_RUNNING", "true").lower() in ("1", "true", "yes")
+    chunked_plan_min_days: int = int(os.getenv("CHUNKED_PLAN_MIN_DAYS", "4"))
+    agent_step_timeout: float = float(os.getenv("AGENT_STEP_TIMEOUT", "60"))
+    planner_step_timeout: float = float(os.getenv("PLANNER_STEP_TIMEOUT", "300"))
 
 @lru_cache()
 def get_settings():
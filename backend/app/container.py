@@ -0,0 +1,228 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+from app.config import Settings
+from app.models.schemas import TripPlan, TripPlanJob
+from app.agents.trip_planner import TripPlannerAgent
+from app.services.unsplash_service import UnsplashService
+from app.services.admission import AdmissionController
+from app.services.job_store import create_job_store
+from app.services.jobs import JobManager
+from hello_agents import metrics
+
+logger = logging.getLogger(__name__)
+
+class ComponentUnavailable(Exception):
+    """组件初始化失败或未在超时时间内就绪"""
+
+class ComponentState:
+    """单个组件的初始化状态"""
+
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+        self.status = "pending"  # pending / starting / ready / failed
+        self.error: Optional[str] = None
+        self.elapsed: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "elapsed_ms": round(self.elapsed * 1000, 1) if self.elapsed is not None else None,
+            "error": self.error,
+        }
+
+class AppContainer:
+    """
+    应用依赖容器
+
+    模块导入时不创建任何客户端、子进程或数据库连接。FastAPI 启动后在后台依次初始化各组件
+    (LLM客户端、MCP工具目录与会话池、Unsplash服务)并预热缓存，
+    请求只等待自己依赖的组件就绪。
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.created_at = time.perf_counter()
+        self.components: Dict[str, ComponentState] = {
+            "llm": ComponentState("llm"),
+            "mcp": ComponentState("mcp"),
+            "unsplash": ComponentState("unsplash", required=False),
+            "warmup": ComponentState("warmup", required=False),
+        }
+        self._trip_planner: Optional[TripPlannerAgent] = None
+        self._unsplash: Optional[UnsplashService] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._retry_tasks: Dict[str, asyncio.Task] = {}
+        # 规划请求的准入控制(合并相同请求、限制并发和排队长度)
+        self.plan_admission = AdmissionController(
+            max_concurrency=settings.plan_max_concurrency,
+            max_queue=settings.plan_max_queue,
+            per_client_limit=settings.plan_per_client_limit,
+            queue_timeout=settings.plan_queue_timeout,
+            retry_after=settings.plan_retry_after
+        )
+        metrics.REGISTRY.register_collector(self.plan_admission.collect)
+        # 异步规划任务,任务存储和 worker 在应用启动时由 start_jobs 创建
+        self._jobs: Optional[JobManager] = None
+
+    @property
+    def jobs(self) -> JobManager:
+        if self._jobs is None:
+            raise ComponentUnavailable("任务管理器尚未启动")
+        return self._jobs
+
+    def start_jobs(self, runner: Callable[[TripPlanJob], Awaitable[TripPlan]], recover_running: bool = True):
+        """打开任务存储(SQLite 时在此时才连接数据库)并启动任务 worker"""
+        if self._jobs is None:
+            self._jobs = JobManager(
+                create_job_store(self.settings.job_store, self.settings.job_db),
+                workers=self.settings.job_workers,
+                ttl=self.settings.job_ttl
+            )
+        self._jobs.start(runner, recover_running=recover_running)
+
+    @property
+    def trip_planner(self) -> TripPlannerAgent:
+        if self._trip_planner is None:
+            self._trip_planner = TripPlannerAgent()
+            metrics.register_cache("plan", self._trip_planner.plan_cache.stats)
+            metrics.register_cache("tool", self._trip_planner.tool_cache.stats)
+            metrics.register_cache("poi_index", self._trip_planner.poi_index.stats)
+            metrics.register_cache("llm", self._trip_planner.llm.cache.stats)
+        return self._trip_planner
+
+    @property
+    def unsplash(self) -> UnsplashService:
+        if self._unsplash is None:
+            self._unsplash = UnsplashService(
+                self.settings.unsplash_access_key,
+                max_concurrency=self.settings.unsplash_max_concurrency,
+                cache_size=self.settings.unsplash_cache_size,
+                cache_ttl=self.settings.unsplash_cache_ttl,
+                base_url=self.settings.unsplash_base_url,
+                cache_db=self.settings.shared_cache_db or None
+            )
+            metrics.register_cache("unsplash", self._unsplash.cache.stats)
+        return self._unsplash
+
+    async def _init(self, name: str, func: Callable[[], Awaitable[Any]]):
+        state = self.components[name]
+        state.status = "starting"
+        state.error = None
+        state.done.clear()
+        start = time.perf_counter()
+        try:
+            await func()
+            state.status = "ready"
+        except Exception as e:
+            state.status = "failed"
+            state.error = str(e)
+            logger.error(f"组件 {name} 初始化失败: {e}")
+        finally:
+            state.elapsed = time.perf_counter() - start
+            state.done.set()
+
+    async def _start_llm(self):
+        # 创建LLM客户端和各Agent(不启动子进程)
+        self.trip_planner
+
+    async def _start_mcp(self):
+        # 发现工具目录并预先建立会话池中的全部连接
+        await self.trip_planner.start()
+        await self.trip_planner.mcp_tool.pool.warmup()
+
+    async def _start_unsplash(self):
+        self.unsplash
+
+    async def _prefill_caches(self):
+        """预热工具缓存:预先查询常用城市的天气"""
+        cities = [c.strip() for c in self.settings.warmup_cities.split(",") if c.strip()]
+        tool = self.trip_planner.weather_tool
+        if tool is None or not cities:
+            return
+        await asyncio.gather(*[tool.run({"city": city}) for city in cities])
+
+    def _skip(self, name: str, dependency: str):
+        """依赖的组件失败时标记为失败(而不是停留在 pending),之后等待它的请求会触发重试"""
+        state = self.components[name]
+        state.status = "failed"
+        state.error = f"依赖的组件 {dependency} 不可用"
+        state.done.set()
+
+    async def _warm_up(self):
+        await self._init("llm", self._start_llm)
+        if self.components["llm"].status == "ready":
+            await asyncio.gather(
+                self._init("mcp", self._start_mcp),
+                self._init("unsplash", self._start_unsplash)
+            )
+        else:
+            self._skip("mcp", "llm")
+            await self._init("unsplash", self._start_unsplash)
+        if self.components["mcp"].status == "ready":
+            await self._init("warmup", self._prefill_caches)
+        else:
+            self._skip("warmup", "mcp")
+        logger.info(f"应用就绪检查完成,耗时 {time.perf_counter() - self.created_at:.2f}s")
+
+    def start(self):
+        """在后台启动组件初始化,不阻塞服务启动"""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self._warm_up())
+
+    async def wait_ready(self, name: str, timeout: Optional[float] = None):
+        """等待组件就绪;初始化失败的组件会重新尝试,触发重试的请求也在超时时间内等待重试结果"""
+        state = self.components[name]
+        timeout = self.settings.ready_timeout if timeout is None else timeout
+        if state.status == "pending":
+            self.start()
+        elif state.status == "failed" and name not in self._retry_tasks:
+            starter = {"llm": self._start_llm, "mcp": self._start_mcp}.get(name)
+            if starter is not None:
+                # 在调度重试前清除完成标记,否则下面的等待会立即返回上一次的失败结果
+                state.status = "starting"
+                state.done.clear()
+                task = asyncio.create_task(self._init(name, starter))
+                self._retry_tasks[name] = task
+                task.add_done_callback(lambda _: self._retry_tasks.pop(name, None))
+
+        try:
+            await asyncio.wait_for(state.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise ComponentUnavailable(f"组件 {name} 未在 {timeout}s 内就绪")
+        if state.status != "ready":
+            raise ComponentUnavailable(f"组件 {name} 不可用: {state.error}")
+
+    async def get_trip_planner(self) -> TripPlannerAgent:
+        await self.wait_ready("llm")
+        await self.wait_ready("mcp")
+        return self.trip_planner
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "ok", "uptime_s": round(time.perf_counter() - self.created_at, 3)}
+
+    def readiness(self) -> Dict[str, Any]:
+        ready = all(
+            state.status == "ready" for state in self.components.values() if state.required
+        )
+        return {
+            "status": "ready" if ready else "not_ready",
+            "components": {name: state.to_dict() for name, state in self.components.items()},
+        }
+
+    async def close(self):
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        for task in list(self._retry_tasks.values()):
+            task.cancel()
+        if self._jobs is not None:
+            await self._jobs.close()
+        if self._trip_planner is not None:
+            await self._trip_planner.close()
+        if self._unsplash is not None:
+            await self._unsplash.aclose()
@@ -0,0 +1,42 @@
+"""
+MCP 代理进程
+
+多 worker 部署时由 app.serve 启动,所有 worker 通过本地 socket 共用这里的高德MCP服务进程
+和工具结果缓存(磁盘层为 SHARED_CACHE_DB / TOOL_CACHE_DB)。
+
+用法:
+    python -m app.mcp_broker --address .cache/mcp_broker.sock
+"""
+import argparse
+import asyncio
+import signal
+
+from hello_agents.mcp_broker import MCPBroker
+from app.config import get_settings
+from app.services.amap_mcp import create_tool_cache, create_mcp_tool
+
+async def serve(address: str):
+    settings = get_settings()
+    broker = MCPBroker(create_mcp_tool(settings, create_tool_cache(settings)), address)
+    await broker.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await broker.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP 代理进程")
+    parser.add_argument("--address", help="监听地址(Unix 域套接字路径或 host:port),默认为 MCP_BROKER_ADDRESS")
+    args = parser.parse_args()
+    address = args.address or get_settings().mcp_broker_address
+    if not address:
+        parser.error("需要 --address 或 MCP_BROKER_ADDRESS")
+    asyncio.run(serve(address))
+
+if __name__ == "__main__":
+    main()
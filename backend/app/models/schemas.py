@@ -18,6 +18,15 @@ class Attraction(BaseModel):
     image_url: Optional[str] = Field(default=None, description="图片URL")
     ticket_price: int = Field(default=0, ge=0, description="门票价格(元)")
 
+class POI(BaseModel):
+    """高德POI搜索结果的结构化记录"""
+    id: str = Field(default="", description="高德POI ID")
+    name: str = Field(..., description="名称")
+    address: str = Field(default="", description="地址")
+    location: Optional[Location] = Field(default=None, description="经纬度坐标")
+    type: str = Field(default="", description="POI类型")
+    rating: Optional[float] = Field(default=None, ge=0, le=5, description="评分")
+
 class Meal(BaseModel):
     """餐饮信息"""
     type: str = Field(..., description="餐饮类型：breakfast/lunch/dinner/snack")
@@ -97,3 +106,27 @@ class TripPlanRequest(BaseModel):
     budget: str
     transportation: str
     accommodation: str
+
+class PhotoBatchRequest(BaseModel):
+    """批量获取景点图片请求"""
+    names: List[str] = Field(..., description="景点名称列表", max_length=200)
+    city: str = Field(default="", description="所在城市,用于提高图片匹配度")
+    stream: bool = Field(default=False, description="是否以NDJSON流式返回,每解析完一张即推送")
+
+class TripPlanJob(BaseModel):
+    """异步规划任务"""
+    job_id: str = Field(..., description="任务ID")
+    status: str = Field(default="queued", description="任务状态：queued/running/succeeded/failed")
+    stage: Optional[str] = Field(default=None, description="当前执行阶段")
+    request: TripPlanRequest = Field(..., description="规划请求")
+    days: List[DayPlan] = Field(default_factory=list, description="已生成的每日行程(生成过程中逐天追加,按 day_index 排序)")
+    result: Optional[TripPlan] = Field(default=None, description="规划结果(成功后提供)")
+    error: Optional[str] = Field(default=None, description="失败原因")
+    idempotency_key: Optional[str] = Field(default=None, description="幂等键")
+    client_id: str = Field(default="", description="提交任务的客户端")
+    created_at: float = Field(..., description="创建时间(Unix时间戳)")
+    updated_at: float = Field(..., description="最近更新时间(Unix时间戳)")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
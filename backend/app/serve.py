@@ -0,0 +1,116 @@
+"""
+应用启动器
+
+    python -m app.serve                  # 单进程
+    python -m app.serve --workers 4      # 多 worker
+
+多 worker 模式下各进程共享状态,而不是各自持有一份:
+- 计划、工具结果、LLM回复和图片缓存的磁盘层共用 SHARED_CACHE_DB(SQLite WAL 模式)
+- 规划任务使用共享的 SQLite 任务存储,任一 worker 都能查询任务状态
+- 启动一个 MCP 代理进程(app.mcp_broker),所有 worker 经本地 socket 共用它的MCP服务进程
+- 上次退出时执行中的任务在启动各 worker 前统一重新排队
+未显式配置的文件放在 --state-dir 下。应用配置在导入时读取,因此这里只在设置环境变量后才导入 app 的模块。
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+from dotenv import load_dotenv
+
+from hello_agents.mcp_broker import parse_address
+
+def _env_default(name: str, value: str):
+    """未配置(或配置为空)时使用默认值"""
+    if not os.environ.get(name):
+        os.environ[name] = value
+
+def configure_workers(state_dir: str):
+    """为多 worker 部署设置共享存储和MCP代理的默认配置"""
+    os.makedirs(state_dir, exist_ok=True)
+    _env_default("SHARED_CACHE_DB", os.path.join(state_dir, "shared_cache.db"))
+    if os.environ.get("JOB_STORE", "memory") == "memory":
+        os.environ["JOB_STORE"] = "sqlite"
+    _env_default("JOB_DB", os.path.join(state_dir, "jobs.db"))
+    _env_default("MCP_BROKER_ADDRESS", os.path.join(state_dir, "mcp_broker.sock"))
+    # 执行中任务的恢复由启动器统一完成,worker 启动时只排队 queued 状态的任务
+    os.environ["JOB_RECOVER_RUNNING"] = "false"
+
+def recover_jobs() -> int:
+    from app.services.job_store import create_job_store
+    from app.services.jobs import requeue_running
+
+    store = create_job_store(os.environ["JOB_STORE"], os.environ.get("JOB_DB", ""))
+    try:
+        return requeue_running(store)
+    finally:
+        store.close()
+
+def _broker_listening(address: str) -> bool:
+    kind, target = parse_address(address)
+    family = socket.AF_INET if kind == "tcp" else socket.AF_UNIX
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(target)
+        except OSError:
+            return False
+    return True
+
+def start_broker(address: str, timeout: float) -> subprocess.Popen:
+    """启动MCP代理进程,等待其开始监听"""
+    process = subprocess.Popen([sys.executable, "-m", "app.mcp_broker", "--address", address])
+    deadline = time.monotonic() + timeout
+    while not _broker_listening(address):
+        if process.poll() is not None:
+            raise RuntimeError(f"MCP 代理进程启动失败,退出码 {process.returncode}")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError(f"MCP 代理未在 {timeout}s 内开始监听")
+        time.sleep(0.1)
+    return process
+
+def stop_broker(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="启动旅行规划服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "1")), help="worker 进程数")
+    parser.add_argument("--state-dir", default=".cache", help="多 worker 模式下共享的缓存、任务库和代理套接字所在目录")
+    parser.add_argument("--broker-timeout", type=float, default=60, help="等待MCP代理就绪的秒数")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    load_dotenv()
+    broker = None
+    if args.workers > 1:
+        configure_workers(args.state_dir)
+        recovered = recover_jobs()
+        if recovered:
+            print(f"已重新排队 {recovered} 个中断的规划任务")
+        broker = start_broker(os.environ["MCP_BROKER_ADDRESS"], args.broker_timeout)
+
+    try:
+        uvicorn.run(
+            "app.api.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            log_level=args.log_level
+        )
+    finally:
+        stop_broker(broker)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from hello_agents import metrics
+
+ADMISSION_EVENTS = metrics.REGISTRY.counter(
+    "trip_admission_total", "准入控制结果(admitted/queued/coalesced/rejected/timeout)", ["result"]
+)
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝,status_code 为 429(单个客户端超限)或 503(整体过载)"""
+
+    def __init__(self, status_code: int, message: str, retry_after: float):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class AdmissionController:
+    """
+    规划请求的准入控制
+
+    - 相同 key 的在途请求合并为一次执行,跟随者直接等待领头请求的结果且不占用名额;
+      领头请求被准入控制拒绝时,跟随者按各自的客户端重新申请
+    - 最多 max_concurrency 个请求同时执行,排队请求不超过 max_queue,否则立即返回503
+    - 单个客户端同时执行+排队的请求不超过 per_client_limit,否则返回429
+    - 名额释放时按客户端轮转分配,避免单个客户端的突发请求占满队列
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 16,
+        per_client_limit: int = 2,
+        queue_timeout: float = 30,
+        retry_after: float = 10
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_client_limit = per_client_limit
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.rejected = 0
+        # 客户端 -> 等待名额的 future,按轮转顺序排列
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._client_load: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _reject(self, status_code: int, message: str, result: str):
+        self.rejected += 1
+        ADMISSION_EVENTS.inc(result=result)
+        raise AdmissionRejected(status_code, message, self.retry_after)
+
+    async def acquire(self, client: str):
+        """获取执行名额,必要时排队;超限时抛出 AdmissionRejected。获取成功后必须调用 release"""
+        if self._client_load.get(client, 0) >= self.per_client_limit:
+            self._reject(429, f"客户端 {client} 的并发请求过多", "rejected_client")
+
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            self._client_load[client] = self._client_load.get(client, 0) + 1
+            ADMISSION_EVENTS.inc(result="admitted")
+            return
+
+        if self.queued >= self.max_queue:
+            self._reject(503, "服务繁忙,请稍后重试", "rejected_queue")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client, deque()).append(future)
+        self.queued += 1
+        self._client_load[client] = self._client_load.get(client, 0) + 1
+        ADMISSION_EVENTS.inc(result="queued")
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 已分配到名额但调用方放弃了,归还名额
+                self.release(client)
+            else:
+                future.cancel()
+                self._dequeue(client, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(503, f"排队超过 {self.queue_timeout}s,请稍后重试", "timeout")
+            raise
+
+    def _dequeue(self, client: str, future: asyncio.Future):
+        queue = self._queues.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            self._decrement(client)
+            if not queue:
+                del self._queues[client]
+
+    def _decrement(self, client: str):
+        remaining = self._client_load.get(client, 0) - 1
+        if remaining > 0:
+            self._client_load[client] = remaining
+        else:
+            self._client_load.pop(client, None)
+
+    def release(self, client: str):
+        """归还执行名额,并按客户端轮转唤醒排队的请求"""
+        self.active -= 1
+        self._decrement(client)
+        while self.active < self.max_concurrency and self._queues:
+            next_client, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(next_client)
+            else:
+                del self._queues[next_client]
+            if future.cancelled():
+                self._decrement(next_client)
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    async def _run_admitted(self, client: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        await self.acquire(client)
+        try:
+            return await compute()
+        finally:
+            self.release(client)
+
+    async def run(self, key: Optional[str], client: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在准入控制下执行 compute
+
+        Args:
+            key: 合并键,相同 key 的在途请求只执行一次;None 表示不合并
+            client: 客户端标识,用于单客户端限流和公平调度
+        """
+        while key is not None and key in self._inflight:
+            leader = self._inflight[key]
+            self.coalesced += 1
+            ADMISSION_EVENTS.inc(result="coalesced")
+            try:
+                return await asyncio.shield(leader)
+            except AdmissionRejected:
+                # 领头请求按它自己的客户端被拒绝(如单客户端超限),与跟随者无关:
+                # 跟随者按自己的客户端重新申请,第一个重新申请的成为新的领头请求
+                if self._inflight.get(key) is leader:
+                    del self._inflight[key]
+                self.coalesced -= 1
+
+        task = asyncio.ensure_future(self._run_admitted(client, compute))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda _: self._inflight.pop(key) if self._inflight.get(key) is task else None
+            )
+        # 领头请求的调用方断开时继续执行,结果仍交给跟随者
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "inflight_keys": len(self._inflight),
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+    def collect(self) -> List[str]:
+        """Prometheus 采集函数"""
+        return [
+            "# HELP trip_admission_active 正在执行的规划请求数",
+            "# TYPE trip_admission_active gauge",
+            f"trip_admission_active {self.active}",
+            "# HELP trip_admission_queued 排队等待的规划请求数",
+            "# TYPE trip_admission_queued gauge",
+            f"trip_admission_queued {self.queued}",
+        ]
@@ -0,0 +1,42 @@
+from typing import Optional
+
+from hello_agents.cache import ToolResultCache, parse_ttls
+from hello_agents.tools import MCPTool
+from app.config import Settings
+
+# 高德MCP工具集及其结果缓存的构建,规划Agent和MCP代理进程共用同一份配置
+
+def create_tool_cache(settings: Settings, disk: bool = True) -> ToolResultCache:
+    """MCP工具结果缓存:天气短TTL,POI搜索长TTL;disk 为 True 时使用SQLite磁盘层(可多进程共享)"""
+    disk_path = (settings.tool_cache_db or settings.shared_cache_db) if disk else ""
+    return ToolResultCache(
+        max_size=settings.tool_cache_size,
+        default_ttl=settings.tool_cache_default_ttl,
+        tool_ttls=parse_ttls(settings.tool_cache_ttls),
+        disk_path=disk_path or None
+    )
+
+def create_mcp_tool(
+    settings: Settings,
+    cache: Optional[ToolResultCache] = None,
+    broker_address: Optional[str] = None
+) -> MCPTool:
+    """
+    高德MCP工具集
+
+    Args:
+        broker_address: MCP代理地址,给定时不在本进程启动MCP服务进程
+    """
+    return MCPTool(
+        name="amap_mcp",
+        command=settings.amap_mcp_command,
+        args=settings.amap_mcp_args.split(),
+        env={"AMAP_MAPS_API_KEY": settings.amap_api_key},
+        auto_expand=True,
+        pool_size=settings.mcp_pool_size,
+        health_check_interval=settings.mcp_health_check_interval,
+        cache=cache,
+        snapshot_path=settings.mcp_catalog_snapshot or None,
+        snapshot_max_age=settings.mcp_catalog_snapshot_max_age,
+        broker_address=broker_address
+    )
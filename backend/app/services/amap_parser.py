@@ -0,0 +1,90 @@
+import json
+from typing import List, Optional, Any, Dict
+import logging
+
+from app.models.schemas import WeatherInfo, POI, Location
+
+logger = logging.getLogger(__name__)
+
+def _load_json(text: str) -> Optional[Dict[str, Any]]:
+    """解析高德MCP工具返回的JSON文本"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def parse_weather_forecasts(text: str) -> List[WeatherInfo]:
+    """
+    将maps_weather的结果转换为WeatherInfo列表
+
+    高德返回格式: {"city": "北京市", "forecasts": [{"date", "dayweather", "nightweather",
+    "daytemp", "nighttemp", "daywind", "daypower", ...}]}
+    """
+    data = _load_json(text)
+    if data is None:
+        logger.warning("无法解析天气结果")
+        return []
+
+    weather_list = []
+    for cast in data.get("forecasts") or []:
+        try:
+            power = str(cast.get("daypower", ""))
+            weather_list.append(WeatherInfo(
+                date=cast["date"],
+                day_weather=cast.get("dayweather", ""),
+                night_weather=cast.get("nightweather", ""),
+                day_temp=cast.get("daytemp", 0),
+                night_temp=cast.get("nighttemp", 0),
+                wind_direction=cast.get("daywind", ""),
+                wind_power=power if not power or power.endswith("级") else f"{power}级"
+            ))
+        except (KeyError, ValueError) as e:
+            logger.warning(f"跳过无效的天气预报: {e}")
+    return weather_list
+
+def _parse_location(value: Any) -> Optional[Location]:
+    """解析 "经度,纬度" 形式的坐标"""
+    try:
+        longitude, latitude = (float(part) for part in str(value).split(","))
+        return Location(longitude=longitude, latitude=latitude)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_rating(poi: Dict[str, Any]) -> Optional[float]:
+    rating = poi.get("rating")
+    if rating in (None, "", []) and isinstance(poi.get("biz_ext"), dict):
+        rating = poi["biz_ext"].get("rating")
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        return None
+    return rating if 0 <= rating <= 5 else None
+
+def parse_pois(text: str) -> List[POI]:
+    """
+    将maps_text_search的结果转换为POI列表
+
+    高德返回格式: {"suggestion": {...}, "pois": [{"id", "name", "address", "typecode",
+    "location": "经度,纬度", "type", "biz_ext": {"rating"}, ...}]},location 等字段可能缺失
+    """
+    data = _load_json(text)
+    if data is None:
+        logger.warning("无法解析POI搜索结果")
+        return []
+
+    pois = []
+    for poi in data.get("pois") or []:
+        if not isinstance(poi, dict) or not poi.get("name"):
+            continue
+        address = poi.get("address")
+        pois.append(POI(
+            id=str(poi.get("id") or ""),
+            name=str(poi["name"]),
+            # 高德在缺少字段时返回空数组
+            address=address if isinstance(address, str) else "",
+            location=_parse_location(poi.get("location")),
+            type=str(poi.get("type") or poi.get("typecode") or ""),
+            rating=_parse_rating(poi)
+        ))
+    return pois
@@ -0,0 +1,200 @@
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schemas import Attraction, Location
+
+logger = logging.getLogger(__name__)
+
+# 行程路线的本地优化: 按每日游览时间预算把景点聚类到各天(带容量约束的 k-means),
+# 再用最近邻 + 2-opt 求解每天的游览顺序。距离为向量化计算的 haversine 球面距离(公里)。
+# 几百个候选景点也只需数毫秒,LLM 不再负责排路线。
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_DAILY_MINUTES = 480
+# 容量按平均每天游览时间放宽的比例,避免某天过满而另一天过空
+BALANCE_SLACK = 1.25
+
+def haversine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组 (经度, 纬度) 坐标(角度)之间的球面距离矩阵(公里),形状 (len(a), len(b))"""
+    a = np.radians(np.asarray(a, dtype=float).reshape(-1, 2))
+    b = np.radians(np.asarray(b, dtype=float).reshape(-1, 2))
+    dlon = b[None, :, 0] - a[:, None, 0]
+    dlat = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 1]) * np.cos(b[None, :, 1]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+def _farthest_first(coords: np.ndarray, k: int) -> np.ndarray:
+    """确定性的初始中心: 先取离整体中心最远的点,之后每次取离已选中心最远的点"""
+    center = coords.mean(axis=0, keepdims=True)
+    chosen = [int(np.argmax(haversine_matrix(coords, center)[:, 0]))]
+    nearest = haversine_matrix(coords, coords[chosen])[:, 0]
+    while len(chosen) < k:
+        index = int(np.argmax(nearest))
+        chosen.append(index)
+        nearest = np.minimum(nearest, haversine_matrix(coords, coords[[index]])[:, 0])
+    return coords[chosen].copy()
+
+def _assign(distances: np.ndarray, durations: np.ndarray, capacity: float, limit: float) -> np.ndarray:
+    """
+    在容量约束下把点分配给最近的中心,返回每个点所属的簇(放不下的点为 -1)
+    按"遗憾值"(次近与最近中心的距离差)从大到小依次分配,越没有退路的点越先挑选。
+    优先遵守均衡容量 capacity,都放不下时再放宽到每日上限 limit
+    """
+    n, k = distances.shape
+    preference = np.argsort(distances, axis=1)
+    if k > 1:
+        ordered = np.take_along_axis(distances, preference[:, :2], axis=1)
+        regret = ordered[:, 1] - ordered[:, 0]
+    else:
+        regret = np.zeros(n)
+
+    # 逐点分配是顺序依赖的,用Python列表比逐元素访问numpy数组快得多
+    labels = [-1] * n
+    used = [0.0] * k
+    preference_lists = preference.tolist()
+    duration_list = durations.tolist()
+    for i in np.argsort(-regret, kind="stable").tolist():
+        duration = duration_list[i]
+        for bound in (capacity, limit):
+            cluster = next((c for c in preference_lists[i] if used[c] + duration <= bound), None)
+            if cluster is not None:
+                labels[i] = cluster
+                used[cluster] += duration
+                break
+    return np.array(labels, dtype=int)
+
+def cluster_days(
+    coords: Sequence[Tuple[float, float]],
+    durations: Sequence[float],
+    days: int,
+    daily_minutes: float = DEFAULT_DAILY_MINUTES,
+    max_iterations: int = 30
+) -> List[List[int]]:
+    """
+    带容量约束的 k-means,把景点分配到各天
+
+    Args:
+        coords: 每个景点的 (经度, 纬度)
+        durations: 每个景点的游览时间(分钟)
+        days: 天数
+        daily_minutes: 每天的游览时间预算
+    Returns:
+        每天的景点下标列表。候选按优先级排列,总时长超出预算时靠后的景点被舍弃
+    """
+    if days <= 0 or not len(coords):
+        return [[] for _ in range(max(days, 0))]
+
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    durations = np.asarray(durations, dtype=float)
+
+    # 按优先级保留能放进总预算的景点
+    within_budget = np.cumsum(durations) <= days * daily_minutes
+    within_budget[0] = True
+    candidates = np.flatnonzero(within_budget)
+    coords, durations = coords[candidates], durations[candidates]
+
+    k = min(days, len(candidates))
+    limit = max(daily_minutes, durations.max())
+    capacity = min(limit, max(durations.sum() / k * BALANCE_SLACK, durations.max()))
+    centroids = _farthest_first(coords, k)
+    labels = np.full(len(candidates), -2, dtype=int)
+    for _ in range(max_iterations):
+        updated = _assign(haversine_matrix(coords, centroids), durations, capacity, limit)
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+        for cluster in range(k):
+            members = coords[labels == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+
+    dropped = int((labels < 0).sum()) + len(within_budget) - len(candidates)
+    if dropped:
+        logger.info(f"{dropped}个景点超出每日游览时间预算,未安排")
+
+    clusters = [candidates[labels == cluster].tolist() for cluster in range(k)]
+    clusters += [[] for _ in range(days - k)]
+    # 各天按与第一天中心的距离排序,使相邻两天的区域也相近
+    order = np.argsort(haversine_matrix(centroids, centroids[:1])[:, 0], kind="stable")
+    return [clusters[i] for i in order] + clusters[k:]
+
+def _two_opt(route: np.ndarray, distances: np.ndarray, max_passes: int = 50) -> np.ndarray:
+    """对固定起点(route[0])的闭合回路做 2-opt 改进,每个 i 的所有候选 j 向量化计算"""
+    m = len(route)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, m - 1):
+            a, b = route[i - 1], route[i]
+            c = route[i + 1:]
+            d = np.append(route[i + 2:], route[0])
+            delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                route[i:i + j + 2] = route[i:i + j + 2][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return route
+
+def order_route(
+    coords: Sequence[Tuple[float, float]],
+    start: Optional[Tuple[float, float]] = None
+) -> List[int]:
+    """
+    求一天的游览顺序(最近邻构造 + 2-opt)
+
+    Args:
+        coords: 景点的 (经度, 纬度)
+        start: 起点(如酒店)坐标。给定时按"酒店出发并返回"的回路优化,否则为起终点自由的路径
+    Returns:
+        景点下标的游览顺序
+    """
+    n = len(coords)
+    if n <= 2 and start is None:
+        return list(range(n))
+
+    distances = haversine_matrix(coords, coords)
+    # 节点0为起点;没有起点时用到各点距离都为0的虚拟节点,回路即退化为开放路径
+    depot = haversine_matrix([start], coords)[0] if start is not None else np.zeros(n)
+    full = np.zeros((n + 1, n + 1))
+    full[1:, 1:] = distances
+    full[0, 1:] = full[1:, 0] = depot
+
+    route = [0]
+    unvisited = np.ones(n + 1, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n):
+        candidates = np.flatnonzero(unvisited)
+        nearest = candidates[int(np.argmin(full[route[-1], candidates]))]
+        route.append(int(nearest))
+        unvisited[nearest] = False
+
+    route = _two_opt(np.array(route), full)
+    return [int(node) - 1 for node in route[1:]]
+
+def _coords(location: Location) -> Tuple[float, float]:
+    return location.longitude, location.latitude
+
+def order_attractions(attractions: List[Attraction], hotel: Optional[Location] = None) -> List[Attraction]:
+    """按最短路线重新排列一天内的景点"""
+    if len(attractions) < 2:
+        return list(attractions)
+    order = order_route([_coords(a.location) for a in attractions], _coords(hotel) if hotel else None)
+    return [attractions[i] for i in order]
+
+def plan_routes(
+    attractions: List[Attraction],
+    days: int,
+    hotel: Optional[Location] = None,
+    daily_minutes: float = DEFAULT_DAILY_MINUTES
+) -> List[List[Attraction]]:
+    """把候选景点(按优先级排列)分配到各天并排好每天的游览顺序"""
+    clusters = cluster_days(
+        [_coords(a.location) for a in attractions],
+        [a.visit_duration for a in attractions],
+        days,
+        daily_minutes
+    )
+    return [order_attractions([attractions[i] for i in cluster], hotel) for cluster in clusters]
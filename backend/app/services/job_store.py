@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from app.models.schemas import TripPlanJob
+
+class JobStore(ABC):
+    """
+    规划任务存储接口
+
+    实现需要支持按ID和幂等键查找、新建与整体覆盖保存,以及清理过期的已完成任务
+    """
+
+    @abstractmethod
+    def create(self, job: TripPlanJob) -> bool:
+        """
+        新建任务,返回是否写入
+
+        幂等键已被其他任务占用时不写入并返回 False;共享存储的实现需要保证原子性
+        """
+
+    @abstractmethod
+    def save(self, job: TripPlanJob):
+        """覆盖保存已存在的任务"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[TripPlanJob]:
+        """按ID查找任务,不存在时返回 None"""
+
+    @abstractmethod
+    def find_by_idempotency_key(self, key: str) -> Optional[TripPlanJob]:
+        """按幂等键查找任务,不存在时返回 None"""
+
+    @abstractmethod
+    def unfinished(self) -> List[TripPlanJob]:
+        """排队中或执行中的任务,用于进程重启后恢复"""
+
+    @abstractmethod
+    def claim(self, job_id: str) -> Optional[TripPlanJob]:
+        """
+        领取排队中的任务并标记为执行中,返回领取到的任务
+
+        任务不存在、已完成或已被其他 worker 领取时返回 None;共享存储的实现需要保证原子性
+        """
+
+    @abstractmethod
+    def prune(self, finished_before: float) -> int:
+        """删除在指定时间之前完成的任务,返回删除数量"""
+
+    def close(self):
+        pass
+
+class MemoryJobStore(JobStore):
+    """进程内任务存储,重启后任务丢失"""
+
+    def __init__(self):
+        self._jobs: Dict[str, TripPlanJob] = {}
+        self._keys: Dict[str, str] = {}
+
+    def create(self, job: TripPlanJob) -> bool:
+        if job.idempotency_key and job.idempotency_key in self._keys:
+            return False
+        self._jobs[job.job_id] = job.model_copy(deep=True)
+        if job.idempotency_key:
+            self._keys[job.idempotency_key] = job.job_id
+        return True
+
+    def save(self, job: TripPlanJob):
+        if job.job_id in self._jobs:
+            self._jobs[job.job_id] = job.model_copy(deep=True)
+
+    def get(self, job_id: str) -> Optional[TripPlanJob]:
+        job = self._jobs.get(job_id)
+        return job.model_copy(deep=True) if job is not None else None
+
+    def find_by_idempotency_key(self, key: str) -> Optional[TripPlanJob]:
+        job_id = self._keys.get(key)
+        return self.get(job_id) if job_id else None
+
+    def unfinished(self) -> List[TripPlanJob]:
+        return [job.model_copy(deep=True) for job in self._jobs.values() if not job.finished]
+
+    def claim(self, job_id: str) -> Optional[TripPlanJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.status != "queued":
+            return None
+        job.status = "running"
+        job.updated_at = time.time()
+        return job.model_copy(deep=True)
+
+    def prune(self, finished_before: float) -> int:
+        expired = [
+            job for job in self._jobs.values() if job.finished and job.updated_at < finished_before
+        ]
+        for job in expired:
+            del self._jobs[job.job_id]
+            if job.idempotency_key and self._keys.get(job.idempotency_key) == job.job_id:
+                del self._keys[job.idempotency_key]
+        return len(expired)
+
+class SQLiteJobStore(JobStore):
+    """
+    基于 SQLite 的任务存储,进程重启后已完成的结果仍可获取,未完成的任务会被重新执行
+
+    使用 WAL 模式,多个 worker 进程可以共享同一个数据库:任一进程都能查询任务状态,
+    任务由 claim 原子地领取,只会被一个进程执行
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS trip_jobs ("
+            "job_id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE, status TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(self, job: TripPlanJob) -> bool:
+        with self._lock:
+            # 幂等键冲突时不写入(INSERT OR REPLACE 会删除先提交的任务)
+            cursor = self._conn.execute(
+                "INSERT INTO trip_jobs (job_id, idempotency_key, status, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING",
+                (job.job_id, job.idempotency_key, job.status, job.updated_at, job.model_dump_json())
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def save(self, job: TripPlanJob):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE trip_jobs SET status = ?, updated_at = ?, data = ? WHERE job_id = ?",
+                (job.status, job.updated_at, job.model_dump_json(), job.job_id)
+            )
+            self._conn.commit()
+
+    def _fetch_one(self, query: str, params: tuple) -> Optional[TripPlanJob]:
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return TripPlanJob.model_validate_json(row[0]) if row else None
+
+    def get(self, job_id: str) -> Optional[TripPlanJob]:
+        return self._fetch_one("SELECT data FROM trip_jobs WHERE job_id = ?", (job_id,))
+
+    def find_by_idempotency_key(self, key: str) -> Optional[TripPlanJob]:
+        return self._fetch_one("SELECT data FROM trip_jobs WHERE idempotency_key = ?", (key,))
+
+    def unfinished(self) -> List[TripPlanJob]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM trip_jobs WHERE status NOT IN ('succeeded', 'failed') ORDER BY updated_at"
+            ).fetchall()
+        return [TripPlanJob.model_validate_json(row[0]) for row in rows]
+
+    def claim(self, job_id: str) -> Optional[TripPlanJob]:
+        job = self._fetch_one("SELECT data FROM trip_jobs WHERE job_id = ? AND status = 'queued'", (job_id,))
+        if job is None:
+            return None
+        job.status = "running"
+        job.updated_at = time.time()
+        with self._lock:
+            # 只有状态仍为 queued 时才更新,其他进程抢先领取时影响行数为0
+            cursor = self._conn.execute(
+                "UPDATE trip_jobs SET status = ?, updated_at = ?, data = ? WHERE job_id = ? AND status = 'queued'",
+                (job.status, job.updated_at, job.model_dump_json(), job_id)
+            )
+            self._conn.commit()
+        return job if cursor.rowcount == 1 else None
+
+    def prune(self, finished_before: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM trip_jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                (finished_before,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_job_store(kind: str, path: str = "") -> JobStore:
+    """按配置创建任务存储: memory 或 sqlite"""
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        if not path:
+            raise ValueError("JOB_STORE=sqlite 需要配置 JOB_DB")
+        return SQLiteJobStore(path)
+    raise ValueError(f"未知的任务存储类型: {kind}")
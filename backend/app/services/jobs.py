@@ -0,0 +1,207 @@
+import asyncio
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.models.schemas import DayPlan, TripPlan, TripPlanJob, TripPlanRequest
+from app.services.job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyConflict(Exception):
+    """相同幂等键对应的任务请求内容不同"""
+
+class JobManager:
+    """
+    异步规划任务管理
+
+    提交后立即返回任务ID,由进程内固定数量的 worker 依次执行;
+    客户端可以轮询(支持长轮询)或订阅状态变化,完成后按ID重复获取结果。
+    多进程共享存储时,任务由提交它的进程执行,长轮询每 poll_interval 秒检查一次其他进程的更新。
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, ttl: float = 86400, poll_interval: float = 1.0):
+        self.store = store
+        self.workers = workers
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._runner: Optional[Callable[[TripPlanJob], Awaitable[TripPlan]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # 任务ID -> 状态变化事件,每次更新后替换为新事件
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def start(self, runner: Callable[[TripPlanJob], Awaitable[TripPlan]], recover_running: bool = True):
+        """
+        启动 worker,并重新排队上次进程退出时未完成的任务
+
+        Args:
+            recover_running: 是否把执行中的任务也重新排队。多进程共享存储时执行中的任务可能属于
+                仍在运行的其他进程,应由启动器在启动各进程前调用 requeue_running 统一恢复
+        """
+        if self._tasks:
+            return
+        self._runner = runner
+        self._queue = asyncio.Queue()
+        if recover_running:
+            requeue_running(self.store)
+        for job in self.store.unfinished():
+            if job.status == "queued":
+                # 多个进程都会排队同一任务,由 claim 保证只执行一次
+                self._queue.put_nowait(job.job_id)
+                logger.info(f"恢复未完成的规划任务: {job.job_id}")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _notify(self, job_id: str):
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _save(self, job: TripPlanJob):
+        job.updated_at = time.time()
+        self.store.save(job)
+        self._notify(job.job_id)
+
+    def submit(
+        self,
+        request: TripPlanRequest,
+        idempotency_key: Optional[str] = None,
+        client_id: str = ""
+    ) -> Tuple[TripPlanJob, bool]:
+        """
+        提交规划任务,返回 (任务, 是否新建)
+
+        相同幂等键的重复提交返回已有任务;请求内容不同时抛出 IdempotencyConflict
+        """
+        if self._queue is None:
+            raise RuntimeError("任务管理器尚未启动")
+        self.store.prune(time.time() - self.ttl)
+
+        if idempotency_key:
+            existing = self._find_existing(request, idempotency_key)
+            if existing is not None:
+                return existing, False
+
+        now = time.time()
+        job = TripPlanJob(
+            job_id=uuid.uuid4().hex,
+            request=request,
+            idempotency_key=idempotency_key or None,
+            client_id=client_id,
+            created_at=now,
+            updated_at=now
+        )
+        if not self.store.create(job):
+            # 并发提交相同幂等键时,以先写入的任务为准
+            existing = self._find_existing(request, idempotency_key)
+            if existing is not None:
+                return existing, False
+            raise RuntimeError(f"幂等键 {idempotency_key} 对应的任务写入失败")
+        self._queue.put_nowait(job.job_id)
+        return job, True
+
+    def _find_existing(self, request: TripPlanRequest, idempotency_key: str) -> Optional[TripPlanJob]:
+        existing = self.store.find_by_idempotency_key(idempotency_key)
+        if existing is not None and existing.request != request:
+            raise IdempotencyConflict(f"幂等键 {idempotency_key} 已用于不同的请求")
+        return existing
+
+    def get(self, job_id: str) -> Optional[TripPlanJob]:
+        return self.store.get(job_id)
+
+    def set_stage(self, job_id: str, stage: str):
+        """记录执行中任务的当前阶段"""
+        job = self.store.get(job_id)
+        if job is not None and not job.finished and job.stage != stage:
+            job.stage = stage
+            self._save(job)
+
+    def add_day(self, job_id: str, day: DayPlan):
+        """记录执行中任务已生成的一天行程,客户端可以在计划完成前逐天展示"""
+        job = self.store.get(job_id)
+        if job is None or job.finished:
+            return
+        # 分块规划的各天并发生成,可能乱序到达
+        job.days = sorted(
+            [existing for existing in job.days if existing.day_index != day.day_index] + [day],
+            key=lambda existing: existing.day_index
+        )
+        self._save(job)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[TripPlanJob]:
+        """长轮询:任务已完成时立即返回,否则等待下一次状态变化或超时后返回当前状态"""
+        job = self.store.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+                break
+            except asyncio.TimeoutError:
+                # 任务可能由其他进程执行,其状态变化只能从存储中看到
+                latest = self.store.get(job_id)
+                if latest is None or latest.updated_at != job.updated_at:
+                    return latest
+        return self.store.get(job_id)
+
+    async def subscribe(self, job_id: str, heartbeat: float = 15) -> AsyncIterator[TripPlanJob]:
+        """依次产出任务的每次状态变化,直到任务完成;长时间无变化时重复产出当前状态作为心跳"""
+        job = self.store.get(job_id)
+        while job is not None:
+            yield job
+            if job.finished:
+                return
+            job = await self.wait(job_id, heartbeat)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.store.claim(job_id)
+            if job is None:
+                # 不存在、已完成或已被其他进程领取
+                continue
+            self._notify(job_id)
+            try:
+                job.result = await self._runner(job)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"规划任务 {job_id} 失败: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            # 执行期间记录的阶段和每日行程以存储中的为准
+            latest = self.store.get(job_id)
+            if latest is not None:
+                job.stage, job.days = latest.stage, latest.days
+            self._save(job)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+def requeue_running(store: JobStore) -> int:
+    """把执行中的任务(上次退出时被中断)重新标记为排队中,返回数量"""
+    count = 0
+    for job in store.unfinished():
+        if job.status == "running":
+            job.status = "queued"
+            job.stage = None
+            job.days = []
+            job.updated_at = time.time()
+            store.save(job)
+            count += 1
+    return count
@@ -0,0 +1,110 @@
+import re
+from datetime import date, timedelta
+from typing import Optional, Dict, Any
+import logging
+
+from hello_agents.cache import LRUCache, SQLiteCache, TieredCache, MISSING
+from app.models.schemas import TripPlanRequest, TripPlan
+
+logger = logging.getLogger(__name__)
+
+_SEASONS = {
+    12: "winter", 1: "winter", 2: "winter",
+    3: "spring", 4: "spring", 5: "spring",
+    6: "summer", 7: "summer", 8: "summer",
+    9: "autumn", 10: "autumn", 11: "autumn",
+}
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+def _normalize_text(value: str) -> str:
+    """统一大小写、空白和分隔符，偏好等多值字段按字典序排列"""
+    parts = [p for p in re.split(r"[\s,，、/;；]+", value.strip().lower()) if p]
+    return "+".join(sorted(parts))
+
+class PlanCache:
+    """
+    旅行计划缓存
+
+    key 由规范化后的TripPlanRequest生成，日期范围被归一化为"天数 + 季节"，
+    因此不同日期出发的同类请求可以复用同一份计划，命中后重新计算日期。
+    给定 disk_path 时计划同时写入SQLite磁盘层,多个 worker 进程共享
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 86400, disk_path: Optional[str] = None):
+        disk = SQLiteCache(disk_path, table="trip_plans") if disk_path else None
+        self._cache = TieredCache(LRUCache(max_size=max_size, default_ttl=ttl), disk)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(request: TripPlanRequest) -> Optional[str]:
+        start = _parse_date(request.start_date)
+        if start is None:
+            return None
+        return "|".join([
+            _normalize_text(request.city),
+            str(request.days),
+            _SEASONS[start.month],
+            _normalize_text(request.preferences),
+            _normalize_text(request.budget),
+            _normalize_text(request.transportation),
+            _normalize_text(request.accommodation),
+        ])
+
+    def get(self, request: TripPlanRequest) -> Optional[TripPlan]:
+        """命中时返回按请求日期重新排期的计划副本"""
+        key = self.make_key(request)
+        plan = self._cache.get(key) if key else MISSING
+        if plan is MISSING:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logger.info(f"计划缓存命中: {key} (命中率 {self.hit_ratio:.1%})")
+        return redate_plan(TripPlan.model_validate(plan), request)
+
+    def set(self, request: TripPlanRequest, plan: TripPlan):
+        key = self.make_key(request)
+        if key:
+            self._cache.set(key, plan.model_dump(mode="json"))
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self._cache.memory.evictions,
+            "size": len(self._cache.memory),
+        }
+
+    def close(self):
+        if self._cache.disk is not None:
+            self._cache.disk.close()
+
+def redate_plan(plan: TripPlan, request: TripPlanRequest) -> TripPlan:
+    """
+    将缓存的计划平移到请求的日期范围
+
+    日期变化后原有天气信息不再有效，会被清空，由调用方合并最新天气。
+    """
+    plan = plan.model_copy(deep=True)
+    start = _parse_date(request.start_date)
+    if start is None or plan.start_date == request.start_date:
+        return plan
+
+    for day in plan.days:
+        day.date = (start + timedelta(days=day.day_index)).isoformat()
+    plan.start_date = request.start_date
+    plan.end_date = request.end_date
+    plan.weather_info = []
+    return plan
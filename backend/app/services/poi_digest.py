@@ -0,0 +1,97 @@
+import re
+from dataclasses import dataclass
+from itertools import zip_longest
+from typing import List
+
+from hello_agents import metrics
+from hello_agents.core import estimate_tokens
+from app.models.schemas import POI
+from app.services.itinerary_optimizer import haversine_matrix
+
+# 规划前的POI整理: 把 maps_text_search 的原始结果解析为结构化记录,
+# 按位置去重、排序并按天数截断,再渲染为紧凑的表格放进规划提示词。
+
+POI_DIGEST_TOKENS = metrics.REGISTRY.counter(
+    "trip_poi_digest_tokens_total", "POI摘要前后的token估算(raw 为原始搜索结果, digest 为摘要)", ["kind"]
+)
+
+# 每天提供给规划Agent的候选景点数
+CANDIDATES_PER_DAY = 4
+MAX_HOTELS = 5
+# 分块规划时为每天推荐的就近酒店数
+NEARBY_HOTELS = 3
+# 两个POI距离小于该值(米)时视为同一地点(如同一景区的多个入口)
+DUPLICATE_RADIUS_M = 50
+MAX_KEYWORDS = 3
+
+@dataclass
+class PoiDigest:
+    pois: List[POI]
+    text: str
+    raw_tokens: int
+    digest_tokens: int
+
+def split_keywords(text: str, default: str) -> List[str]:
+    """把用户偏好拆分为搜索关键词,如 "历史文化、美食" -> ["历史文化", "美食"]"""
+    keywords = [k for k in re.split(r"[,，、/;；\s]+", text or "") if k]
+    return list(dict.fromkeys(keywords))[:MAX_KEYWORDS] or [default]
+
+def dedupe_pois(pois: List[POI], radius_m: float = DUPLICATE_RADIUS_M) -> List[POI]:
+    """按ID、名称和位置去重,保留先出现的(搜索排名更靠前的)记录"""
+    kept: List[POI] = []
+    seen = set()
+    for poi in pois:
+        keys = {poi.name} | ({poi.id} if poi.id else set())
+        if keys & seen:
+            continue
+        if poi.location is not None:
+            located = [p.location for p in kept if p.location is not None]
+            if located:
+                distances = haversine_matrix(
+                    [(poi.location.longitude, poi.location.latitude)],
+                    [(l.longitude, l.latitude) for l in located]
+                )
+                if distances.min() * 1000 < radius_m:
+                    continue
+        seen |= keys
+        kept.append(poi)
+    return kept
+
+def rank_pois(pois: List[POI]) -> List[POI]:
+    """有坐标的优先(可以排路线),其次按评分,同分保持搜索结果的顺序"""
+    return sorted(pois, key=lambda poi: (poi.location is None, -(poi.rating or 0)))
+
+def render_digest(pois: List[POI]) -> str:
+    """渲染为紧凑的表格:名称|地址|经度,纬度|类型|评分"""
+    rows = ["名称|地址|经度,纬度|类型|评分"]
+    for poi in pois:
+        location = f"{poi.location.longitude:.6f},{poi.location.latitude:.6f}" if poi.location else "-"
+        rating = f"{poi.rating:g}" if poi.rating is not None else "-"
+        rows.append(f"{poi.name}|{poi.address or '-'}|{location}|{poi.type.split(';')[-1] or '-'}|{rating}")
+    return "\n".join(rows)
+
+def select_pois(groups: List[List[POI]], limit: int) -> List[POI]:
+    """各关键词的结果轮流合并(使每个偏好都有代表),去重、排序后截断"""
+    pois = []
+    for group in zip_longest(*groups):
+        pois.extend(poi for poi in group if poi is not None)
+    return rank_pois(dedupe_pois(pois))[:limit]
+
+def build_digest(groups: List[List[POI]], limit: int, kind: str, raw_tokens: int) -> PoiDigest:
+    """
+    由各关键词的POI列表生成摘要,并记录节省的 token
+
+    Args:
+        groups: 各关键词的POI(按关键词优先级排列)
+        limit: 保留的POI数量上限
+        kind: 摘要类别(attractions / hotels),用于请求指标
+        raw_tokens: 对应的原始搜索结果的token估算
+    """
+    selected = select_pois(groups, limit)
+    text = render_digest(selected) if selected else ""
+
+    digest_tokens = estimate_tokens(text)
+    POI_DIGEST_TOKENS.inc(raw_tokens, kind="raw")
+    POI_DIGEST_TOKENS.inc(digest_tokens, kind="digest")
+    metrics.note(f"poi_tokens_saved.{kind}", max(raw_tokens - digest_tokens, 0))
+    return PoiDigest(selected, text, raw_tokens, digest_tokens)
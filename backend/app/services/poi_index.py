@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.models.schemas import POI, Location
+from app.services.itinerary_optimizer import haversine_matrix
+
+logger = logging.getLogger(__name__)
+
+# 城市POI本地索引: 由 maps_text_search 的结果顺带填充(也可从种子文件预加载),
+# 按 (城市, 类别) 存储,带网格空间索引和关键词过滤。同城的POI几乎不变,
+# 多数规划请求可以直接在本地取候选景点和酒店,过期的关键词在后台刷新。
+
+# 网格边长(度),约1公里
+GRID_CELL_DEG = 0.01
+
+@dataclass
+class KeywordEntry:
+    """一次关键词搜索的结果"""
+    keys: List[str]
+    fetched_at: float
+    # 原始搜索结果的token估算,用于统计摘要节省的token
+    raw_tokens: int = 0
+
+@dataclass
+class PoiBucket:
+    """单个 (城市, 类别) 下的POI及其索引"""
+    pois: Dict[str, POI] = field(default_factory=dict)
+    keywords: Dict[str, KeywordEntry] = field(default_factory=dict)
+    grid: Dict[Tuple[int, int], Set[str]] = field(default_factory=dict)
+
+def _poi_key(poi: POI) -> str:
+    return poi.id or poi.name
+
+def _cell(location: Location) -> Tuple[int, int]:
+    return math.floor(location.longitude / GRID_CELL_DEG), math.floor(location.latitude / GRID_CELL_DEG)
+
+def _ring_cells(cx: int, cy: int, ring: int) -> Iterator[Tuple[int, int]]:
+    """以 (cx, cy) 为中心、切比雪夫距离为 ring 的一圈网格,共 8*ring 个(ring=0 时为中心本身)"""
+    if ring == 0:
+        yield cx, cy
+        return
+    for x in range(cx - ring, cx + ring + 1):
+        yield x, cy - ring
+        yield x, cy + ring
+    for y in range(cy - ring + 1, cy + ring):
+        yield cx - ring, y
+        yield cx + ring, y
+
+class PoiIndex:
+    """
+    按城市和类别(attractions / hotels)组织的POI索引
+
+    - lookup: 关键词搜索过则返回当时的结果;否则按名称/类型匹配已有的POI,足够多时也直接返回
+    - nearest: 基于网格的最近邻查询,如为每天的景点中心挑选最近的酒店
+    - 超过 refresh_after 秒的关键词结果仍然返回,同时由调用方在后台刷新
+    """
+
+    def __init__(self, refresh_after: float = 7 * 86400):
+        self.refresh_after = refresh_after
+        self._buckets: Dict[Tuple[str, str], PoiBucket] = {}
+        self._refreshing: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _bucket(self, city: str, category: str) -> PoiBucket:
+        return self._buckets.setdefault((city.strip(), category), PoiBucket())
+
+    def add(self, city: str, category: str, keyword: str, pois: List[POI], raw_tokens: int = 0,
+            fetched_at: Optional[float] = None):
+        """记录一次关键词搜索的结果,同名/同ID的POI以新数据为准"""
+        bucket = self._bucket(city, category)
+        keys = []
+        for poi in pois:
+            key = _poi_key(poi)
+            old = bucket.pois.get(key)
+            if old is not None and old.location is not None:
+                bucket.grid.get(_cell(old.location), set()).discard(key)
+            bucket.pois[key] = poi
+            if poi.location is not None:
+                bucket.grid.setdefault(_cell(poi.location), set()).add(key)
+            keys.append(key)
+        bucket.keywords[keyword] = KeywordEntry(
+            keys, fetched_at if fetched_at is not None else time.time(), raw_tokens
+        )
+
+    def lookup(
+        self,
+        city: str,
+        category: str,
+        keyword: str,
+        min_results: int = 1
+    ) -> Optional[Tuple[List[POI], KeywordEntry]]:
+        """
+        本地查找候选POI,未命中返回 None
+
+        Returns:
+            (POI列表, 关键词条目);按名称/类型匹配得到的结果没有对应的搜索记录,条目的 fetched_at 为0
+        """
+        bucket = self._buckets.get((city.strip(), category))
+        if bucket is not None:
+            entry = bucket.keywords.get(keyword)
+            if entry is not None:
+                self.hits += 1
+                return [bucket.pois[key] for key in entry.keys if key in bucket.pois], entry
+
+            matched = self.filter(city, category, keyword)
+            if len(matched) >= min_results:
+                self.hits += 1
+                return matched, KeywordEntry([_poi_key(p) for p in matched], 0.0)
+
+        self.misses += 1
+        return None
+
+    def filter(self, city: str, category: str, keyword: str) -> List[POI]:
+        """名称或类型包含关键词的POI"""
+        bucket = self._buckets.get((city.strip(), category))
+        if bucket is None:
+            return []
+        return [poi for poi in bucket.pois.values() if keyword in poi.name or keyword in poi.type]
+
+    def is_stale(self, entry: KeywordEntry) -> bool:
+        return entry.fetched_at > 0 and time.time() - entry.fetched_at > self.refresh_after
+
+    def nearest(
+        self,
+        city: str,
+        category: str,
+        location: Location,
+        k: int = 3,
+        keyword: str = ""
+    ) -> List[POI]:
+        """
+        距离 location 最近的 k 个POI,从所在网格向外逐圈查找
+        给定 keyword 时只考虑该关键词搜索到的、或名称/类型包含关键词的POI
+        """
+        bucket = self._buckets.get((city.strip(), category))
+        if bucket is None or not bucket.grid:
+            return []
+        searched = set(bucket.keywords[keyword].keys) if keyword in bucket.keywords else set()
+
+        cx, cy = _cell(location)
+        xs = [x for x, _ in bucket.grid]
+        ys = [y for _, y in bucket.grid]
+        max_ring = max(abs(cx - min(xs)), abs(cx - max(xs)), abs(cy - min(ys)), abs(cy - max(ys)))
+
+        candidates: List[POI] = []
+        enough_at: Optional[int] = None
+        for ring in range(max_ring + 1):
+            for cell in _ring_cells(cx, cy, ring):
+                for key in bucket.grid.get(cell, ()):
+                    poi = bucket.pois[key]
+                    if not keyword or key in searched or keyword in poi.name or keyword in poi.type:
+                        candidates.append(poi)
+            # 凑够 k 个后再多查一圈:网格对角方向的点可能比下一圈的点更远
+            if enough_at is None and len(candidates) >= k:
+                enough_at = ring
+            elif enough_at is not None:
+                break
+
+        if not candidates:
+            return []
+        distances = haversine_matrix(
+            [(location.longitude, location.latitude)],
+            [(p.location.longitude, p.location.latitude) for p in candidates]
+        )[0]
+        return [candidates[i] for i in distances.argsort(kind="stable")[:k]]
+
+    def refresh(self, city: str, category: str, keyword: str, fetch: Callable[[], Awaitable[Any]]):
+        """在后台执行刷新(同一关键词同时只刷新一次)"""
+        key = (city, category, keyword)
+        if key in self._refreshing:
+            return
+        self.refreshes += 1
+
+        async def run():
+            try:
+                await fetch()
+            except Exception as e:
+                logger.warning(f"后台刷新POI失败 {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(run())
+
+    def load_seed(self, path: str) -> int:
+        """
+        从种子文件预加载,返回加载的POI数量
+
+        格式: {"城市": {"类别": {"关键词": [POI...] 或 {"fetched_at": 时间戳, "pois": [POI...]}}}}
+        没有 fetched_at 的数据视为很久以前获取,首次使用时会在后台刷新
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        count = 0
+        for city, categories in data.items():
+            for category, keywords in categories.items():
+                for keyword, items in keywords.items():
+                    if isinstance(items, list):
+                        items = {"pois": items}
+                    pois = [POI(**item) for item in items.get("pois") or []]
+                    self.add(
+                        city, category, keyword, pois,
+                        raw_tokens=items.get("raw_tokens", 0),
+                        fetched_at=items.get("fetched_at", 1.0)
+                    )
+                    count += len(pois)
+        return count
+
+    def save(self, path: str):
+        """以种子文件格式保存索引,下次启动时通过 load_seed 恢复"""
+        data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (city, category), bucket in self._buckets.items():
+            keywords = data.setdefault(city, {}).setdefault(category, {})
+            for keyword, entry in bucket.keywords.items():
+                keywords[keyword] = {
+                    "fetched_at": entry.fetched_at,
+                    "raw_tokens": entry.raw_tokens,
+                    "pois": [bucket.pois[key].model_dump(exclude_none=True) for key in entry.keys if key in bucket.pois],
+                }
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "size": sum(len(bucket.pois) for bucket in self._buckets.values()),
+        }
+
+    async def close(self):
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
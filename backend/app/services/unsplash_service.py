@@ -1,52 +1,93 @@
-import requests
-from typing import Optional, List, Dict
+import asyncio
+import httpx
+from typing import Optional, List, Dict, AsyncIterator, Tuple
 import logging
 
+from hello_agents.cache import LRUCache, SQLiteCache, TieredCache
+from hello_agents import metrics
+
 logger = logging.getLogger(__name__)
 
 class UnsplashService:
     """Unsplash图片服务"""
 
-    def __init__(self, access_key: str):
+    def __init__(
+        self,
+        access_key: str,
+        max_concurrency: int = 8,
+        cache_size: int = 2048,
+        cache_ttl: float = 7 * 86400,
+        timeout: float = 10,
+        base_url: str = "https://api.unsplash.com",
+        cache_db: Optional[str] = None
+    ):
         self.access_key = access_key
-        self.base_url = "https://api.unsplash.com"
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+        # 查询词 -> 图片URL 的LRU+TTL缓存,同一查询的并发请求只发一次;可选共享的SQLite磁盘层
+        self.cache = TieredCache(
+            LRUCache(max_size=cache_size, default_ttl=cache_ttl),
+            SQLiteCache(cache_db, table="unsplash_photos") if cache_db else None
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """共享的HTTP连接池,首次使用时创建"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._client
+
+    async def _fetch_photo_url(self, query: str) -> Optional[str]:
+        """请求Unsplash,失败时抛出异常(失败结果不写入缓存)"""
+        async with self._semaphore:
+            with metrics.span("unsplash"):
+                response = await self._get_client().get(
+                    "/search/photos",
+                    params={"query": query, "per_page": 1, "client_id": self.access_key}
+                )
+                response.raise_for_status()
+        results = response.json().get("results", [])
+        return results[0]["urls"]["regular"] if results else None
 
-    def search_photos(self, query: str, per_page: int = 10) -> List[Dict]:
-        """搜索图片"""
+    async def aget_photo_url(self, query: str) -> Optional[str]:
+        """异步获取单张图片URL"""
         if not self.access_key:
-            logger.warning("Unsplash access key not provided. Skipping image search.")
-            return []
-            
+            return None
         try:
-            url = f"{self.base_url}/search/photos"
-            params = {
-                "query": query,
-                "per_page": per_page,
-                "client_id": self.access_key
-            }
-
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
-            results = data.get("results", [])
-
-            # 提取图片URL
-            photos = []
-            for result in results:
-                photos.append({
-                    "url": result["urls"]["regular"],
-                    "description": result.get("description", ""),
-                    "photographer": result["user"]["name"]
-                })
-
-            return photos
-
+            return await self.cache.get_or_compute(query.strip(), lambda: self._fetch_photo_url(query))
         except Exception as e:
             logger.error(f"搜索图片失败: {e}")
-            return []
+            return None
+
+    async def get_photo_urls(self, queries: List[str]) -> Dict[str, Optional[str]]:
+        """批量并发获取图片URL,相同查询只请求一次,返回 {查询词: 图片URL}"""
+        unique = list(dict.fromkeys(q for q in queries if q))
+        urls = await asyncio.gather(*[self.aget_photo_url(q) for q in unique])
+        return dict(zip(unique, urls))
+
+    async def iter_photo_urls(self, queries: List[str]) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """批量并发获取图片URL,按完成顺序逐个产出 (查询词, 图片URL)"""
+        async def resolve(query: str) -> Tuple[str, Optional[str]]:
+            return query, await self.aget_photo_url(query)
+
+        unique = list(dict.fromkeys(q for q in queries if q))
+        for future in asyncio.as_completed([resolve(q) for q in unique]):
+            yield await future
 
-    def get_photo_url(self, query: str) -> Optional[str]:
-        """获取单张图片URL"""
-        photos = self.search_photos(query, per_page=1)
-        return photos[0].get("url") if photos else None
+    async def aclose(self):
+        """关闭HTTP连接池和缓存的磁盘层"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cache.disk is not None:
+            self.cache.disk.close()
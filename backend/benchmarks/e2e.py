@@ -0,0 +1,290 @@
+"""
+端到端离线基准
+
+在本地启动 OpenAI 兼容 LLM、高德MCP服务和 Unsplash 的替身,再以真实HTTP服务运行应用,
+按指定并发压测 /api/trip/plan,统计 p50/p95/p99 延迟、吞吐量,
+并根据 Server-Timing 响应头汇总各阶段耗时。结果保存为JSON,便于在不同提交之间对比。
+
+用法:
+    python benchmarks/e2e.py --requests 40 --concurrency 8
+    python benchmarks/e2e.py --compare benchmarks/results/<基线>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import llm as fake_llm
+from benchmarks.fakes import unsplash as fake_unsplash
+
+FAKE_MCP_SERVER = os.path.join(BACKEND_DIR, "benchmarks", "fakes", "amap_mcp.py")
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class BackgroundServer:
+    """在后台线程中运行的 uvicorn 服务"""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "BackgroundServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩法百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def parse_server_timing(header: str) -> Dict[str, Dict[str, float]]:
+    """
+    解析 'stage;dur=12.3;desc="x2", ...' 为 {阶段: {"dur": 毫秒, "count": 次数}}
+    没有 dur 的条目(如 'poi_tokens_saved.hotels;desc="120"')解析为 {"value": 数值}
+    """
+    stages: Dict[str, Dict[str, float]] = {}
+    for entry in filter(None, (e.strip() for e in (header or "").split(","))):
+        name, *params = entry.split(";")
+        values = {"dur": 0.0, "count": 1}
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                values["dur"] = float(value)
+            elif key == "desc" and value.strip('"').startswith("x"):
+                values["count"] = int(value.strip('"')[1:])
+            elif key == "desc":
+                values = {"value": float(value.strip('"'))}
+        stages[name] = values
+    return stages
+
+def make_request(index: int, days: int, distinct: bool) -> Dict[str, Any]:
+    start = date.today() + timedelta(days=7)
+    return {
+        "city": "北京",
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=days - 1)).isoformat(),
+        "days": days,
+        # 默认每个请求的偏好不同,避免命中计划缓存
+        "preferences": f"历史文化{index}" if distinct else "历史文化",
+        "budget": "中等",
+        "transportation": "公共交通",
+        "accommodation": "经济型酒店",
+    }
+
+async def drive(base_url: str, args) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.ready_timeout
+        while time.perf_counter() < deadline:
+            if (await client.get("/health/ready")).status_code == 200:
+                break
+            await asyncio.sleep(0.05)
+        else:
+            raise RuntimeError("应用未在规定时间内就绪")
+
+        async def one(index: int):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/api/trip/plan",
+                        json=make_request(index, args.days, not args.repeat),
+                        headers={"X-Client-Id": f"bench-{index % args.clients}"}
+                    )
+                    status, timing = response.status_code, response.headers.get("server-timing", "")
+                except httpx.HTTPError as e:
+                    status, timing = type(e).__name__, ""
+                samples.append({
+                    "latency": time.perf_counter() - start,
+                    "status": status,
+                    "stages": parse_server_timing(timing),
+                })
+
+        for index in range(args.warmup):
+            await one(-1 - index)
+        samples.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(args.requests)])
+        elapsed = time.perf_counter() - start
+
+    return summarize(samples, elapsed)
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [s for s in samples if s["status"] == 200]
+    latencies = [s["latency"] * 1000 for s in ok]
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+
+    stage_names = sorted({name for s in ok for name, v in s["stages"].items() if "value" not in v})
+    note_names = sorted({name for s in ok for name, v in s["stages"].items() if "value" in v})
+    notes = {
+        name: round(sum(s["stages"].get(name, {}).get("value", 0.0) for s in ok) / len(ok), 2)
+        for name in note_names
+    }
+    stages = {}
+    for name in stage_names:
+        durations = [s["stages"].get(name, {}).get("dur", 0.0) for s in ok]
+        calls = [s["stages"].get(name, {}).get("count", 0) for s in ok]
+        stages[name] = {
+            "mean_ms": round(sum(durations) / len(durations), 2),
+            "p95_ms": round(percentile(durations, 95), 2),
+            "calls_per_request": round(sum(calls) / len(calls), 2),
+        }
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value, 2) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(max(latencies)) if latencies else None,
+        },
+        "stages": stages,
+        # 每个请求的非耗时指标(如POI摘要节省的token数)的平均值
+        "notes": notes,
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def configure_environment(args, llm_url: str, unsplash_url: str):
+    """应用的配置在导入时读取,必须在导入 app 之前设置"""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OPENAI_MODEL_NAME": "fake",
+        "AMAP_MCP_COMMAND": sys.executable,
+        "AMAP_MCP_ARGS": FAKE_MCP_SERVER,
+        "FAKE_MCP_LATENCY": str(args.mcp_latency),
+        "MCP_CATALOG_SNAPSHOT": "",
+        "TOOL_CACHE_DB": "",
+        "UNSPLASH_ACCESS_KEY": "bench",
+        "UNSPLASH_BASE_URL": unsplash_url,
+        "WARMUP_CITIES": "",
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+    })
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    lines = [f"对比基线 {baseline.get('commit')} ({baseline.get('timestamp')}):"]
+    current, base = result["summary"], baseline["summary"]
+    rows = [("rps", current["rps"], base["rps"])]
+    rows += [(f"latency {k}", current["latency_ms"][k], base["latency_ms"][k]) for k in ("p50", "p95", "p99")]
+    for name, now, before in rows:
+        if now is None or not before:
+            lines.append(f"  {name:<12} {now} (基线 {before})")
+            continue
+        lines.append(f"  {name:<12} {now:>10} vs {before:>10} ({(now - before) / before:+.1%})")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准: 压测 /api/trip/plan")
+    parser.add_argument("--requests", type=int, default=20, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发请求数")
+    parser.add_argument("--clients", type=int, help="模拟的客户端数量(X-Client-Id),默认等于并发数")
+    parser.add_argument("--warmup", type=int, default=1, help="正式计时前的预热请求数")
+    parser.add_argument("--days", type=int, default=3, help="每个请求的行程天数")
+    parser.add_argument("--repeat", action="store_true", help="所有请求使用相同参数(测试计划缓存)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="LLM首个token前的延迟(秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="LLM输出速度")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="应用侧LLM并发上限")
+    parser.add_argument("--mcp-latency", type=float, default=0.05, help="MCP工具调用延迟(秒)")
+    parser.add_argument("--unsplash-latency", type=float, default=0.02, help="Unsplash接口延迟(秒)")
+    parser.add_argument("--timeout", type=float, default=300, help="单个请求超时(秒)")
+    parser.add_argument("--ready-timeout", type=float, default=60, help="等待应用就绪的时间(秒)")
+    parser.add_argument("--output", help="结果JSON路径,默认写入 benchmarks/results/")
+    parser.add_argument("--compare", help="与之前保存的结果JSON对比")
+    parser.add_argument("--verbose", action="store_true", help="显示应用日志")
+    args = parser.parse_args()
+    args.clients = args.clients or args.concurrency
+
+    llm_app = fake_llm.create_app(latency=args.llm_latency, tokens_per_second=args.tokens_per_second)
+    unsplash_app = fake_unsplash.create_app(latency=args.unsplash_latency)
+
+    with BackgroundServer(llm_app, free_port()) as llm_server, \
+            BackgroundServer(unsplash_app, free_port()) as unsplash_server:
+        configure_environment(args, llm_server.url, unsplash_server.url)
+        from app.api.main import app
+
+        logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        with logs, BackgroundServer(app, free_port()) as app_server:
+            summary = asyncio.run(drive(app_server.url, args))
+        llm_calls = llm_app.state.requests
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "verbose")},
+        "summary": summary,
+        "fake_llm_requests": llm_calls,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"e2e-{result['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"结果已保存到 {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""基准测试用的本地替身服务:OpenAI兼容LLM、高德MCP服务、Unsplash"""
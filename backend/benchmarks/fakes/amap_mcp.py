@@ -0,0 +1,59 @@
+"""
+高德地图MCP服务的本地替身(stdio)
+
+返回固定格式的POI搜索和天气结果,同样的参数总是得到同样的数据。
+FAKE_MCP_LATENCY 环境变量可以为每次调用增加固定延迟(秒)。
+"""
+import asyncio
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+
+from fastmcp import FastMCP
+
+LATENCY = float(os.getenv("FAKE_MCP_LATENCY", "0"))
+
+mcp = FastMCP("fake-amap")
+
+def _seed(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+@mcp.tool
+async def maps_text_search(keywords: str, city: str = "", citylimit: bool = False) -> str:
+    """关键词搜索POI"""
+    await asyncio.sleep(LATENCY)
+    seed = _seed(f"{keywords}|{city}")
+    pois = []
+    for i in range(10):
+        offset = ((seed >> i) % 100) / 1000
+        pois.append({
+            "id": f"B0{seed % 100000:05d}{i:02d}",
+            "name": f"{keywords[:8]}POI{i + 1}",
+            "address": f"{city or '北京'}市示例路{i + 1}号",
+            "typecode": "110000",
+            "location": f"{116.30 + offset + i * 0.01:.6f},{39.90 + offset - i * 0.005:.6f}",
+        })
+    return json.dumps({"suggestion": {"keywords": [], "ciytes": []}, "pois": pois}, ensure_ascii=False)
+
+@mcp.tool
+async def maps_weather(city: str) -> str:
+    """查询城市天气"""
+    await asyncio.sleep(LATENCY)
+    today = date.today()
+    forecasts = [{
+        "date": (today + timedelta(days=i)).isoformat(),
+        "week": str((today + timedelta(days=i)).isoweekday()),
+        "dayweather": "晴" if i % 2 == 0 else "多云",
+        "nightweather": "多云",
+        "daytemp": str(20 + i),
+        "nighttemp": str(10 + i),
+        "daywind": "北",
+        "nightwind": "北",
+        "daypower": "1-3",
+        "nightpower": "1-3",
+    } for i in range(4)]
+    return json.dumps({"city": city, "forecasts": forecasts}, ensure_ascii=False)
+
+if __name__ == "__main__":
+    mcp.run(show_banner=False)
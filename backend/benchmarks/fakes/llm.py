@@ -0,0 +1,220 @@
+"""
+OpenAI 兼容 chat/completions 接口的本地替身
+
+按固定脚本作答,不调用任何模型:
+- 请求带 tools 且还没有工具结果时,调用第一个工具(原生 function calling)
+- 收到工具结果后,返回一段固定的总结文本
+- 规划请求("...日旅行计划")返回按请求城市、日期和天数生成的合法计划JSON
+- 分块规划的景点筛选请求和单日行程请求分别返回候选景点JSON和单日 DayPlan JSON
+
+延迟模型: 首个 token 前等待 latency 秒,之后按 tokens_per_second 输出,
+非流式请求等待两者之和。token 数按 estimate_tokens 估算。
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from hello_agents.core import estimate_tokens
+
+_CITY = re.compile(r"目的地:\s*(\S+)")
+_DATES = re.compile(r"日期:\s*(\d{4}-\d{2}-\d{2})\s*至\s*(\d{4}-\d{2}-\d{2})")
+_DAYS = re.compile(r"天数:\s*(\d+)天")
+_ALLOCATION = re.compile(r"为(\S+?)的(\d+)天行程挑选")
+_DAY = re.compile(r"请生成(\S+?)旅行第(\d+)天\((\d{4}-\d{2}-\d{2})\)")
+
+def _attraction(city: str, i: int, j: int) -> Dict[str, Any]:
+    return {
+        "name": f"{city}景点{i + 1}-{j + 1}",
+        "address": f"{city}市示例路{j + 1}号",
+        "location": {"longitude": 116.30 + j * 0.01, "latitude": 39.90 + i * 0.01},
+    }
+
+def build_day(city: str, i: int, current: str, attractions_per_day: int = 3) -> Dict[str, Any]:
+    """生成一天的合法行程"""
+    return {
+        "date": current,
+        "day_index": i,
+        "description": f"第{i + 1}天游览{city}",
+        "transportation": "公共交通",
+        "accommodation": "经济型酒店",
+        "hotel": {
+            "name": f"{city}示例酒店",
+            "address": f"{city}市示例路1号",
+            "location": {"longitude": 116.40, "latitude": 39.90},
+            "price_range": "300-500元",
+            "rating": "4.5",
+            "distance": "1公里",
+            "type": "经济型酒店",
+            "estimated_cost": 400,
+        },
+        "attractions": [{
+            **_attraction(city, i, j),
+            "visit_duration": 120,
+            "description": "基准测试景点",
+            "category": "景点",
+            "ticket_price": 60,
+        } for j in range(attractions_per_day)],
+        "meals": [
+            {"type": meal, "name": f"{city}餐厅{k + 1}", "description": "本地菜", "estimated_cost": 50}
+            for k, meal in enumerate(("breakfast", "lunch", "dinner"))
+        ],
+    }
+
+def build_allocation(city: str, days: int, attractions_per_day: int = 3) -> Dict[str, Any]:
+    """生成分块规划的候选景点"""
+    return {
+        "attractions": [
+            {**_attraction(city, i, j), "visit_duration": 120}
+            for i in range(days) for j in range(attractions_per_day)
+        ],
+        "overall_suggestions": "基准测试生成的计划",
+    }
+
+def build_plan(query: str, attractions_per_day: int = 3) -> Dict[str, Any]:
+    """根据规划查询生成一份合法的旅行计划"""
+    city = (_CITY.search(query) or [None, "北京"])[1]
+    dates = _DATES.search(query)
+    start = date.fromisoformat(dates.group(1)) if dates else date.today()
+    days_match = _DAYS.search(query)
+    days = int(days_match.group(1)) if days_match else 3
+
+    day_plans = [
+        build_day(city, i, (start + timedelta(days=i)).isoformat(), attractions_per_day)
+        for i in range(days)
+    ]
+
+    return {
+        "city": city,
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=days - 1)).isoformat(),
+        "days": day_plans,
+        "overall_suggestions": "基准测试生成的计划",
+        "budget": {
+            "total_attractions": 60 * attractions_per_day * days,
+            "total_hotels": 400 * days,
+            "total_meals": 150 * days,
+            "total_transportation": 50 * days,
+            "total": (60 * attractions_per_day + 600) * days,
+        },
+    }
+
+def _tool_arguments(tool: Dict[str, Any], user_text: str) -> Dict[str, Any]:
+    """用用户输入填充工具的必填参数"""
+    schema = tool.get("function", {}).get("parameters") or {}
+    required = schema.get("required") or list((schema.get("properties") or {}).keys())[:1]
+    return {name: user_text for name in required}
+
+def script_reply(body: Dict[str, Any]) -> Dict[str, Any]:
+    """按脚本生成回复 message"""
+    messages: List[Dict[str, Any]] = body.get("messages") or []
+    tools = body.get("tools") or []
+    user_text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    has_tool_result = any(m.get("role") == "tool" for m in messages)
+
+    if tools and not has_tool_result and body.get("tool_choice") != "none":
+        tool = tools[0]
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": tool["function"]["name"],
+                    "arguments": json.dumps(_tool_arguments(tool, user_text), ensure_ascii=False),
+                },
+            }],
+        }
+
+    allocation = _ALLOCATION.search(user_text)
+    if allocation:
+        content = json.dumps(build_allocation(allocation.group(1), int(allocation.group(2))), ensure_ascii=False)
+        return {"role": "assistant", "content": content}
+
+    day = _DAY.search(user_text)
+    if day:
+        content = json.dumps(build_day(day.group(1), int(day.group(2)) - 1, day.group(3)), ensure_ascii=False)
+        return {"role": "assistant", "content": f"```json\n{content}\n```"}
+
+    if "旅行计划" in user_text:
+        plan = json.dumps(build_plan(user_text), ensure_ascii=False, indent=2)
+        return {"role": "assistant", "content": f"```json\n{plan}\n```"}
+
+    results = [str(m.get("content") or "") for m in messages if m.get("role") == "tool"]
+    summary = results[-1][:400] if results else user_text[:200]
+    return {"role": "assistant", "content": f"查询结果整理如下:\n{summary}"}
+
+def create_app(latency: float = 0.2, tokens_per_second: float = 400.0, chunk_chars: int = 16) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible LLM")
+    app.state.requests = 0
+
+    def completion_delay(text: str) -> float:
+        return estimate_tokens(text) / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        message = script_reply(body)
+        content = message.get("content") or ""
+        arguments = "".join(c["function"]["arguments"] for c in message.get("tool_calls") or [])
+        prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) for m in body.get("messages") or [])
+        completion_tokens = estimate_tokens(content + arguments)
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake")
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + completion_delay(content + arguments))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            await asyncio.sleep(latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(0, len(content), chunk_chars):
+                piece = content[i:i + chunk_chars]
+                await asyncio.sleep(completion_delay(piece))
+                yield chunk({"content": piece})
+            yield chunk({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def create_app_from_env() -> FastAPI:
+    """供 uvicorn --factory 以多进程运行: 延迟参数取自 FAKE_LLM_LATENCY / FAKE_LLM_TOKENS_PER_SECOND"""
+    return create_app(
+        latency=float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "400"))
+    )
@@ -0,0 +1,23 @@
+"""Unsplash 搜索接口的本地替身"""
+import asyncio
+import hashlib
+
+from fastapi import FastAPI
+
+def create_app(latency: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake Unsplash")
+
+    @app.get("/search/photos")
+    async def search_photos(query: str, per_page: int = 10, client_id: str = ""):
+        await asyncio.sleep(latency)
+        digest = hashlib.md5(query.encode("utf-8")).hexdigest()[:12]
+        return {
+            "total": per_page,
+            "results": [{
+                "urls": {"regular": f"https://images.example.com/{digest}-{i}.jpg"},
+                "description": query,
+                "user": {"name": "bench"},
+            } for i in range(per_page)],
+        }
+
+    return app
@@ -0,0 +1,60 @@
+"""
+启动耗时基准
+
+分别测量:
+- import: 导入 app.api.main 的耗时(应只有模块加载,不创建客户端或子进程)
+- live:   从启动应用到 /health/live 返回200的耗时
+- ready:  从启动应用到 /health/ready 返回200的耗时(LLM客户端、MCP工具目录与会话池就绪)
+
+用法:
+    python benchmarks/startup.py [--timeout 120] [--output startup.json]
+
+可通过 AMAP_MCP_COMMAND / AMAP_MCP_ARGS 指向本地的MCP服务,排除 npx 下载带来的波动。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def measure(timeout: float, interval: float) -> dict:
+    start = time.perf_counter()
+    from app.api.main import app
+    import_s = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+
+    result = {"import_s": round(import_s, 4), "live_s": None, "ready_s": None, "components": None}
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        if client.get("/health/live").status_code == 200:
+            result["live_s"] = round(time.perf_counter() - start, 4)
+
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            response = client.get("/health/ready")
+            if response.status_code == 200:
+                result["ready_s"] = round(time.perf_counter() - start, 4)
+                break
+            time.sleep(interval)
+        result["components"] = client.get("/health/ready").json()["components"]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="测量服务启动到存活/就绪的耗时")
+    parser.add_argument("--timeout", type=float, default=120.0, help="等待就绪的最长时间(秒)")
+    parser.add_argument("--interval", type=float, default=0.05, help="就绪检查的轮询间隔(秒)")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    result = measure(args.timeout, args.interval)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+多 worker 扩展性基准
+
+用 app.serve 分别以不同的 worker 数启动应用(多 worker 时带MCP代理和共享缓存),
+以相同的负载压测 /api/trip/plan,比较吞吐量随 worker 数的变化。
+LLM替身在独立的多进程 uvicorn 中运行,默认零延迟,使应用自身的CPU开销成为瓶颈;
+负载生成、统计和替身服务复用 e2e.py。扩展效率 = rps(N) / (N * rps(1)),
+只有在CPU核数不少于 worker 数(加上替身进程)的机器上才接近线性。
+
+用法:
+    python benchmarks/workers.py --workers 1,2,4 --requests 120 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from benchmarks import e2e
+from benchmarks.fakes import unsplash as fake_unsplash
+
+def wait_listening(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程意外退出,退出码 {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} 未在 {timeout}s 内开始监听")
+
+def stop(process: subprocess.Popen):
+    if process.poll() is None:
+        # SIGTERM 让 uvicorn 和启动器正常退出(关闭各 worker 和MCP代理)
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def start_fake_llm(args, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        FAKE_LLM_LATENCY=str(args.llm_latency),
+        FAKE_LLM_TOKENS_PER_SECOND=str(args.tokens_per_second),
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.fakes.llm:create_app_from_env", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.fake_workers),
+            "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR, env=env
+    )
+    wait_listening(f"http://127.0.0.1:{port}/docs", process, args.ready_timeout)
+    return process
+
+def run_workers(args, workers: int) -> Dict[str, Any]:
+    """以 workers 个进程启动应用并压测,返回 e2e 格式的统计"""
+    port = e2e.free_port()
+    with tempfile.TemporaryDirectory() as state_dir:
+        output = None if args.verbose else subprocess.DEVNULL
+        app = subprocess.Popen(
+            [
+                sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--state-dir", state_dir, "--log-level", "warning",
+            ],
+            cwd=BACKEND_DIR, env=dict(os.environ), stdout=output, stderr=output
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            wait_listening(f"{url}/health/live", app, args.ready_timeout)
+            return asyncio.run(e2e.drive(url, args))
+        finally:
+            stop(app)
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 扩展性基准: 不同 worker 数下压测 /api/trip/plan")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数")
+    parser.add_argument("--requests", type=int, default=120, help="每种配置的请求总数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求数")
+    parser.add_argument("--clients", type=int, help="模拟的客户端数量(X-Client-Id),默认等于并发数")
+    parser.add_argument("--warmup", type=int, default=8, help="正式计时前的预热请求数(使各 worker 完成初始化)")
+    parser.add_argument("--days", type=int, default=3, help="每个请求的行程天数")
+    parser.add_argument("--repeat", action="store_true", help="所有请求使用相同参数(测试共享的计划缓存)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="LLM首个token前的延迟(秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="LLM输出速度(0为不限)")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="每个 worker 的LLM并发上限")
+    parser.add_argument("--fake-workers", type=int, default=2, help="LLM替身的进程数")
+    parser.add_argument("--mcp-latency", type=float, default=0.0, help="MCP工具调用延迟(秒)")
+    parser.add_argument("--unsplash-latency", type=float, default=0.0, help="Unsplash接口延迟(秒)")
+    parser.add_argument("--timeout", type=float, default=300, help="单个请求超时(秒)")
+    parser.add_argument("--ready-timeout", type=float, default=60, help="等待服务就绪的时间(秒)")
+    parser.add_argument("--output", help="结果JSON路径,默认写入 benchmarks/results/")
+    parser.add_argument("--verbose", action="store_true", help="显示应用日志")
+    args = parser.parse_args()
+    args.clients = args.clients or args.concurrency
+    worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+
+    llm_port = e2e.free_port()
+    llm = start_fake_llm(args, llm_port)
+    runs: List[Dict[str, Any]] = []
+    try:
+        with e2e.BackgroundServer(fake_unsplash.create_app(latency=args.unsplash_latency), e2e.free_port()) as unsplash:
+            e2e.configure_environment(args, f"http://127.0.0.1:{llm_port}", unsplash.url)
+            # 各配置从空缓存开始,不受之前运行的影响
+            os.environ.update({"POI_INDEX_PATH": "", "SHARED_CACHE_DB": "", "LLM_CACHE_DB": ""})
+            for workers in worker_counts:
+                summary = run_workers(args, workers)
+                runs.append({"workers": workers, "summary": summary})
+                print(f"workers={workers}: {summary['rps']} req/s, p50 {summary['latency_ms']['p50']}ms, "
+                      f"p95 {summary['latency_ms']['p95']}ms, 成功 {summary['succeeded']}/{summary['requests']}")
+    finally:
+        stop(llm)
+
+    base = next((run["summary"]["rps"] for run in runs if run["workers"] == 1), None)
+    scaling = {
+        str(run["workers"]): round(run["summary"]["rps"] / (run["workers"] * base), 3) if base else None
+        for run in runs
+    }
+    result = {
+        "commit": e2e.git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "verbose")},
+        "runs": runs,
+        # 扩展效率: 1.0 为线性扩展
+        "scaling_efficiency": scaling,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(e2e.RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            e2e.RESULTS_DIR, f"workers-{result['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"扩展效率(rps(N) / (N * rps(1))): {json.dumps(scaling)}")
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 缓存未命中的哨兵值(缓存值本身可能为 None)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    进程内 LRU 缓存，每个条目带过期时间
+    """
+
+    def __init__(self, max_size: int = 1024, default_ttl: Optional[float] = None):
+        self.max_size = max(1, max_size)
+        self.default_ttl = default_ttl
+        self.evictions = 0
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def expires_at(self, key: str) -> Optional[float]:
+        entry = self._data.get(key)
+        return entry[1] if entry else None
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteCache:
+    """
+    基于 SQLite 的磁盘缓存，进程重启后仍然有效。值以 JSON 形式存储。
+
+    使用 WAL 模式,多个 worker 进程可以共享同一个数据库文件(不同缓存使用不同的表)。
+    读写在事件循环中同步执行,因此只等待 busy_timeout 秒的锁:数据库被其他进程锁住时
+    读取按未命中处理、写入直接跳过,不会让整个 worker 卡住
+    """
+
+    def __init__(self, path: str, table: str = "cache", busy_timeout: float = 0.05):
+        self.path = path
+        self.table = table
+        self.busy = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 建表在启动时执行,可以等待较长时间;之后的读写只等待 busy_timeout
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        self._writes = 0
+
+    def _locked(self, error: sqlite3.OperationalError) -> bool:
+        """数据库被其他连接锁住(而不是其他错误)时记录一次并返回 True"""
+        message = str(error).lower()
+        if "locked" not in message and "busy" not in message:
+            return False
+        self.busy += 1
+        if self._conn.in_transaction:
+            self._conn.rollback()
+        return True
+
+    def get(self, key: str) -> Tuple[Any, Optional[float]]:
+        """返回 (值, 过期时间)，未命中(或数据库被锁住)时值为 MISSING"""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return MISSING, None
+                value, expires_at = row
+                if expires_at is not None and expires_at <= time.time():
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._conn.commit()
+                    return MISSING, None
+            except sqlite3.OperationalError as e:
+                if not self._locked(e):
+                    raise
+                return MISSING, None
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入条目;数据库被锁住时跳过(内存层仍然有效)"""
+        expires_at = time.time() + ttl if ttl is not None else None
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, expires_at)
+                )
+                self._writes += 1
+                # 定期清理过期条目，避免数据库无限增长
+                if self._writes % 100 == 0:
+                    self._conn.execute(
+                        f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                        (time.time(),)
+                    )
+                self._conn.commit()
+            except sqlite3.OperationalError as e:
+                if not self._locked(e):
+                    raise
+
+    def delete(self, key: str):
+        with self._lock:
+            try:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+            except sqlite3.OperationalError as e:
+                if not self._locked(e):
+                    raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    两级缓存：进程内 LRU + 可选的磁盘层，并对相同 key 的并发计算做单飞(single-flight)合并
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        if self.disk is not None:
+            value, expires_at = self.disk.get(key)
+            if value is not MISSING:
+                self.hits += 1
+                self.disk_hits += 1
+                ttl = expires_at - time.time() if expires_at is not None else None
+                self.memory.set(key, value, ttl)
+                return value
+
+        self.misses += 1
+        return MISSING
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl if ttl is not None else self.memory.default_ttl)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """命中时直接返回；未命中时计算并写入缓存，同一 key 的并发请求只计算一次"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+        self.set(key, value, ttl)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "evictions": self.memory.evictions,
+            "size": len(self.memory),
+            "hit_ratio": self.hits / total if total else 0.0,
+            "disk_busy": self.disk.busy if self.disk is not None else 0,
+        }
+
+
+class ToolResultCache(TieredCache):
+    """
+    MCP 工具结果缓存
+
+    key 为规范化后的工具名 + 参数，每个工具可以配置独立的 TTL，
+    例如天气结果较快过期，POI 搜索结果可以缓存更久。
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        default_ttl: float = 3600,
+        tool_ttls: Optional[Dict[str, float]] = None,
+        disk_path: Optional[str] = None
+    ):
+        disk = SQLiteCache(disk_path, table="tool_results") if disk_path else None
+        super().__init__(LRUCache(max_size, default_ttl), disk)
+        self.default_ttl = default_ttl
+        self.tool_ttls = tool_ttls or {}
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict[str, Any]) -> str:
+        normalized = {
+            str(k).strip(): v.strip() if isinstance(v, str) else v
+            for k, v in (args or {}).items()
+        }
+        return f"{tool_name.strip()}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+    def ttl_for(self, tool_name: str) -> float:
+        return self.tool_ttls.get(tool_name, self.default_ttl)
+
+    async def fetch(
+        self,
+        tool_name: str,
+        args: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        ttl = self.ttl_for(tool_name)
+        if ttl <= 0:
+            return await compute()
+        return await self.get_or_compute(self.make_key(tool_name, args), compute, ttl)
+
+
+class LLMResponseCache(TieredCache):
+    """
+    LLM 回复缓存
+
+    key 为模型、请求参数和完整消息列表的哈希。是否缓存由调用方 Agent 决定:
+    agent_ttls 中列出的 Agent 使用各自的 TTL(0 表示不缓存);
+    未列出的 Agent 中,带工具定义的调用(工具调度轮次)使用 tool_ttl,其余使用 default_ttl
+    """
+
+    def __init__(
+        self,
+        max_size: int = 512,
+        default_ttl: float = 0,
+        tool_ttl: float = 0,
+        agent_ttls: Optional[Dict[str, float]] = None,
+        disk_path: Optional[str] = None
+    ):
+        disk = SQLiteCache(disk_path, table="llm_responses") if disk_path else None
+        super().__init__(LRUCache(max_size), disk)
+        self.default_ttl = default_ttl
+        self.tool_ttl = tool_ttl
+        self.agent_ttls = agent_ttls or {}
+
+    @staticmethod
+    def make_key(model: str, params: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+        payload = json.dumps(
+            {"model": model, "params": params, "messages": messages},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, agent: Optional[str], has_tools: bool = False) -> float:
+        if agent in self.agent_ttls:
+            return self.agent_ttls[agent]
+        return self.tool_ttl if has_tools else self.default_ttl
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """解析 "maps_weather=1800,maps_text_search=86400" 形式的 TTL 配置"""
+    ttls: Dict[str, float] = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            ttls[name.strip()] = float(value)
+    return ttls
@@ -1,85 +1,383 @@
 import os
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator, Awaitable, Set
 import json
-from openai import OpenAI
+import random
+import openai
+from openai.types.chat import ChatCompletionMessage
 from hello_agents.tools import MCPTool, Tool
+from hello_agents import metrics
+from hello_agents.router import LLMRouter, LLM_REQUESTS, LLM_HEDGES
+from hello_agents.cache import MISSING, LLMResponseCache, parse_ttls
 import re
 import asyncio
-import concurrent.futures
-from fastmcp import Client
+from types import SimpleNamespace
+
+# 文本协议的工具调用格式: [TOOL_CALL:tool_name:arg1=val1,arg2=val2]
+_TOOL_CALL_PATTERN = re.compile(r'\[TOOL_CALL:([^:\]]+):([^\]]*)\]')
+
+# 参数之间的逗号(后面紧跟 key=)，参数值中的逗号不会被拆分
+_ARG_SEPARATOR = re.compile(r',(?=\s*[\w-]+\s*=)')
+
+# 可重试的错误：网络异常、超时、限流以及服务端 5xx
+_RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# 服务端拒绝 tools 参数时的错误信息特征(各家 OpenAI 兼容服务的错误码不统一)
+_TOOLS_UNSUPPORTED_PATTERN = re.compile(
+    r"(tool|function)[\w\s\"'`.-]{0,40}(not supported|unsupported|not allowed|not available)"
+    r"|(does not support|doesn't support|unsupported)[\w\s\"'`.-]{0,40}(tool|function)",
+    re.IGNORECASE
+)
+
+def _tools_unsupported(error: openai.BadRequestError) -> bool:
+    """400 错误是否表示模型或服务不支持原生工具调用"""
+    if getattr(error, "code", None) == "unsupported_parameter":
+        return getattr(error, "param", None) in ("tools", "tool_choice")
+    return bool(_TOOLS_UNSUPPORTED_PATTERN.search(str(error)))
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数：中日韩字符按 1 个 token 计，其余字符按 4 个字符 1 个 token 计
+    """
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uf900' <= ch <= '\ufaff')
+    return cjk + (len(text) - cjk + 3) // 4
 
 class HelloAgentsLLM:
-    def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_BASE_URL")
-        )
-        self.model = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
+    """
+    OpenAI 兼容的 LLM 客户端,请求经 LLMRouter 分发到配置的端点
+
+    调用时传入 agent 名称以按 Agent 选择模型档位;失败时切换端点重试,
+    非流式请求超过对冲阈值时向另一个端点发出对冲请求。
+    按 Agent 的缓存策略缓存回复,可缓存的调用在确定性模式下使用温度0
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        router: Optional[LLMRouter] = None,
+        cache: Optional[LLMResponseCache] = None
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "120"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
 
-    def chat(self, messages: List[Dict[str, str]]) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7
+        # 每个端点有独立的连接池和并发上限,重试和故障转移由 achat 自行控制
+        self.router = router or LLMRouter.from_env(self.max_concurrency, self.timeout)
+
+        self.temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+        # 确定性模式: 可缓存的调用使用温度0,缓存的回复与重新调用的结果一致
+        self.cache_deterministic = os.getenv("LLM_CACHE_DETERMINISTIC", "true").lower() in ("1", "true", "yes")
+        self.cache = cache or LLMResponseCache(
+            max_size=int(os.getenv("LLM_CACHE_SIZE", "512")),
+            default_ttl=float(os.getenv("LLM_CACHE_DEFAULT_TTL", "0")),
+            tool_ttl=float(os.getenv("LLM_CACHE_TOOL_TTL", "3600")),
+            agent_ttls=parse_ttls(os.getenv("LLM_CACHE_TTLS", "")),
+            disk_path=os.getenv("LLM_CACHE_DB") or os.getenv("SHARED_CACHE_DB") or None
         )
-        return response.choices[0].message.content
+
+    def _temperature(self, cache_ttl: float) -> float:
+        return 0.0 if cache_ttl > 0 and self.cache_deterministic else self.temperature
+
+    def _cache_ttl(self, agent: Optional[str], has_tools: bool = False) -> float:
+        """
+        该调用的缓存 TTL(秒),0 表示不缓存
+
+        缓存 key 包含模型名,而实际由哪个端点响应在调用后才确定,
+        因此只缓存所有端点使用同一模型的档位,避免一个模型的回复以另一个模型的名义返回
+        """
+        if self.router.shared_model(self.router.tier_for(agent)) is None:
+            return 0
+        return self.cache.ttl_for(agent, has_tools)
+
+    def _cache_key(self, agent: Optional[str], params: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+        # 流式与非流式调用共用缓存条目
+        params = {k: v for k, v in params.items() if k != "stream"}
+        return self.cache.make_key(self.router.shared_model(self.router.tier_for(agent)), params, messages)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """指数退避 + 全抖动"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    async def _with_retry(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        failover: Optional[Callable[[], bool]] = None
+    ) -> Any:
+        """
+        对可重试错误做指数退避重试
+
+        Args:
+            failover: 返回 True 表示还有其他可用端点,此时立即切换而不退避
+        """
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = 0.0 if failover is not None and failover() else self._backoff_delay(attempt)
+                attempt += 1
+                metrics.STAGE_ERRORS.inc(stage="llm.retry")
+                print(f"LLM 调用失败({e.__class__.__name__})，{delay:.2f}s 后进行第 {attempt} 次重试")
+                await asyncio.sleep(delay)
+
+    async def _create(self, tier: str, tried: Set[str], key: str, **params) -> Any:
+        """选择端点发出一次请求;失败的端点记入 tried,下次优先选择其他端点"""
+        endpoint = await self.router.acquire(tier, tried)
+        tried.add(endpoint.name)
+        try:
+            async with endpoint.semaphore:
+                # 只统计请求本身的耗时,排队等待并发名额的时间不计入对冲阈值
+                start = asyncio.get_running_loop().time()
+                response = await endpoint.client.chat.completions.create(model=endpoint.model, **params)
+        except _RETRYABLE_ERRORS:
+            self.router.report_failure(endpoint)
+            raise
+        except asyncio.CancelledError:
+            LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="cancelled")
+            raise
+        self.router.report_success(endpoint, key, asyncio.get_running_loop().time() - start)
+        return response
+
+    async def _open_stream(self, tier: str, tried: Set[str], **params) -> Any:
+        """建立流式请求,返回 (端点, 流);成功时占用的并发名额由调用方在读完流后释放"""
+        endpoint = await self.router.acquire(tier, tried)
+        tried.add(endpoint.name)
+        await endpoint.semaphore.acquire()
+        try:
+            stream = await endpoint.client.chat.completions.create(model=endpoint.model, stream=True, **params)
+        except BaseException as e:
+            endpoint.semaphore.release()
+            if isinstance(e, _RETRYABLE_ERRORS):
+                self.router.report_failure(endpoint)
+            raise
+        self.router.report_success(endpoint)
+        return endpoint, stream
+
+    async def _hedged(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        key: str,
+        has_alternative: Callable[[], bool]
+    ) -> Any:
+        """
+        超过对冲阈值仍未返回时向另一个端点再发出一个请求,取先成功的结果并取消另一个
+
+        Args:
+            has_alternative: 返回 True 表示还有其他可用端点;只有一个端点时不对冲,
+                否则同一端点上会重复生成一次完整回复
+        """
+        delay = self.router.hedge_delay(key)
+        if delay is None:
+            return await attempt()
+
+        primary = asyncio.ensure_future(attempt())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and has_alternative():
+                LLM_HEDGES.inc(outcome="launched")
+                tasks.append(asyncio.ensure_future(attempt()))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            LLM_HEDGES.inc(outcome="won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # 取消落后的请求(调用方被取消时也一并取消)
+            for task in tasks:
+                task.cancel()
+
+    async def achat_message(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        agent: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """
+        异步调用 LLM 并返回完整的 message(包含原生工具调用 tool_calls)
+
+        Args:
+            agent: 调用方 Agent 名称,决定模型档位、对冲阈值的统计口径和缓存策略
+        """
+        ttl = self._cache_ttl(agent, bool(tools))
+        params = {"temperature": self._temperature(ttl), **kwargs}
+        if tools:
+            params["tools"] = tools
+        tier = self.router.tier_for(agent)
+        key = agent or tier
+        # 对冲的两个请求共享已尝试的端点,对冲请求会优先发往另一个端点
+        tried: Set[str] = set()
+
+        def has_alternative():
+            return self.router.has_alternative(tier, tried)
+
+        def attempt():
+            return self._with_retry(
+                lambda: self._create(tier, tried, key, messages=messages, **params),
+                has_alternative
+            )
+
+        async def request():
+            # 耗时包含排队等待并发名额、重试和对冲的时间
+            with metrics.span("llm"):
+                response = await self._hedged(attempt, key, has_alternative)
+            metrics.record_usage(response.usage, getattr(response, "model", None) or self.router.model_for(agent))
+            return response.choices[0].message
+
+        if ttl <= 0:
+            return await request()
+
+        computed = False
+
+        async def compute():
+            nonlocal computed
+            computed = True
+            return (await request()).model_dump(exclude_none=True)
+
+        # 相同的并发调用只请求一次
+        data = await self.cache.get_or_compute(self._cache_key(agent, params, messages), compute, ttl)
+        if not computed:
+            metrics.note("llm_cache_hits", 1)
+        return ChatCompletionMessage.model_validate(data)
+
+    async def achat(self, messages: List[Dict[str, str]], agent: Optional[str] = None) -> str:
+        """异步调用 LLM，不阻塞事件循环"""
+        return (await self.achat_message(messages, agent=agent)).content
+
+    async def astream(self, messages: List[Dict[str, str]], agent: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        流式调用 LLM，逐段产出文本；只有建立连接阶段会重试(可切换端点)
+
+        已经开始向调用方输出的流无法切换,因此流式请求不做对冲。
+        命中缓存时一次性产出缓存的回复,完整读完的流写入缓存
+        """
+        ttl = self._cache_ttl(agent)
+        params = {"temperature": self._temperature(ttl)}
+        cache_key = self._cache_key(agent, params, messages) if ttl > 0 else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not MISSING:
+                metrics.note("llm_cache_hits", 1)
+                yield cached.get("content") or ""
+                return
+
+        start = asyncio.get_running_loop().time()
+        first_token = True
+        usage = None
+        completion: List[str] = []
+        tier = self.router.tier_for(agent)
+        tried: Set[str] = set()
+        with metrics.span("llm.stream"):
+            endpoint, stream = await self._with_retry(
+                lambda: self._open_stream(tier, tried, messages=messages, **params),
+                lambda: self.router.has_alternative(tier, tried)
+            )
+            try:
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            metrics.record("llm.first_token", asyncio.get_running_loop().time() - start)
+                            first_token = False
+                        completion.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                endpoint.semaphore.release()
+
+        # 流式接口通常不返回用量,此时按文本估算
+        if usage is None:
+            usage = SimpleNamespace(
+                prompt_tokens=sum(estimate_tokens(str(m.get("content") or "")) for m in messages),
+                completion_tokens=estimate_tokens("".join(completion))
+            )
+        metrics.record_usage(usage, endpoint.model)
+        if cache_key is not None:
+            self.cache.set(cache_key, {"role": "assistant", "content": "".join(completion)}, ttl)
+
+    async def aclose(self):
+        """关闭各端点的 HTTP 连接池和缓存的磁盘层"""
+        await self.router.aclose()
+        if self.cache.disk is not None:
+            self.cache.disk.close()
 
 class SimpleAgent:
-    def __init__(self, name: str, llm: HelloAgentsLLM, system_prompt: str):
+    def __init__(
+        self,
+        name: str,
+        llm: HelloAgentsLLM,
+        system_prompt: str,
+        prompt_token_budget: Optional[int] = None,
+        tool_mode: Optional[str] = None,
+        max_tool_steps: Optional[int] = None
+    ):
         self.name = name
         self.llm = llm
         self.system_prompt = system_prompt
+        self.prompt_token_budget = prompt_token_budget or int(os.getenv("AGENT_PROMPT_TOKEN_BUDGET", "4000"))
+        # native: 通过 tools 参数使用模型原生的 function calling；text: [TOOL_CALL:...] 文本协议
+        self.tool_mode = tool_mode or os.getenv("AGENT_TOOL_MODE", "native")
+        self.max_tool_steps = max_tool_steps or int(os.getenv("AGENT_MAX_TOOL_STEPS", "3"))
         self.tools: Dict[str, Tool] = {}
+        self._build_prompt()
 
-    def _run_sync(self, coro):
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            loop = None
-
-        if loop and loop.is_running():
-            def run_in_thread():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(coro)
-                finally:
-                    new_loop.close()
+    @property
+    def prompt(self) -> str:
+        """发送给 LLM 的系统提示词(基础提示词 + 工具目录)，仅在注册工具时重新构建"""
+        return self._prompt
 
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_in_thread)
-                return future.result()
+    def _build_prompt(self):
+        """渲染系统提示词和原生工具定义，并检查 token 预算"""
+        self._tool_schemas = [tool.to_openai_schema() for tool in self.tools.values()]
+        if self.tool_mode == "native":
+            # 工具定义通过 tools 参数传递，不再写入提示词
+            self._prompt = self.system_prompt or "你是一个有用的AI助手。"
         else:
-            return asyncio.run(coro)
+            self._prompt = self._get_enhanced_prompt(self.system_prompt)
+        self.prompt_tokens = estimate_tokens(self._prompt)
+        if self.prompt_tokens > self.prompt_token_budget:
+            print(
+                f"警告: {self.name} 的系统提示词约 {self.prompt_tokens} tokens，"
+                f"超出预算 {self.prompt_token_budget}"
+            )
+
+    def register_tool(self, tool: Tool):
+        """注册单个工具并重新构建系统提示词"""
+        self.tools[tool.name] = tool
+        self._build_prompt()
 
-    def add_tool(self, mcp_tool: MCPTool):
+    def add_tool(self, mcp_tool: MCPTool, include: Optional[List[str]] = None):
         """
-        添加 MCP 工具，并绑定执行逻辑
+        添加 MCP 工具集，只注册 include 中列出的工具(为空时注册全部)
+
+        工具目录由 MCPTool.discover() 统一发现；目录尚未就绪时，会在发现完成后自动注册
         """
-        print(f"正在加载 MCP 工具集: {mcp_tool.name} ...")
-        
-        # 1. 获取工具列表
-        try:
-            tool_list = self._run_sync(mcp_tool.list_tools())
-        except Exception as e:
-            print(f"获取工具列表失败: {e}")
-            return
-
-        # 2. 注册工具
-        for tool_item in tool_list:
-            # 构建 Tool 对象
-            args_desc = json.dumps(tool_item.inputSchema) if hasattr(tool_item, 'inputSchema') else "{}"
-            
-            new_tool = Tool(
-                name=tool_item.name,
-                description=tool_item.description,
-                args=args_desc,
-                config=mcp_tool.config
-            )
+        mcp_tool.subscribe(lambda catalog: self._register_view(mcp_tool, include))
+
+    def _register_view(self, mcp_tool: MCPTool, include: Optional[List[str]]):
+        for tool in mcp_tool.view(include):
+            self.tools[tool.name] = tool
+            print(f"  - {self.name} 已加载工具: {tool.name}")
 
-            # 存入字典
-            self.tools[tool_item.name] = new_tool
-            print(f"  - 已加载工具: {tool_item.name}")
+        # 工具目录只在注册时渲染一次
+        self._build_prompt()
 
     def get_tools_description(self) -> str:
         """
@@ -98,12 +396,11 @@ class SimpleAgent:
 
     def _get_enhanced_prompt(self, system_prompt: str) -> str:
         """构建增强的系统提示词，包含工具信息"""
-        base_prompt = self.system_prompt or "你是一个有用的AI助手。"
+        base_prompt = system_prompt or "你是一个有用的AI助手。"
         
         # 获取工具描述
         tools_description = self.get_tools_description()
         if not tools_description or tools_description == "暂无可用工具":
-            print(f"未发现可用工具，使用基础提示词")
             return base_prompt
         
         tools_section = "\n\n## 可用工具\n"
@@ -127,44 +424,120 @@ class SimpleAgent:
 
         return base_prompt + tools_section
 
+    @staticmethod
+    def _parse_text_args(args_str: str) -> Dict[str, Any]:
+        args = {}
+        for pair in _ARG_SEPARATOR.split(args_str or ""):
+            if "=" in pair:
+                k, v = pair.split("=", 1)
+                args[k.strip()] = v.strip()
+        return args
+
+    async def _execute_tool(self, tool_name: str, args: Dict[str, Any]) -> str:
+        if tool_name not in self.tools:
+            return f"错误: 未找到工具 {tool_name}"
+        print(f"{self.name} 执行工具 {tool_name}，参数: {args}")
+        return await self.tools[tool_name].run(args)
+
     async def run(self, user_input: str) -> str:
-        # 将工具描述添加到系统提示中
-        self.system_prompt = self._get_enhanced_prompt(self.system_prompt)
+        with metrics.span(f"agent.{self.name}"):
+            return await self._run(user_input)
+
+    async def _run(self, user_input: str) -> str:
         messages = [
-            {"role": "system", "content": self.system_prompt},
+            {"role": "system", "content": self.prompt},
             {"role": "user", "content": user_input}
         ]
-        
-        # 1. 获取 LLM 的回复
-        response = self.llm.chat(messages)
 
-        print(f"{self.name} 回复: {response}")
-        
+        if self.tool_mode == "native" and self.tools:
+            try:
+                return await self._run_native(messages)
+            except openai.BadRequestError as e:
+                # 只有明确不支持 tools 参数时才回退,且只对本次调用生效(Agent 是共享的,
+                # 上下文超长等其他 400 错误不应影响之后的请求)
+                if not _tools_unsupported(e):
+                    raise
+                print(f"{self.name} 不支持原生工具调用({e})，本次回退到文本协议")
+                messages[0]["content"] = self._get_enhanced_prompt(self.system_prompt)
+
+        return await self._run_text(messages)
+
+    async def _run_native(self, messages: List[Dict[str, Any]]) -> str:
+        """原生 function calling：同一轮的多个工具调用并发执行，最多循环 max_tool_steps 轮"""
+        for _ in range(self.max_tool_steps):
+            message = await self.llm.achat_message(messages, tools=self._tool_schemas, agent=self.name)
+            tool_calls = message.tool_calls or []
+            content = message.content or ""
+
+            if not tool_calls:
+                if _TOOL_CALL_PATTERN.search(content):
+                    # 模型仍然输出了文本协议的工具调用
+                    return await self._run_text(messages, content)
+                print(f"{self.name} 回复: {content}")
+                return content
+
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [tc.model_dump() for tc in tool_calls]
+            })
+
+            async def call(tc) -> str:
+                try:
+                    args = json.loads(tc.function.arguments or "{}")
+                except ValueError as e:
+                    return f"错误: 工具参数不是合法的JSON: {e}"
+                return await self._execute_tool(tc.function.name, args)
+
+            results = await asyncio.gather(*[call(tc) for tc in tool_calls])
+            for tc, result in zip(tool_calls, results):
+                messages.append({"role": "tool", "tool_call_id": tc.id, "content": str(result)})
+
+        # 达到步数上限，要求模型基于已有结果直接作答
+        message = await self.llm.achat_message(
+            messages, tools=self._tool_schemas, agent=self.name, tool_choice="none"
+        )
+        return message.content or ""
+
+    async def _run_text(self, messages: List[Dict[str, Any]], response: Optional[str] = None) -> str:
+        """文本协议 [TOOL_CALL:...]：同一轮的多个工具调用并发执行，最多循环 max_tool_steps 轮"""
+        if response is None:
+            # 1. 获取 LLM 的回复
+            response = await self.llm.achat(messages, agent=self.name)
+            print(f"{self.name} 回复: {response}")
+
         # 2. 检查是否包含工具调用
-        # Format: [TOOL_CALL:tool_name:arg1=val1,arg2=val2]
-        tool_calls = re.findall(r'\[TOOL_CALL:([^:]+):([^\]]+)\]', response)
-        
-        if tool_calls:
-            for tool_name, args_str in tool_calls:
-                args = {}
-                if args_str:
-                    for pair in args_str.split(","):
-                        if "=" in pair:
-                            k, v = pair.split("=", 1)
-                            args[k.strip()] = v.strip()
-                
-                # 执行工具
-                tool_result = f"错误: 未找到工具 {tool_name}"
-                
-                if tool_name in self.tools:
-                    print(f"{self.name} 执行工具 {tool_name}，参数: {args}")
-                    tool_result = await self.tools[tool_name].run(args)
-                
-                # 3. 将工具结果反馈给 LLM
-                messages.append({"role": "assistant", "content": response})
-                messages.append({"role": "user", "content": f"工具输出: {tool_result}\n请继续。"})
-                final_response = self.llm.chat(messages)
-                return final_response
-        else:
+        if not _TOOL_CALL_PATTERN.search(response):
             print(f"{self.name} 未发现工具调用，直接返回: {response}")
             return response
+
+        for _ in range(self.max_tool_steps):
+            tool_calls = _TOOL_CALL_PATTERN.findall(response)
+            if not tool_calls:
+                break
+
+            results = await asyncio.gather(*[
+                self._execute_tool(tool_name.strip(), self._parse_text_args(args_str))
+                for tool_name, args_str in tool_calls
+            ])
+
+            # 3. 将工具结果反馈给 LLM
+            tool_output = "\n".join(
+                f"工具 {name.strip()} 输出: {result}" for (name, _), result in zip(tool_calls, results)
+            )
+            messages.append({"role": "assistant", "content": response})
+            messages.append({"role": "user", "content": f"{tool_output}\n请继续。"})
+            response = await self.llm.achat(messages, agent=self.name)
+
+        return response
+
+    async def stream(self, user_input: str) -> AsyncIterator[str]:
+        """
+        流式返回 LLM 的回复，不解析工具调用，适用于无需工具的 Agent(如规划 Agent)
+        """
+        messages = [
+            {"role": "system", "content": self.prompt},
+            {"role": "user", "content": user_input}
+        ]
+        async for chunk in self.llm.astream(messages, agent=self.name):
+            yield chunk
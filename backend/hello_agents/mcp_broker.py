@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from hello_agents.tools import MCPTool
+
+# MCP 代理: 多个 worker 进程共用一个代理进程中的 MCP 会话池和工具结果缓存。
+# 代理与 worker 之间通过本地 socket(Unix 域套接字或 host:port)交换按行分隔的 JSON 消息,
+# 一个连接上可以同时有多个请求,按 id 匹配响应:
+#   请求 {"id": 1, "method": "call_tool", "params": {"name": ..., "arguments": {...}}}
+#   响应 {"id": 1, "result": ...} 或 {"id": 1, "error": "..."}
+
+# 单条消息的长度上限(POI搜索结果可能较大)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+_TCP_ADDRESS = re.compile(r"^[\w.\-]+:\d+$")
+
+
+class MCPBrokerError(Exception):
+    """代理返回的错误(工具调用失败、未知工具等)"""
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """解析代理地址: "host:port" 为 TCP,其余视为 Unix 域套接字路径"""
+    if _TCP_ADDRESS.match(address):
+        host, port = address.rsplit(":", 1)
+        return "tcp", (host, int(port))
+    return "unix", address
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class MCPBroker:
+    """
+    MCP 代理服务端
+
+    持有一个 MCPTool(会话池 + 结果缓存),为所有连接的 worker 执行工具调用。
+    相同参数的并发调用由结果缓存合并,跨 worker 也只执行一次
+    """
+
+    def __init__(self, tool: "MCPTool", address: str):
+        self.tool = tool
+        self.address = address
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tools: Dict[str, Any] = {}
+        self._connections: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """发现工具目录、预热会话池并开始监听"""
+        await self.tool.discover()
+        await self.tool.pool.warmup()
+        self._tools = {tool.name: tool for tool in self.tool.view()}
+
+        kind, target = parse_address(self.address)
+        if kind == "tcp":
+            self._server = await asyncio.start_server(self._handle, *target, limit=MAX_MESSAGE_BYTES)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            if os.path.exists(target):
+                # 上次异常退出遗留的套接字文件
+                os.unlink(target)
+            self._server = await asyncio.start_unix_server(self._handle, path=target, limit=MAX_MESSAGE_BYTES)
+        print(f"MCP 代理已启动: {self.address} ({len(self._tools)} 个工具)")
+
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "call_tool":
+            tool = self._tools.get(params.get("name"))
+            if tool is None:
+                raise MCPBrokerError(f"未找到工具 {params.get('name')}")
+            return await tool.fetch(params.get("arguments") or {})
+        if method == "list_tools":
+            return {
+                "version": self.tool.server_version,
+                "tools": [spec.to_dict() for spec in self.tool.catalog or []],
+            }
+        if method == "ping":
+            return "pong"
+        raise MCPBrokerError(f"未知的方法 {method}")
+
+    async def _respond(self, request: Dict[str, Any], writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        try:
+            response = {"id": request.get("id"), "result": await self._dispatch(
+                request.get("method"), request.get("params") or {}
+            )}
+        except Exception as e:
+            response = {"id": request.get("id"), "error": str(e) or e.__class__.__name__}
+        async with lock:
+            writer.write(_encode(response))
+            await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        pending: Set[asyncio.Task] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                task = asyncio.create_task(self._respond(request, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            kind, target = parse_address(self.address)
+            if kind == "unix" and os.path.exists(target):
+                os.unlink(target)
+        await self.tool.close()
+
+
+class BrokerClient:
+    """
+    MCP 代理客户端,接口与 MCPSessionPool 一致
+
+    session() 借出的对象支持 call_tool / list_tools / ping;
+    所有调用复用一个长连接,连接断开后在下次调用时自动重连
+    """
+
+    def __init__(self, address: str, timeout: float = 120):
+        self.address = address
+        self.timeout = timeout
+        self.server_info: Optional[SimpleNamespace] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _ensure_connected(self):
+        # 连接与创建它的事件循环绑定,切换到新的事件循环时重新连接
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._writer = None
+            self._pending = {}
+            self._connect_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.is_connected():
+                return
+            kind, target = parse_address(self.address)
+            if kind == "tcp":
+                reader, writer = await asyncio.open_connection(*target, limit=MAX_MESSAGE_BYTES)
+            else:
+                reader, writer = await asyncio.open_unix_connection(target, limit=MAX_MESSAGE_BYTES)
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read_loop(reader, writer))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self._pending.get(message.get("id"))
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(MCPBrokerError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            print(f"MCP 代理连接异常: {e}")
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            for future in list(self._pending.values()):
+                if not future.done():
+                    future.set_exception(ConnectionError("MCP 代理连接已断开"))
+
+    async def _request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        if self._closed:
+            raise RuntimeError("MCP 代理客户端已关闭")
+        await self._ensure_connected()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._write_lock:
+                self._writer.write(_encode({"id": request_id, "method": method, "params": params or {}}))
+                await self._writer.drain()
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        return await self._request("call_tool", {"name": name, "arguments": arguments})
+
+    async def list_tools(self) -> List[SimpleNamespace]:
+        data = await self._request("list_tools")
+        self.server_info = SimpleNamespace(version=data.get("version"))
+        return [
+            SimpleNamespace(name=t["name"], description=t.get("description", ""), inputSchema=t.get("inputSchema"))
+            for t in data.get("tools", [])
+        ]
+
+    async def ping(self):
+        return await self._request("ping")
+
+    @asynccontextmanager
+    async def session(self):
+        yield self
+
+    async def warmup(self, count: Optional[int] = None) -> int:
+        """建立到代理的连接,返回可用连接数"""
+        await self._ensure_connected()
+        return 1
+
+    async def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
@@ -0,0 +1,266 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# 默认的耗时分桶(秒),覆盖缓存命中到长时间LLM调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """分桶直方图,输出 _bucket / _sum / _count"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """
+    指标注册表,按 Prometheus 文本格式输出
+
+    除计数器和直方图外,还可以注册采集函数,在抓取时读取缓存命中率等已有的统计数据
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "trip_stage_duration_seconds", "各阶段耗时(LLM调用、MCP工具、Agent、外部服务)", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "trip_stage_errors_total", "各阶段失败次数(含解析失败)", ["stage"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "trip_llm_tokens_total", "LLM token 用量,kind 为 prompt 或 completion", ["kind", "model"]
+)
+
+
+class RequestTrace:
+    """单个请求内各阶段的耗时记录,用于生成 Server-Timing 响应头"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        # 非耗时的请求指标(如节省的 token 数),同名累加
+        self.notes: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def note(self, name: str, value: float):
+        self.notes[name] = self.notes.get(name, 0) + value
+
+    def breakdown(self) -> Dict[str, Tuple[int, float]]:
+        """按阶段汇总 {阶段: (次数, 总耗时秒)};并发阶段的耗时会叠加"""
+        totals: Dict[str, Tuple[int, float]] = {}
+        for stage, seconds in self.spans:
+            count, total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + 1, total + seconds)
+        return totals
+
+    def server_timing(self) -> str:
+        entries = [
+            f'{stage};dur={total * 1000:.1f};desc="x{count}"'
+            for stage, (count, total) in self.breakdown().items()
+        ]
+        entries += [f'{name};desc="{value:g}"' for name, value in self.notes.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def start_trace() -> RequestTrace:
+    """为当前上下文开启请求追踪,之后创建的子任务会继承同一个追踪对象"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record(stage: str, seconds: float, failed: bool = False):
+    """记录一次阶段耗时(同时写入直方图和当前请求的追踪)"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if failed:
+        STAGE_ERRORS.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def note(name: str, value: float):
+    """在当前请求的追踪中记录一个非耗时指标,以 Server-Timing 的 desc 输出"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.note(name, value)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """计时上下文管理器,异常会计入该阶段的失败次数后继续抛出"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except GeneratorExit:
+        # 调用方提前结束了流式生成,不算失败
+        raise
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, failed)
+
+
+def record_usage(usage, model: str = "") -> None:
+    """记录 OpenAI 兼容接口返回的 token 用量,按模型区分以便核算成本"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt", model=model)
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion", model=model)
+
+
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]):
+    """注册缓存的统计函数(返回 hits / misses / size),抓取时输出命中、未命中次数和条目数"""
+    _caches[name] = stats
+
+
+def _collect_caches() -> List[str]:
+    if not _caches:
+        return []
+    snapshots = {name: stats() for name, stats in _caches.items()}
+    lines: List[str] = []
+    for field, kind, documentation in (
+        ("hits", "counter", "缓存命中次数"),
+        ("misses", "counter", "缓存未命中次数"),
+        ("size", "gauge", "缓存当前条目数"),
+        ("disk_busy", "counter", "磁盘层被其他进程锁住而跳过的读写次数"),
+    ):
+        metric = f"trip_cache_{field}_total" if kind == "counter" else f"trip_cache_{field}"
+        lines.append(f"# HELP {metric} {documentation}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, snapshot in snapshots.items():
+            lines.append(f"{metric}{_format_labels(('cache',), (name,))} {_format_value(snapshot.get(field, 0))}")
+    return lines
+
+
+REGISTRY.register_collector(_collect_caches)
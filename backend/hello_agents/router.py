@@ -0,0 +1,283 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+import httpx
+from openai import AsyncOpenAI
+
+from hello_agents import metrics
+
+# 多端点 LLM 路由: 一组 OpenAI 兼容的端点(服务商 + 模型),每个端点有权重、限流和独立的连接池。
+# 端点按档位(tier)分组,Agent 按名称映射到档位,如工具调度类 Agent 用小模型、规划 Agent 用大模型。
+# 同档位内按权重选择,失败的端点进入冷却并切换到其他端点;
+# 非流式请求超过该 Agent 历史耗时的 p95 仍未返回时,向另一个端点发出对冲请求,取先返回的结果。
+
+DEFAULT_TIER = "default"
+
+LLM_REQUESTS = metrics.REGISTRY.counter(
+    "trip_llm_requests_total", "各端点的LLM请求数,outcome 为 ok / error / cancelled", ["endpoint", "outcome"]
+)
+LLM_HEDGES = metrics.REGISTRY.counter(
+    "trip_llm_hedges_total", "对冲请求次数,outcome 为 launched(已发出) / won(先于原请求返回)", ["outcome"]
+)
+
+
+class RateLimiter:
+    """令牌桶限流,rpm 为每分钟请求数上限(0 表示不限)"""
+
+    def __init__(self, rpm: float = 0, burst: Optional[float] = None):
+        self.rate = rpm / 60
+        # 默认允许约10秒的突发量
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """距离下一个令牌可用的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class LatencyWindow:
+    """最近若干次成功请求的耗时,用于估算对冲阈值"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+@dataclass
+class Endpoint:
+    """一个 OpenAI 兼容端点上的一个模型"""
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    tier: str = DEFAULT_TIER
+    weight: float = 1.0
+    # 每分钟请求数上限,0 表示不限
+    rpm: float = 0
+    max_concurrency: int = 8
+    # 连续失败后的冷却截止时间(time.monotonic)
+    cooldown_until: float = 0.0
+    failures: int = 0
+    limiter: RateLimiter = field(init=False)
+    semaphore: asyncio.Semaphore = field(init=False)
+    client: Optional[AsyncOpenAI] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.limiter = RateLimiter(self.rpm)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def connect(self, timeout: float):
+        """创建该端点独立的连接池,重试和故障转移由路由层控制"""
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            ),
+            timeout=timeout
+        )
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=0
+        )
+
+
+def parse_agent_tiers(text: str) -> Dict[str, str]:
+    """解析 "PlannerAgent=large,AllocationAgent=small" 形式的 Agent 档位配置"""
+    tiers = {}
+    for item in (text or "").split(","):
+        if "=" in item:
+            agent, tier = item.split("=", 1)
+            tiers[agent.strip()] = tier.strip()
+    return tiers
+
+
+def load_endpoints(spec: str, max_concurrency: int) -> List[Endpoint]:
+    """
+    解析端点配置: JSON 数组,或包含该数组的文件路径
+
+    每项如 {"name": "primary", "base_url": "...", "api_key_env": "OPENAI_API_KEY", "model": "gpt-4o",
+    "tier": "large", "weight": 3, "rpm": 500, "max_concurrency": 8};
+    api_key 可直接给出,也可用 api_key_env 指定环境变量名
+    """
+    spec = spec.strip()
+    if not spec.startswith("["):
+        with open(spec, encoding="utf-8") as f:
+            spec = f.read()
+
+    endpoints = []
+    for i, item in enumerate(json.loads(spec)):
+        api_key = item.get("api_key")
+        if api_key is None and item.get("api_key_env"):
+            api_key = os.getenv(item["api_key_env"])
+        endpoints.append(Endpoint(
+            name=item.get("name") or f"endpoint{i}",
+            model=item["model"],
+            base_url=item.get("base_url"),
+            api_key=api_key,
+            tier=item.get("tier", DEFAULT_TIER),
+            weight=float(item.get("weight", 1)),
+            rpm=float(item.get("rpm", 0)),
+            max_concurrency=int(item.get("max_concurrency", max_concurrency)),
+        ))
+    return endpoints
+
+
+class LLMRouter:
+    """
+    按 Agent 选择端点
+
+    - 档位: agent_tiers 把 Agent 名称映射到档位;档位没有可用端点时依次退回 default 档位和全部端点
+    - 选择: 优先选择本次调用尚未尝试过、不在冷却中且有限流令牌的端点,按权重随机
+    - 故障转移: 端点出错后冷却 cooldown 秒(连续失败时加倍,最多8倍),期间流量转到同档位的其他端点;
+      所有端点都在冷却时仍按权重选择,不直接拒绝请求
+    - 对冲: 某个 Agent 积累了 hedge_min_samples 次耗时后,以其 hedge_quantile 分位数作为对冲阈值
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        agent_tiers: Optional[Dict[str, str]] = None,
+        timeout: float = 120,
+        cooldown: float = 30,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_enabled: bool = True
+    ):
+        if not endpoints:
+            raise ValueError("至少需要配置一个LLM端点")
+        self.endpoints = endpoints
+        self.agent_tiers = agent_tiers or {}
+        self.cooldown = cooldown
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_enabled = hedge_enabled
+        self._latency: Dict[str, LatencyWindow] = {}
+        for endpoint in endpoints:
+            if endpoint.client is None:
+                endpoint.connect(timeout)
+
+    @classmethod
+    def from_env(cls, max_concurrency: int, timeout: float) -> "LLMRouter":
+        """
+        从环境变量构建: LLM_ENDPOINTS 为端点配置(见 load_endpoints),
+        未配置时使用 OPENAI_BASE_URL / OPENAI_API_KEY / OPENAI_MODEL_NAME 的单个端点
+        """
+        spec = os.getenv("LLM_ENDPOINTS", "")
+        if spec.strip():
+            endpoints = load_endpoints(spec, max_concurrency)
+        else:
+            endpoints = [Endpoint(
+                name="default",
+                model=os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo"),
+                base_url=os.getenv("OPENAI_BASE_URL"),
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_concurrency=max_concurrency,
+            )]
+        return cls(
+            endpoints,
+            agent_tiers=parse_agent_tiers(os.getenv("LLM_AGENT_TIERS", "")),
+            timeout=timeout,
+            cooldown=float(os.getenv("LLM_ENDPOINT_COOLDOWN", "30")),
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def tier_for(self, agent: Optional[str]) -> str:
+        return self.agent_tiers.get(agent or "", DEFAULT_TIER)
+
+    def pool(self, tier: str) -> List[Endpoint]:
+        return (
+            [e for e in self.endpoints if e.tier == tier]
+            or [e for e in self.endpoints if e.tier == DEFAULT_TIER]
+            or self.endpoints
+        )
+
+    def model_for(self, agent: Optional[str] = None) -> str:
+        """该 Agent 档位中权重最高的端点的模型名"""
+        return max(self.pool(self.tier_for(agent)), key=lambda e: e.weight).model
+
+    def shared_model(self, tier: str) -> Optional[str]:
+        """档位中所有端点使用同一个模型时返回该模型名,混合模型的档位返回 None"""
+        models = {e.model for e in self.pool(tier)}
+        return models.pop() if len(models) == 1 else None
+
+    @staticmethod
+    def _weighted(endpoints: List[Endpoint]) -> Endpoint:
+        weights = [max(e.weight, 0.0) for e in endpoints]
+        if sum(weights) <= 0:
+            return random.choice(endpoints)
+        return random.choices(endpoints, weights=weights)[0]
+
+    def has_alternative(self, tier: str, tried: Iterable[str]) -> bool:
+        """同档位中是否还有本次调用未尝试过、且不在冷却中的端点"""
+        tried = set(tried)
+        now = time.monotonic()
+        return any(e.name not in tried and e.cooldown_until <= now for e in self.pool(tier))
+
+    async def acquire(self, tier: str, tried: Optional[Set[str]] = None) -> Endpoint:
+        """选择端点并占用一个限流令牌,候选端点都被限流时等待"""
+        tried = tried or set()
+        pool = self.pool(tier)
+        while True:
+            now = time.monotonic()
+            healthy = [e for e in pool if e.cooldown_until <= now]
+            candidates = [e for e in healthy if e.name not in tried] or healthy or pool
+            waits = [e.limiter.wait_time(now) for e in candidates]
+            ready = [e for e, wait in zip(candidates, waits) if wait <= 0]
+            if ready:
+                endpoint = self._weighted(ready)
+                endpoint.limiter.take()
+                return endpoint
+            await asyncio.sleep(min(waits))
+
+    def report_success(self, endpoint: Endpoint, key: Optional[str] = None, seconds: float = 0.0):
+        """记录成功请求;key 为对冲阈值的统计口径(流式请求不统计耗时)"""
+        endpoint.failures = 0
+        endpoint.cooldown_until = 0.0
+        if key is not None:
+            self._latency.setdefault(key, LatencyWindow()).add(seconds)
+        LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="ok")
+
+    def report_failure(self, endpoint: Endpoint):
+        endpoint.failures += 1
+        endpoint.cooldown_until = time.monotonic() + self.cooldown * min(2 ** (endpoint.failures - 1), 8)
+        LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="error")
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """对冲阈值(秒);未启用或样本不足时为 None"""
+        window = self._latency.get(key)
+        if not self.hedge_enabled or window is None or len(window.samples) < self.hedge_min_samples:
+            return None
+        return window.quantile(self.hedge_quantile)
+
+    async def aclose(self):
+        await asyncio.gather(*[e.client.close() for e in self.endpoints if e.client is not None])
@@ -1,36 +1,310 @@
 import subprocess
 import json
 import os
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Callable
 import logging
 from fastmcp import Client
 import asyncio
+from hello_agents.cache import ToolResultCache
+from hello_agents.mcp_broker import BrokerClient
+from hello_agents import metrics
+
+# JSON-RPC "Method not found" 错误码
+_METHOD_NOT_FOUND = -32601
+
+class MCPSessionPool:
+    """
+    MCP 会话池
+
+    维护一组长连接的 MCP 客户端(每个客户端对应一个 MCP 服务进程)，
+    调用方通过 `session()` 借用会话，用完归还，避免每次调用都重新拉起 `npx` 进程。
+    """
+
+    def __init__(self, config: Dict[str, Any], size: int = 2, health_check_interval: float = 30.0):
+        self.config = config
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._clients: List[Client] = []
+        self._created = 0
+        self._last_checked: Dict[int, float] = {}
+        self._closed = False
+
+    def _bind_loop(self):
+        # 会话与创建它的事件循环绑定，切换到新的事件循环时重建池
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._release_stale(self._loop, self._clients)
+            self._loop = loop
+            self._idle = asyncio.Queue()
+            self._clients = []
+            self._created = 0
+            self._last_checked = {}
+
+    @staticmethod
+    def _release_stale(loop: Optional[asyncio.AbstractEventLoop], clients: List[Client]):
+        """在旧事件循环中关闭绑定在它上面的会话，避免其服务进程成为孤儿进程"""
+        if not clients or loop is None or loop.is_closed():
+            # 事件循环关闭前会取消其中的任务，服务进程随之退出
+            return
+
+        async def close_all():
+            for client in clients:
+                await MCPSessionPool._close_client(client)
+
+        if loop.is_running():
+            # 旧事件循环仍在其他线程中运行
+            asyncio.run_coroutine_threadsafe(close_all(), loop)
+        else:
+            # 旧事件循环已停止但未关闭，借用一个线程运行它完成清理
+            threading.Thread(target=loop.run_until_complete, args=(close_all(),), daemon=True).start()
+
+    async def _connect(self) -> Client:
+        client = Client(self.config)
+        await client.__aenter__()
+        self._last_checked[id(client)] = time.monotonic()
+        return client
+
+    async def _discard(self, client: Client):
+        if client in self._clients:
+            self._clients.remove(client)
+            self._created -= 1
+        self._last_checked.pop(id(client), None)
+        await self._close_client(client)
+
+    @staticmethod
+    async def _close_client(client: Client):
+        # __aexit__ 只结束会话，stdio 传输默认保持服务进程存活；close 同时结束服务进程
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    async def _is_healthy(self, client: Client) -> bool:
+        """健康检查：连接已断开或 ping 失败的会话视为失效"""
+        if not client.is_connected():
+            return False
+
+        now = time.monotonic()
+        if now - self._last_checked.get(id(client), 0) < self.health_check_interval:
+            return True
+
+        try:
+            await asyncio.wait_for(client.ping(), timeout=5)
+        except asyncio.TimeoutError:
+            return False
+        except Exception as e:
+            # 服务端不支持 ping 时会返回错误响应，说明进程仍然存活
+            code = getattr(getattr(e, "error", None), "code", None)
+            if code != _METHOD_NOT_FOUND:
+                return False
+        self._last_checked[id(client)] = now
+        return True
+
+    async def _checkout(self) -> Client:
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        client = await self._connect()
+                    except Exception:
+                        self._created -= 1
+                        raise
+                    self._clients.append(client)
+                    return client
+                client = await self._idle.get()
+
+            if await self._is_healthy(client):
+                return client
+
+            # 服务进程已退出，丢弃后由下一轮循环重新拉起
+            print("MCP 会话已失效，正在重新启动服务进程 ...")
+            await self._discard(client)
+
+    @asynccontextmanager
+    async def session(self):
+        """借用一个已连接的 MCP 会话"""
+        if self._closed:
+            raise RuntimeError("MCP 会话池已关闭")
+        self._bind_loop()
+
+        client = await self._checkout()
+        try:
+            yield client
+        except Exception:
+            # 调用失败后，下次借出前强制做一次健康检查
+            self._last_checked[id(client)] = 0
+            raise
+        finally:
+            if self._closed or not client.is_connected():
+                await self._discard(client)
+            else:
+                self._idle.put_nowait(client)
+
+    async def warmup(self, count: Optional[int] = None) -> int:
+        """预先建立连接(默认填满整个池)，返回当前可用的会话数"""
+        if self._closed:
+            raise RuntimeError("MCP 会话池已关闭")
+        self._bind_loop()
+
+        count = min(count or self.size, self.size)
+        clients = await asyncio.gather(
+            *[self._checkout() for _ in range(count)],
+            return_exceptions=True
+        )
+        for client in clients:
+            if isinstance(client, Exception):
+                print(f"预热 MCP 会话失败: {client}")
+            else:
+                self._idle.put_nowait(client)
+        return self._idle.qsize()
+
+    async def close(self):
+        """关闭所有空闲会话；借出中的会话在归还时关闭"""
+        self._closed = True
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
 
 class Tool:
-    def __init__(self, name: str, description: str, args: str, config: Dict[str, Any]):
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        args: str,
+        config: Dict[str, Any],
+        pool: Optional[MCPSessionPool] = None,
+        cache: Optional[ToolResultCache] = None,
+        input_schema: Optional[Dict[str, Any]] = None
+    ):
         self.name = name
         self.description = description
         self.args = args
         self.config = config
+        self.pool = pool
+        self.cache = cache
+        if input_schema is None:
+            try:
+                input_schema = json.loads(args)
+            except (TypeError, ValueError):
+                input_schema = None
+        self.input_schema = input_schema if isinstance(input_schema, dict) else {}
 
-    async def run(self, args: Dict[str, Any]) -> str:
-        try:
+    def to_openai_schema(self) -> Dict[str, Any]:
+        """转换为 OpenAI 原生 function calling 的工具定义"""
+        parameters = self.input_schema if self.input_schema.get("type") == "object" else {
+            "type": "object",
+            "properties": {}
+        }
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description or "",
+                "parameters": parameters
+            }
+        }
+
+    @staticmethod
+    def _result_to_text(result: Any) -> str:
+        """提取工具结果中的文本内容"""
+        content = getattr(result, "content", None)
+        if not content:
+            return str(result)
+        texts = [block.text for block in content if getattr(block, "text", None) is not None]
+        return "\n".join(texts) if texts else str(result)
+
+    async def _call(self, args: Dict[str, Any]) -> str:
+        if self.pool is not None:
+            async with self.pool.session() as client:
+                result = await client.call_tool(self.name, args)
+        else:
             client = Client(self.config)
             async with client:
                 result = await client.call_tool(self.name, args)
-            return result
-            
+        return self._result_to_text(result)
+
+    async def fetch(self, args: Dict[str, Any]) -> str:
+        """经过结果缓存调用工具；出错时抛出异常，错误信息不会被写入缓存"""
+        if self.cache is not None:
+            return await self.cache.fetch(self.name, args, lambda: self._call(args))
+        return await self._call(args)
+
+    async def run(self, args: Dict[str, Any]) -> str:
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await self.fetch(args)
+
         except Exception as e:
+            failed = True
             return f"执行 MCP 工具时出错: {str(e)}"
+        finally:
+            metrics.record(f"mcp.{self.name}", time.perf_counter() - start, failed)
+
+class ToolSpec:
+    """MCP 工具目录中的一项(名称、描述、参数 schema)"""
+
+    def __init__(self, name: str, description: str, input_schema: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.description = description or ""
+        self.input_schema = input_schema or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "description": self.description, "inputSchema": self.input_schema}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolSpec":
+        return cls(data["name"], data.get("description", ""), data.get("inputSchema"))
 
 class MCPTool:
-    def __init__(self, name: str, command: str, args: List[str], env: Dict[str, str], auto_expand: bool = False):
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        args: List[str],
+        env: Dict[str, str],
+        auto_expand: bool = False,
+        pool_size: int = 2,
+        health_check_interval: float = 30.0,
+        cache: Optional[ToolResultCache] = None,
+        snapshot_path: Optional[str] = None,
+        snapshot_max_age: float = 86400,
+        broker_address: Optional[str] = None
+    ):
         self.name = name
         self.command = command
         self.args = args
         self.env = env
+        self.cache = cache
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+
+        # 工具目录在启动时异步发现一次，所有 Agent 共享
+        self.catalog: Optional[List[ToolSpec]] = None
+        self.server_version: Optional[str] = None
+        self._subscribers: List[Callable[[List[ToolSpec]], None]] = []
+        self._discover_lock: Optional[asyncio.Lock] = None
 
         self._construct_config()
+        # 给定 MCP 代理地址时通过代理调用工具(多个进程共用代理的会话池),不在本进程启动服务进程
+        if broker_address:
+            self.pool = BrokerClient(broker_address)
+        else:
+            self.pool = MCPSessionPool(
+                self.config,
+                size=pool_size,
+                health_check_interval=health_check_interval
+            )
 
     def _construct_config(self):
         self.config = {
@@ -43,8 +317,118 @@ class MCPTool:
             }
         }
 
+    @property
+    def package_spec(self) -> str:
+        """服务端包名(含版本号时如 @amap/amap-maps-mcp-server@1.0.0)，作为目录快照的 key"""
+        packages = [arg for arg in self.args if not arg.startswith("-")]
+        return packages[0] if packages else self.command
+
+    @property
+    def _package_pinned(self) -> bool:
+        return "@" in self.package_spec.lstrip("@")
+
     async def list_tools(self):
         client = Client(self.config)
         async with client:
             tools = await client.list_tools()
-        return tools
\ No newline at end of file
+        return tools
+
+    def _load_snapshot(self) -> Optional[List[ToolSpec]]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                entry = json.load(f).get(f"{self.name}:{self.package_spec}")
+        except (OSError, ValueError) as e:
+            print(f"读取 MCP 工具目录快照失败: {e}")
+            return None
+        if not entry:
+            return None
+        # 未固定版本的包可能随时升级，快照只在 snapshot_max_age 内有效
+        if not self._package_pinned and time.time() - entry.get("created_at", 0) > self.snapshot_max_age:
+            return None
+        self.server_version = entry.get("version")
+        return [ToolSpec.from_dict(item) for item in entry.get("tools", [])]
+
+    def _save_snapshot(self, catalog: List[ToolSpec]):
+        if not self.snapshot_path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            data[f"{self.name}:{self.package_spec}"] = {
+                "version": self.server_version,
+                "created_at": time.time(),
+                "tools": [spec.to_dict() for spec in catalog]
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+            with open(self.snapshot_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except (OSError, ValueError) as e:
+            print(f"写入 MCP 工具目录快照失败: {e}")
+
+    async def discover(self, refresh: bool = False) -> List[ToolSpec]:
+        """
+        发现工具目录(只执行一次)：优先读取磁盘快照，否则通过会话池向服务端查询，
+        完成后通知所有订阅者
+        """
+        if self._discover_lock is None:
+            self._discover_lock = asyncio.Lock()
+        async with self._discover_lock:
+            if self.catalog is not None and not refresh:
+                return self.catalog
+
+            catalog = None if refresh else self._load_snapshot()
+            if catalog is None:
+                async with self.pool.session() as client:
+                    tools = await client.list_tools()
+                    server_info = getattr(client, "server_info", None) or getattr(
+                        getattr(client, "initialize_result", None), "serverInfo", None
+                    )
+                    self.server_version = getattr(server_info, "version", None)
+                catalog = [
+                    ToolSpec(
+                        tool.name,
+                        tool.description,
+                        getattr(tool, "input_schema", None) or getattr(tool, "inputSchema", None)
+                    )
+                    for tool in tools
+                ]
+                self._save_snapshot(catalog)
+
+            self.catalog = catalog
+            print(f"MCP 工具集 {self.name} 共 {len(catalog)} 个工具 (服务端版本: {self.server_version or '未知'})")
+
+        for callback in list(self._subscribers):
+            callback(catalog)
+        return catalog
+
+    def subscribe(self, callback: Callable[[List[ToolSpec]], None]):
+        """订阅工具目录；目录已就绪时立即回调"""
+        self._subscribers.append(callback)
+        if self.catalog is not None:
+            callback(self.catalog)
+
+    def view(self, include: Optional[List[str]] = None) -> List[Tool]:
+        """按名称过滤的工具视图，include 为空时返回全部工具"""
+        if self.catalog is None:
+            return []
+        return [
+            Tool(
+                name=spec.name,
+                description=spec.description,
+                args=json.dumps(spec.input_schema, ensure_ascii=False),
+                config=self.config,
+                pool=self.pool,
+                cache=self.cache,
+                input_schema=spec.input_schema
+            )
+            for spec in self.catalog
+            if include is None or spec.name in include
+        ]
+
+    async def close(self):
+        """关闭会话池及其持有的 MCP 服务进程"""
+        await self.pool.close()
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class StepFailedError(Exception):
+    """必需步骤执行失败(异常或超时)"""
+
+    def __init__(self, step_name: str, cause: BaseException):
+        self.step_name = step_name
+        self.cause = cause
+        super().__init__(f"步骤 {step_name} 执行失败: {cause!r}")
+
+
+class Step:
+    """
+    工作流中的一个步骤
+
+    Args:
+        name: 步骤名称，同时作为结果字典的键
+        func: 异步函数，参数为依赖步骤的结果字典 {依赖名: 结果}
+        deps: 依赖的步骤名称列表
+        timeout: 单步超时时间(秒)，None 表示不限制
+        required: 必需步骤失败时整个工作流失败；非必需步骤失败时使用 fallback 作为结果继续执行
+        fallback: 非必需步骤失败时的替代结果
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Any]],
+        deps: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        required: bool = True,
+        fallback: Any = None
+    ):
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+        self.timeout = timeout
+        self.required = required
+        self.fallback = fallback
+
+
+class WorkflowResult:
+    """工作流执行结果"""
+
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.failures: Dict[str, BaseException] = {}
+        self.durations: Dict[str, float] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        return self.results[name]
+
+    def failed(self, name: str) -> bool:
+        return name in self.failures
+
+
+class Workflow:
+    """
+    DAG 执行器：没有依赖关系的步骤并发执行，每个步骤在其依赖全部完成后立即启动
+    """
+
+    def __init__(self, steps: List[Step]):
+        self.steps: Dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"重复的步骤名称: {step.name}")
+            self.steps[step.name] = step
+        self._order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1: 访问中, 2: 已完成
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"工作流存在循环依赖: {name}")
+            state[name] = 1
+            for dep in self.steps[name].deps:
+                if dep not in self.steps:
+                    raise ValueError(f"步骤 {name} 依赖未知步骤 {dep}")
+                visit(dep)
+            state[name] = 2
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    async def run(
+        self,
+        on_step_done: Optional[Callable[[str, Any, Optional[BaseException]], None]] = None
+    ) -> WorkflowResult:
+        """
+        执行工作流
+
+        Args:
+            on_step_done: 每个步骤结束(成功、降级或失败)时的回调，参数为 (步骤名, 结果, 异常)
+        """
+        result = WorkflowResult()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Step) -> Any:
+            inputs = {dep: await tasks[dep] for dep in step.deps}
+            start = time.perf_counter()
+            try:
+                if step.timeout is not None:
+                    value = await asyncio.wait_for(step.func(inputs), timeout=step.timeout)
+                else:
+                    value = await step.func(inputs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    print(f"步骤 {step.name} 超时({step.timeout}s)")
+                else:
+                    print(f"步骤 {step.name} 执行失败: {e}")
+                result.failures[step.name] = e
+                result.durations[step.name] = time.perf_counter() - start
+                if on_step_done is not None:
+                    on_step_done(step.name, step.fallback, e)
+                if step.required:
+                    raise StepFailedError(step.name, e) from e
+                result.results[step.name] = step.fallback
+                return step.fallback
+
+            result.durations[step.name] = time.perf_counter() - start
+            result.results[step.name] = value
+            if on_step_done is not None:
+                on_step_done(step.name, value, None)
+            return value
+
+        for name in self._order:
+            tasks[name] = asyncio.create_task(run_step(self.steps[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return result
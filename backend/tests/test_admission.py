@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+def test_identical_requests_are_coalesced():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"plan": len(calls)}
+
+    async def main():
+        admission = AdmissionController(max_concurrency=1, per_client_limit=10)
+        results = await asyncio.gather(*[
+            admission.run("北京|3", f"client-{i}", compute) for i in range(5)
+        ])
+        return admission, results
+
+    admission, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result == {"plan": 1} for result in results)
+    assert admission.coalesced == 4
+    assert admission.active == 0 and admission.stats()["inflight_keys"] == 0
+
+def test_rejects_when_saturated():
+    async def slow():
+        await asyncio.sleep(0.1)
+
+    async def main():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, per_client_limit=2)
+        first = asyncio.ensure_future(admission.run(None, "a", slow))
+        queued = asyncio.ensure_future(admission.run(None, "b", slow))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AdmissionRejected) as overloaded:
+            await admission.run(None, "c", slow)
+        assert overloaded.value.status_code == 503
+
+        await asyncio.gather(first, queued)
+        assert admission.active == 0 and admission.queued == 0
+
+    asyncio.run(main())
+
+def test_per_client_limit_and_fair_order():
+    order = []
+
+    def job(name):
+        async def compute():
+            order.append(name)
+            await asyncio.sleep(0.01)
+        return compute
+
+    async def main():
+        admission = AdmissionController(max_concurrency=1, max_queue=10, per_client_limit=3)
+        blocker = asyncio.ensure_future(admission.run(None, "busy", job("busy")))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(admission.run(None, "a", job(f"a{i}"))) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(admission.run(None, "b", job("b0"))))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as limited:
+            await admission.run(None, "a", job("a3"))
+        assert limited.value.status_code == 429
+
+        await asyncio.gather(blocker, *tasks)
+
+    asyncio.run(main())
+    # 客户端 b 不需要等 a 的全部请求执行完
+    assert order == ["busy", "a0", "b0", "a1", "a2"]
+
+def test_followers_retry_when_leader_is_rejected_for_its_client():
+    """领头请求因自己的客户端超限被拒绝时,其他客户端的跟随者不受影响"""
+    release = asyncio.Event()
+
+    async def busy():
+        await release.wait()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "plan"
+
+    async def main():
+        admission = AdmissionController(max_concurrency=4, per_client_limit=1)
+        blocker = asyncio.ensure_future(admission.run(None, "a", busy))
+        await asyncio.sleep(0)
+        leader = asyncio.ensure_future(admission.run("北京|3", "a", compute))
+        followers = [asyncio.ensure_future(admission.run("北京|3", f"client-{i}", compute)) for i in range(2)]
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await leader
+        assert rejected.value.status_code == 429
+        assert await asyncio.gather(*followers) == ["plan", "plan"]
+        release.set()
+        await blocker
+        assert admission.active == 0 and admission.stats()["inflight_keys"] == 0
+
+    asyncio.run(main())
+
+def test_stream_slot_released_when_client_disconnects_before_body():
+    from app.api.main import AdmittedStreamingResponse
+
+    released = []
+    started = []
+
+    async def body():
+        started.append(1)
+        yield "{}\n"
+
+    async def send(message):
+        # 客户端在响应开始前已断开
+        raise OSError("connection reset")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def main():
+        response = AdmittedStreamingResponse(body(), lambda: released.append(1))
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with pytest.raises(Exception):
+            await response(scope, receive, send)
+
+    asyncio.run(main())
+    assert released == [1] and not started
@@ -0,0 +1,26 @@
+import json
+import subprocess
+import sys
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_offline_benchmark_smoke(tmp_path):
+    """用本地替身跑通完整规划链路,并检查结果JSON的结构"""
+    output = tmp_path / "result.json"
+    subprocess.run(
+        [
+            sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "e2e.py"),
+            "--requests", "3", "--concurrency", "3", "--warmup", "0",
+            "--llm-latency", "0", "--tokens-per-second", "0", "--mcp-latency", "0",
+            "--unsplash-latency", "0", "--output", str(output),
+        ],
+        cwd=BACKEND_DIR, check=True, capture_output=True, timeout=120
+    )
+
+    result = json.loads(output.read_text(encoding="utf-8"))
+    summary = result["summary"]
+    assert summary["succeeded"] == 3
+    assert summary["latency_ms"]["p50"] <= summary["latency_ms"]["p99"]
+    assert summary["stages"]["plan_trip"]["calls_per_request"] == 1
+    assert "llm" in summary["stages"]
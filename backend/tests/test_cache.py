@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents.cache import LRUCache, SQLiteCache, TieredCache, ToolResultCache, MISSING, parse_ttls
+
+def test_lru_eviction_and_ttl():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is MISSING
+
+def test_tool_cache_single_flight_and_disk_tier():
+    calls = []
+
+    async def search():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return '{"pois": []}'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tools.db")
+        cache = ToolResultCache(tool_ttls=parse_ttls("maps_weather=0"), disk_path=path)
+
+        async def drive():
+            args = {"keywords": "酒店", "city": "北京"}
+            same = {"city": " 北京 ", "keywords": "酒店"}
+            results = await asyncio.gather(*[
+                cache.fetch("maps_text_search", args if i % 2 else same, search) for i in range(5)
+            ])
+            assert set(results) == {'{"pois": []}'}
+            # TTL 为 0 的工具不缓存
+            await cache.fetch("maps_weather", {"city": "上海"}, search)
+            await cache.fetch("maps_weather", {"city": "上海"}, search)
+
+        asyncio.run(drive())
+        assert len(calls) == 3
+        assert cache.stats()["coalesced"] == 4
+
+        # 新实例(模拟重启)从磁盘层命中
+        restarted = ToolResultCache(disk_path=path)
+        key = ToolResultCache.make_key("maps_text_search", {"keywords": "酒店", "city": "北京"})
+        assert restarted.get(key) == '{"pois": []}'
+        assert restarted.stats()["disk_hits"] == 1
+        cache.disk.close()
+        restarted.disk.close()
+
+def test_locked_disk_tier_degrades_to_miss(tmp_path):
+    """其他进程长时间持有写锁时写入不等待,只保留在内存层"""
+    path = str(tmp_path / "shared.db")
+    cache = TieredCache(LRUCache(), SQLiteCache(path, table="plans"))
+    cache.disk.set("warm", {"v": 1})
+
+    other = sqlite3.connect(path)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        start = time.perf_counter()
+        cache.set("k", {"v": 2})
+        assert cache.get("k") == {"v": 2}
+        # WAL 模式下读取不受写锁影响
+        assert cache.disk.get("warm")[0] == {"v": 1}
+        assert time.perf_counter() - start < 1
+        assert cache.stats()["disk_busy"] == 1
+    finally:
+        other.rollback()
+        other.close()
+
+    assert cache.disk.get("k")[0] is MISSING
+    cache.disk.close()
+
+if __name__ == "__main__":
+    test_lru_eviction_and_ttl()
+    test_tool_cache_single_flight_and_disk_tier()
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents import chunked_planner, trip_planner
+from app.agents.trip_planner import TripPlannerAgent
+from app.agents.chunked_planner import parse_allocation, trip_dates
+from app.services.itinerary_optimizer import plan_routes
+from app.services.plan_cache import PlanCache
+from app.services.poi_index import PoiIndex
+from app.models.schemas import TripPlanRequest
+from benchmarks.fakes.llm import build_allocation, build_day
+
+REQUEST = TripPlanRequest(
+    city="北京", start_date="2026-10-01", end_date="2026-10-04", days=4,
+    preferences="历史", budget="中等", transportation="公共交通", accommodation="经济型酒店"
+)
+
+class FakeAgent:
+    def __init__(self, reply, delay=0.05):
+        self.reply = reply
+        self.delay = delay
+        self.tools = {}
+        self.queries = []
+
+    async def run(self, query):
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        return self.reply(query) if callable(self.reply) else self.reply
+
+class FakeMCP:
+    """提供 maps_weather 和 maps_text_search 的MCP工具替身"""
+
+    def __init__(self):
+        self.calls = []
+
+    def view(self, include=None):
+        return [self]
+
+    async def run(self, args):
+        self.calls.append(args)
+        if "keywords" in args:
+            pois = [{"name": f"{args['keywords']}{i}", "address": "", "location": f"116.{i}0,39.90"} for i in range(3)]
+            return json.dumps({"pois": pois}, ensure_ascii=False)
+        forecasts = [
+            {"date": f"2026-10-0{i}", "dayweather": "晴", "nightweather": "多云", "daytemp": "20",
+             "nighttemp": "10", "daywind": "北", "daypower": "1-3"}
+            for i in range(3, 7)
+        ]
+        return json.dumps({"city": args["city"], "forecasts": forecasts}, ensure_ascii=False)
+
+def day_reply(query):
+    day_index = int(query.split("day_index: ")[1].split()[0])
+    if day_index == 2:
+        return "抱歉,无法生成"
+    date = f"2026-10-0{day_index + 1}"
+    return json.dumps(build_day("北京", day_index, date), ensure_ascii=False)
+
+def make_planner():
+    planner = TripPlannerAgent.__new__(TripPlannerAgent)
+    planner.step_timeout = 5
+    planner.planner_timeout = 5
+    planner.chunked_min_days = 4
+    planner.plan_cache = PlanCache()
+    planner.poi_index = PoiIndex()
+    planner.mcp_tool = FakeMCP()
+    planner.allocation_agent = FakeAgent(json.dumps(build_allocation("北京", 4), ensure_ascii=False))
+    planner.day_planner_agent = FakeAgent(day_reply, delay=0.2)
+    return planner
+
+def test_parse_allocation_groups_nearby_candidates():
+    far = [{"name": f"远{i}", "address": "", "location": {"longitude": 117.0 + i * 0.01, "latitude": 40.5}} for i in range(2)]
+    near = [{"name": f"近{i}", "address": "", "location": {"longitude": 116.0 + i * 0.01, "latitude": 39.5}} for i in range(2)]
+    text = json.dumps({
+        "attractions": [far[0], near[0], far[1], near[1], near[0], {"name": "无坐标"}],
+        "overall_suggestions": "ok"
+    }, ensure_ascii=False)
+
+    allocation = parse_allocation(text, 2)
+    names = [sorted(a.name for a in day) for day in allocation["days"]]
+    assert sorted(names) == [["近0", "近1"], ["远0", "远1"]]
+    assert all(a.visit_duration == 120 for day in allocation["days"] for a in day)
+    assert parse_allocation("无法解析", 2)["days"] == [[], []]
+
+def test_chunked_plan_runs_days_concurrently_with_fallback():
+    planner = make_planner()
+    assert planner._use_chunked(REQUEST)
+
+    async def drive():
+        start = asyncio.get_running_loop().time()
+        plan = await planner.plan_trip(REQUEST)
+        return plan, asyncio.get_running_loop().time() - start
+
+    plan, elapsed = asyncio.run(drive())
+    # 4天并发生成,总耗时远小于串行的 4*0.2s
+    assert elapsed < 0.6
+    # 天气直接由 maps_weather 转换,只保留行程日期范围内的预报
+    assert {"city": "北京"} in planner.mcp_tool.calls
+    assert [w.date for w in plan.weather_info] == ["2026-10-03", "2026-10-04"]
+    assert plan.weather_info[0].day_temp == 20 and plan.weather_info[0].wind_power == "1-3级"
+    assert [day.day_index for day in plan.days] == [0, 1, 2, 3]
+    assert [day.date for day in plan.days] == ["2026-10-01", "2026-10-02", "2026-10-03", "2026-10-04"]
+    # 生成失败的一天保留分配好的景点
+    allocated = parse_allocation(planner.allocation_agent.reply, 4)["days"][2]
+    assert [a.name for a in plan.days[2].attractions] == [a.name for a in allocated]
+    assert plan.days[2].description.startswith("游览")
+
+    # 预算由行程确定性计算: 3天各3张60元门票+3餐50元,酒店按3晚,交通每天40元
+    assert plan.budget.total_attractions == 3 * 3 * 60
+    assert plan.budget.total_meals == 3 * 150
+    assert plan.budget.total_hotels == 2 * 400
+    assert plan.budget.total_transportation == 4 * 40
+    assert plan.budget.total == 540 + 450 + 800 + 160
+
+def test_chunked_stream_emits_every_day():
+    planner = make_planner()
+
+    async def collect():
+        return [event async for event in planner.plan_trip_stream(REQUEST)]
+
+    events = asyncio.run(collect())
+    days = sorted(event["data"].day_index for event in events if event["event"] == "day")
+    assert days == [0, 1, 2, 3]
+    assert len([event for event in events if event["event"] == "weather"]) == 2
+    stages = {event["stage"]: event["status"] for event in events if event["event"] == "stage"}
+    assert stages["allocation"] == "done" and stages["day_2"] == "failed"
+    assert events[-1]["event"] == "plan"
+
+def test_single_shot_plan_uses_tool_weather():
+    planner = make_planner()
+    planner.chunked_min_days = 0
+    llm_plan = build_day("北京", 0, "2026-10-01")
+    planner.planner_agent = FakeAgent(json.dumps({
+        "city": "北京", "start_date": "2026-10-01", "end_date": "2026-10-04",
+        "days": [llm_plan],
+        "weather_info": [{"date": "2026-10-01", "day_weather": "编造", "night_weather": "编造",
+                          "day_temp": 1, "night_temp": 1, "wind_direction": "", "wind_power": ""}],
+        "overall_suggestions": "", "budget": {}
+    }, ensure_ascii=False))
+
+    plan = asyncio.run(planner.plan_trip(REQUEST))
+    assert [w.date for w in plan.weather_info] == ["2026-10-03", "2026-10-04"]
+    query = planner.planner_agent.queries[0]
+    assert "- 2026-10-03: 白天晴 20°C" in query
+    # 景点由路线优化器分天排序后提供,酒店以POI摘要表格的形式提供
+    assert "第2天(2026-10-02):\n1. 历史1 |  | 经度116.1,纬度39.9 | 120分钟" in query
+    assert "第4天(2026-10-04):\n- (未分配景点" in query
+    assert "经济型酒店2|" in query
+    assert "按顺路的游览顺序排列" not in planner.planner_agent.queries[0]
+
+def test_routes_start_from_the_top_hotel(monkeypatch):
+    calls = []
+
+    def record(attractions, days, hotel=None):
+        calls.append(hotel)
+        return plan_routes(attractions, days, hotel=hotel)
+
+    monkeypatch.setattr(trip_planner, "plan_routes", record)
+    monkeypatch.setattr(chunked_planner, "plan_routes", record)
+    planner = make_planner()
+    asyncio.run(planner.plan_trip(REQUEST))
+    planner.chunked_min_days = 0
+    planner.plan_cache = PlanCache()
+    planner.planner_agent = FakeAgent(json.dumps({"city": "北京", "days": [], "overall_suggestions": ""}))
+    asyncio.run(planner.plan_trip(REQUEST))
+
+    # 分块和单次规划都以排名第一的候选酒店作为路线起终点
+    assert [(hotel.longitude, hotel.latitude) for hotel in calls] == [(116.0, 39.9), (116.0, 39.9)]
+
+def test_day_planner_gets_hotels_near_its_attractions():
+    planner = make_planner()
+    asyncio.run(planner.plan_trip(REQUEST))
+
+    # 第二次相同城市的请求直接使用POI索引,不再搜索
+    searches = [call for call in planner.mcp_tool.calls if "keywords" in call]
+    planner.plan_cache = PlanCache()
+    asyncio.run(planner.plan_trip(REQUEST.model_copy(update={"preferences": "历史 "})))
+    assert [call for call in planner.mcp_tool.calls if "keywords" in call] == searches
+
+    # 酒店替身位于经度116.0/116.1/116.2,景点都在116.3附近,最近的是 经济型酒店2
+    query = next(q for q in planner.day_planner_agent.queries if "day_index: 0" in q)
+    hotels = query.split("**候选酒店:**")[1].strip().splitlines()
+    assert hotels[1].startswith("经济型酒店2|")
+
+def test_relative_start_date_plans_undated_days():
+    planner = make_planner()
+    request = REQUEST.model_copy(update={"start_date": "下周一", "end_date": "下周四"})
+    assert trip_dates(request)[0] == "下周一起第1天"
+
+    plan = asyncio.run(planner.plan_trip(request))
+    # 非 ISO 日期不再抛出异常,按相对日期生成,且不匹配任何天气预报
+    assert [day.day_index for day in plan.days] == [0, 1, 2, 3]
+    assert plan.days[2].date == "下周一起第3天"
+    assert plan.weather_info == []
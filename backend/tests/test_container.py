@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Settings
+from app.container import AppContainer, ComponentUnavailable
+
+def test_mcp_is_retried_after_llm_recovers():
+    """LLM 初始化失败时 MCP 被标记为失败而不是停留在 pending,LLM 恢复后请求会重试两者"""
+    calls = []
+
+    async def main():
+        container = AppContainer(Settings(ready_timeout=1))
+        outcomes = {"llm": [RuntimeError("no key"), None]}
+
+        async def start_llm():
+            calls.append("llm")
+            error = outcomes["llm"].pop(0)
+            if error is not None:
+                raise error
+
+        async def start_mcp():
+            calls.append("mcp")
+
+        async def noop():
+            pass
+
+        container._start_llm = start_llm
+        container._start_mcp = start_mcp
+        container._start_unsplash = noop
+        container._prefill_caches = noop
+
+        container.start()
+        await container._warmup_task
+        assert container.components["mcp"].status == "failed"
+        assert container.components["warmup"].status == "failed"
+
+        await container.wait_ready("llm")
+        await container.wait_ready("mcp")
+        assert calls == ["llm", "llm", "mcp"]
+        await container.close()
+
+    asyncio.run(main())
+
+def test_request_that_triggers_a_retry_waits_for_it():
+    async def main():
+        container = AppContainer(Settings(ready_timeout=1))
+        outcomes = [RuntimeError("no key"), None]
+
+        async def start_llm():
+            await asyncio.sleep(0.05)
+            error = outcomes.pop(0)
+            if error is not None:
+                raise error
+
+        container._start_llm = start_llm
+        await container._init("llm", start_llm)
+        assert container.components["llm"].status == "failed"
+
+        # 第一个请求触发重试并等到重试成功,而不是立即拿到上一次的失败
+        await container.wait_ready("llm")
+        assert container.components["llm"].status == "ready" and outcomes == []
+
+    asyncio.run(main())
+
+def test_job_store_is_opened_on_startup(tmp_path):
+    path = tmp_path / "jobs.db"
+
+    async def main():
+        container = AppContainer(Settings(job_store="sqlite", job_db=str(path)))
+        # 创建容器(模块导入时)不连接数据库
+        assert not path.exists()
+        with pytest.raises(ComponentUnavailable):
+            container.jobs
+        container.start_jobs(lambda job: asyncio.sleep(0))
+        assert path.exists() and container.jobs.stats()["workers"] > 0
+        await container.close()
+
+    asyncio.run(main())
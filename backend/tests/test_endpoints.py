@@ -0,0 +1,156 @@
+import asyncio
+import json
+import sys
+import os
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI
+
+from app.api import main
+from app.agents.trip_planner import PLANNER_AGENT_PROMPT
+from app.models.schemas import TripPlanJob
+from app.services.job_store import MemoryJobStore
+from app.services.jobs import JobManager
+from app.services.unsplash_service import UnsplashService
+from benchmarks.fakes.llm import create_app as create_llm_app
+from benchmarks.fakes.unsplash import create_app as create_unsplash_app
+from hello_agents.cache import LLMResponseCache
+from hello_agents.core import HelloAgentsLLM, SimpleAgent
+from hello_agents.router import Endpoint, LLMRouter
+from tests.test_chunked_planner import REQUEST, make_planner
+
+@pytest.fixture
+def unsplash():
+    """用 Unsplash 替身替换容器中的图片服务"""
+    service = UnsplashService("test-key")
+    service._client = httpx.AsyncClient(
+        base_url="http://unsplash.test", transport=httpx.ASGITransport(app=create_unsplash_app())
+    )
+    previous, main.container._unsplash = main.container._unsplash, service
+    yield service
+    main.container._unsplash = previous
+
+def fake_llm() -> HelloAgentsLLM:
+    """连接到 LLM 替身(OpenAI 兼容接口)的客户端"""
+    endpoint = Endpoint(name="fake", model="fake")
+    endpoint.client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://llm.test/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(
+            app=create_llm_app(latency=0, tokens_per_second=0, chunk_chars=64)
+        )),
+        max_retries=0
+    )
+    return HelloAgentsLLM(max_retries=0, router=LLMRouter([endpoint]), cache=LLMResponseCache())
+
+@pytest.fixture
+def planner(unsplash):
+    """单次规划路径的规划Agent:规划文本由 LLM 替身流式生成,MCP工具使用替身"""
+    planner = make_planner()
+    planner.chunked_min_days = 0
+    planner.planner_agent = SimpleAgent(name="PlannerAgent", llm=fake_llm(), system_prompt=PLANNER_AGENT_PROMPT)
+    previous, main.container._trip_planner = main.container._trip_planner, planner
+    states = [main.container.components[name] for name in ("llm", "mcp")]
+    for state in states:
+        state.status = "ready"
+        state.done.set()
+    yield planner
+    main.container._trip_planner = previous
+    for state in states:
+        state.status = "pending"
+        state.done.clear()
+
+def request_api(method, url, **kwargs):
+    """不触发应用的 lifespan(不初始化MCP等组件),直接请求接口"""
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+def test_photo_batch_returns_one_url_per_name(unsplash):
+    response = request_api("POST", "/api/poi/photos", json={"names": ["故宫", "天坛", "故宫", ""], "city": "北京"})
+    body = response.json()
+
+    assert response.status_code == 200 and body["success"]
+    photos = body["data"]["photos"]
+    assert list(photos) == ["故宫", "天坛"]
+    assert all(url.startswith("https://images.example.com/") for url in photos.values())
+    assert photos["故宫"] != photos["天坛"]
+
+def test_photo_batch_streams_ndjson(unsplash):
+    response = request_api(
+        "POST", "/api/poi/photos", json={"names": ["故宫", "天坛", "故宫"], "city": "北京", "stream": True}
+    )
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    # 每个景点推送一行,与批量接口使用相同的查询词和缓存
+    assert sorted(line["name"] for line in lines) == ["天坛", "故宫"]
+    cached = asyncio.run(unsplash.get_photo_urls(["故宫 北京"]))
+    assert next(line for line in lines if line["name"] == "故宫")["photo_url"] == cached["故宫 北京"]
+
+def stream_events(payload):
+    response = request_api("POST", "/api/trip/plan/stream", json=payload)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_plan_stream_emits_stages_tokens_days_then_plan(planner):
+    events = stream_events(REQUEST.model_dump())
+    kinds = [event["event"] for event in events]
+
+    first = {kind: kinds.index(kind) for kind in ("stage", "token", "day", "plan")}
+    assert first["stage"] < first["token"] < first["day"] < first["plan"] == len(events) - 1
+    assert events[0] == {"event": "stage", "stage": "research", "status": "started"}
+    assert {"event": "stage", "stage": "planner", "status": "started"} in events[:first["token"]]
+    # 每天的行程在计划完成前推送,且已附带图片
+    days = [event["data"] for event in events if event["event"] == "day"]
+    assert [day["day_index"] for day in days] == [0, 1, 2, 3]
+    assert days[0]["attractions"][0]["image_url"].startswith("https://images.example.com/")
+    plan = events[-1]["data"]
+    assert plan["city"] == "北京" and len(plan["days"]) == 4
+    assert main.container.plan_admission.active == 0
+
+def test_plan_stream_reports_errors_as_an_event(planner):
+    class BrokenAgent:
+        async def stream(self, query):
+            yield "抱歉,"
+            yield "无法生成计划"
+
+    planner.planner_agent = BrokenAgent()
+    events = stream_events(REQUEST.model_copy(update={"city": "上海"}).model_dump())
+
+    assert [event["text"] for event in events if event["event"] == "token"] == ["抱歉,", "无法生成计划"]
+    assert events[-1] == {"event": "error", "message": "Failed to generate valid trip plan"}
+    assert not any(event["event"] == "plan" for event in events)
+    assert main.container.plan_admission.active == 0
+
+def test_job_pruned_during_long_poll_returns_404():
+    store = MemoryJobStore()
+    manager = JobManager(store, poll_interval=0.05)
+    job = TripPlanJob(job_id="pruned", request=REQUEST, status="running", created_at=0, updated_at=0)
+    store.create(job)
+    previous, main.container._jobs = main.container._jobs, manager
+
+    async def prune_later():
+        await asyncio.sleep(0.1)
+        # 模拟其他进程清理了该任务
+        store._jobs.clear()
+
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+            pruning = asyncio.create_task(prune_later())
+            response = await client.get("/api/trip/jobs/pruned", params={"wait": 2})
+            await pruning
+            return response
+
+    try:
+        response = asyncio.run(send())
+    finally:
+        main.container._jobs = previous
+    assert response.status_code == 404
@@ -0,0 +1,54 @@
+import itertools
+import sys
+import os
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.itinerary_optimizer import haversine_matrix, cluster_days, order_route
+
+def test_haversine_matrix():
+    # 北京天安门到上海人民广场约1068公里
+    distances = haversine_matrix([(116.3975, 39.9087)], [(121.4737, 31.2304), (116.3975, 39.9087)])
+    assert distances.shape == (1, 2)
+    assert abs(distances[0, 0] - 1068) < 5
+    assert distances[0, 1] == 0
+
+def test_cluster_days_respects_budget_and_geography():
+    rng = np.random.default_rng(0)
+    centers = np.array([[116.2, 39.8], [116.6, 40.1], [116.4, 39.6]])
+    coords = np.vstack([center + rng.normal(0, 0.01, (4, 2)) for center in centers])
+    order = rng.permutation(len(coords))
+    clusters = cluster_days(coords[order], np.full(12, 90), 3, daily_minutes=400)
+
+    assert sorted(len(c) for c in clusters) == [4, 4, 4]
+    for cluster in clusters:
+        assert len({int(order[i]) // 4 for i in cluster}) == 1
+
+    # 总时长超出预算时舍弃优先级最低的景点
+    clusters = cluster_days(coords, np.full(12, 120), 2, daily_minutes=240)
+    assert sorted(i for c in clusters for i in c) == [0, 1, 2, 3]
+
+def test_order_route_matches_brute_force():
+    rng = np.random.default_rng(1)
+    coords = np.c_[116.3 + rng.random(7) * 0.2, 39.8 + rng.random(7) * 0.2]
+    hotel = (116.4, 39.9)
+    distances = haversine_matrix(coords, coords)
+    depot = haversine_matrix([hotel], coords)[0]
+
+    def length(route):
+        return depot[route[0]] + sum(distances[a, b] for a, b in zip(route, route[1:])) + depot[route[-1]]
+
+    best = min(length(route) for route in itertools.permutations(range(7)))
+    assert abs(length(order_route(coords, hotel)) - best) < 1e-6
+
+def test_hundreds_of_pois_in_milliseconds():
+    rng = np.random.default_rng(2)
+    coords = np.c_[116.0 + rng.random(500) * 0.6, 39.7 + rng.random(500) * 0.4]
+    start = time.perf_counter()
+    clusters = cluster_days(coords, rng.integers(60, 180, 500), 7, daily_minutes=10000)
+    order_route(coords[clusters[0]])
+    assert time.perf_counter() - start < 1.0
+    assert sum(len(c) for c in clusters) == 500
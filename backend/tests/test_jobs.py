@@ -0,0 +1,157 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import DayPlan, TripPlan, TripPlanRequest
+from app.services.job_store import MemoryJobStore, SQLiteJobStore
+from app.services.jobs import IdempotencyConflict, JobManager, requeue_running
+
+REQUEST = TripPlanRequest(
+    city="北京", start_date="2026-10-01", end_date="2026-10-03", days=3,
+    preferences="历史", budget="中等", transportation="地铁", accommodation="经济型酒店"
+)
+
+async def fake_runner(job):
+    await asyncio.sleep(0.01)
+    return TripPlan(
+        city=job.request.city, start_date=job.request.start_date,
+        end_date=job.request.end_date, overall_suggestions="ok"
+    )
+
+def test_submit_poll_and_idempotency():
+    async def main():
+        manager = JobManager(MemoryJobStore(), workers=2)
+        manager.start(fake_runner)
+
+        job, created = manager.submit(REQUEST, idempotency_key="abc")
+        again, created_again = manager.submit(REQUEST, idempotency_key="abc")
+        assert created and not created_again
+        assert again.job_id == job.job_id
+        with pytest.raises(IdempotencyConflict):
+            manager.submit(REQUEST.model_copy(update={"days": 4}), idempotency_key="abc")
+
+        statuses = [snapshot.status async for snapshot in manager.subscribe(job.job_id)]
+        assert statuses[-1] == "succeeded"
+        done = await manager.wait(job.job_id, timeout=1)
+        assert done.result.city == "北京"
+        await manager.close()
+
+    asyncio.run(main())
+
+def test_days_are_published_before_the_job_finishes(tmp_path):
+    async def main():
+        manager = JobManager(SQLiteJobStore(str(tmp_path / "jobs.db")), workers=1)
+        release = asyncio.Event()
+
+        async def runner(job):
+            # 分块规划的各天乱序完成
+            for index in (1, 0):
+                manager.add_day(job.job_id, DayPlan(
+                    date=f"2026-10-0{index + 1}", day_index=index, description=f"第{index + 1}天",
+                    transportation="地铁", accommodation="酒店"
+                ))
+            await release.wait()
+            return await fake_runner(job)
+
+        manager.start(runner)
+        job, _ = manager.submit(REQUEST)
+        snapshots = []
+        async for snapshot in manager.subscribe(job.job_id):
+            snapshots.append(snapshot)
+            if len(snapshot.days) == 2:
+                release.set()
+
+        partial = next(s for s in snapshots if len(s.days) == 2)
+        assert partial.status == "running" and partial.result is None
+        assert [day.day_index for day in partial.days] == [0, 1]
+        assert snapshots[-1].status == "succeeded" and len(snapshots[-1].days) == 2
+        await manager.close()
+
+    asyncio.run(main())
+
+def test_sqlite_store_recovers_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def crash():
+        manager = JobManager(SQLiteJobStore(path), workers=1)
+        manager.start(lambda job: asyncio.sleep(3600))
+        job, _ = manager.submit(REQUEST, idempotency_key="retry-me")
+        await asyncio.sleep(0.01)
+        assert manager.get(job.job_id).status == "running"
+        await manager.close()
+        return job.job_id
+
+    async def restart(job_id):
+        manager = JobManager(SQLiteJobStore(path), workers=1)
+        manager.start(fake_runner)
+        done = await manager.wait(job_id, timeout=2)
+        while not done.finished:
+            done = await manager.wait(job_id, timeout=2)
+        assert done.status == "succeeded"
+        # 完成后仍可通过幂等键找回同一个任务
+        job, created = manager.submit(REQUEST, idempotency_key="retry-me")
+        assert job.job_id == job_id and not created
+        await manager.close()
+
+    job_id = asyncio.run(crash())
+    asyncio.run(restart(job_id))
+
+def test_shared_sqlite_store_across_workers(tmp_path):
+    """多个 worker 共用一个任务库:任务只被领取一次,任一 worker 都能等到结果"""
+    path = str(tmp_path / "jobs.db")
+
+    async def main():
+        first = JobManager(SQLiteJobStore(path), workers=1)
+        first.start(lambda job: asyncio.sleep(3600), recover_running=False)
+        observer = JobManager(SQLiteJobStore(path), workers=1, poll_interval=0.05)
+        job, _ = first.submit(REQUEST)
+        await asyncio.sleep(0.05)
+        assert observer.get(job.job_id).status == "running"
+        assert observer.store.claim(job.job_id) is None
+
+        # first 退出后由启动器把中断的任务重新排队,新启动的 worker 领取执行
+        await first.close()
+        assert requeue_running(observer.store) == 1
+        second = JobManager(SQLiteJobStore(path), workers=1)
+        second.start(fake_runner, recover_running=False)
+        done = await observer.wait(job.job_id, timeout=2)
+        while not done.finished:
+            done = await observer.wait(job.job_id, timeout=2)
+        assert done.status == "succeeded"
+        await second.close()
+        observer.store.close()
+
+    asyncio.run(main())
+
+def test_concurrent_submit_with_same_key_keeps_first_job(tmp_path):
+    """两个 worker 同时提交相同幂等键:后写入的一方返回先写入的任务,不会覆盖它"""
+    path = str(tmp_path / "jobs.db")
+
+    async def main():
+        first = JobManager(SQLiteJobStore(path), workers=1)
+        second = JobManager(SQLiteJobStore(path), workers=1)
+        first.start(lambda job: asyncio.sleep(3600), recover_running=False)
+        second.start(lambda job: asyncio.sleep(3600), recover_running=False)
+        job, created = first.submit(REQUEST, idempotency_key="race")
+
+        # second 的提交前检查发生在 first 写入之前
+        lookup = second.store.find_by_idempotency_key
+        checks = []
+
+        def stale_lookup(key):
+            checks.append(key)
+            return None if len(checks) == 1 else lookup(key)
+
+        second.store.find_by_idempotency_key = stale_lookup
+        other, other_created = second.submit(REQUEST, idempotency_key="race")
+        assert created and not other_created
+        assert other.job_id == job.job_id
+        assert first.get(job.job_id) is not None
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
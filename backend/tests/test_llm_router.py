@@ -0,0 +1,234 @@
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from openai.types.chat import ChatCompletionMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents.cache import LLMResponseCache
+from hello_agents.core import HelloAgentsLLM
+from hello_agents.router import LLM_HEDGES, Endpoint, LLMRouter, RateLimiter, load_endpoints
+
+class FakeCompletions:
+    """按端点脚本作答的 chat.completions 替身"""
+
+    def __init__(self, name, delay=0.0, fail=0, errors=()):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        # 依次抛出的错误,用完后正常作答
+        self.errors = list(errors)
+        self.calls = []
+        self.params = []
+
+    async def create(self, model, messages, **params):
+        self.calls.append(model)
+        self.params.append(params)
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        if self.fail:
+            self.fail -= 1
+            raise openai.APIConnectionError(request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+        message = ChatCompletionMessage(role="assistant", content=f"{self.name}:{model}#{len(self.calls)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None, model=model)
+
+def make_endpoint(name, model, tier="default", **fake):
+    endpoint = Endpoint(name=name, model=model, tier=tier)
+    endpoint.completions = FakeCompletions(name, **fake)
+    endpoint.client = SimpleNamespace(chat=SimpleNamespace(completions=endpoint.completions))
+    return endpoint
+
+def make_llm(monkeypatch, endpoints, cache=None, **options):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    router = LLMRouter(endpoints, **options)
+    return HelloAgentsLLM(max_retries=2, router=router, cache=cache or LLMResponseCache())
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+REQUEST = httpx.Request("POST", "http://fake/v1/chat/completions")
+
+def status_error(cls, status):
+    return cls(f"HTTP {status}", response=httpx.Response(status, request=REQUEST), body=None)
+
+def test_agents_use_the_model_of_their_tier(monkeypatch):
+    small = make_endpoint("small", "mini", tier="small")
+    large = make_endpoint("large", "big", tier="large")
+    llm = make_llm(monkeypatch, [small, large], agent_tiers={"PlannerAgent": "large", "AllocationAgent": "small"})
+
+    async def drive():
+        return [
+            await llm.achat(MESSAGES, agent="PlannerAgent"),
+            await llm.achat(MESSAGES, agent="AllocationAgent"),
+        ]
+
+    assert asyncio.run(drive()) == ["large:big#1", "small:mini#1"]
+    # 未配置档位的 Agent 没有 default 档位可用时退回全部端点
+    assert llm.router.pool(llm.router.tier_for("OtherAgent")) == [small, large]
+
+def test_failover_skips_backoff_and_cools_down_endpoint(monkeypatch):
+    broken = make_endpoint("broken", "m", fail=5)
+    healthy = make_endpoint("healthy", "m")
+    broken.weight, healthy.weight = 1000, 0.001
+    llm = make_llm(monkeypatch, [broken, healthy])
+
+    async def drive():
+        start = asyncio.get_running_loop().time()
+        first = await llm.achat(MESSAGES)
+        return first, asyncio.get_running_loop().time() - start, await llm.achat(MESSAGES)
+
+    first, elapsed, second = asyncio.run(drive())
+    assert first == "healthy:m#1" and second == "healthy:m#2"
+    # 有其他可用端点时立即切换,不做退避
+    assert elapsed < 0.1
+    # 出错的端点在冷却期内不再被选中
+    assert broken.completions.calls == ["m"]
+
+def test_slow_request_is_hedged_to_another_endpoint(monkeypatch):
+    slow = make_endpoint("slow", "m", delay=1.0)
+    fast = make_endpoint("fast", "m", delay=0.01)
+    slow.weight, fast.weight = 1000, 0.001
+    llm = make_llm(monkeypatch, [slow, fast], hedge_min_samples=3)
+    for _ in range(3):
+        llm.router.report_success(fast, "PlannerAgent", 0.05)
+    won = LLM_HEDGES.value(outcome="won")
+
+    async def drive():
+        start = asyncio.get_running_loop().time()
+        content = await llm.achat(MESSAGES, agent="PlannerAgent")
+        return content, asyncio.get_running_loop().time() - start
+
+    content, elapsed = asyncio.run(drive())
+    assert content == "fast:m#1"
+    assert elapsed < 0.5
+    assert LLM_HEDGES.value(outcome="won") == won + 1
+    # 样本不足的 Agent 不对冲
+    assert llm.router.hedge_delay("AllocationAgent") is None
+
+def test_single_endpoint_is_not_hedged(monkeypatch):
+    only = make_endpoint("only", "m", delay=0.2)
+    llm = make_llm(monkeypatch, [only], hedge_min_samples=3)
+    for _ in range(3):
+        llm.router.report_success(only, "PlannerAgent", 0.05)
+    launched = LLM_HEDGES.value(outcome="launched")
+
+    assert asyncio.run(llm.achat(MESSAGES, agent="PlannerAgent")) == "only:m#1"
+    # 没有其他端点时不向同一端点重复发出请求
+    assert only.completions.calls == ["m"]
+    assert LLM_HEDGES.value(outcome="launched") == launched
+
+def test_latency_samples_exclude_queueing(monkeypatch):
+    endpoint = make_endpoint("main", "m", delay=0.1)
+    endpoint.semaphore = asyncio.Semaphore(1)
+    llm = make_llm(monkeypatch, [endpoint])
+
+    async def drive():
+        await asyncio.gather(*[llm.achat(MESSAGES, agent="PlannerAgent") for _ in range(3)])
+
+    asyncio.run(drive())
+    # 三个请求串行排队,但每个样本只包含请求本身的约0.1秒
+    assert max(llm.router._latency["PlannerAgent"].samples) < 0.19
+
+def test_retryable_errors_back_off_and_client_errors_fail_fast(monkeypatch):
+    endpoint = make_endpoint("only", "m", errors=[
+        openai.APITimeoutError(request=REQUEST),
+        status_error(openai.RateLimitError, 429),
+        status_error(openai.InternalServerError, 503),
+    ])
+    llm = make_llm(monkeypatch, [endpoint])
+    llm.max_retries = 3
+    llm.retry_base_delay, llm.retry_max_delay = 0.01, 0.02
+    delays = []
+    backoff = llm._backoff_delay
+
+    def record(attempt):
+        delays.append(backoff(attempt))
+        return delays[-1]
+
+    llm._backoff_delay = record
+    # 超时、429、5xx 都会重试;只有一个端点时每次重试前退避,退避上限为 retry_max_delay
+    assert asyncio.run(llm.achat(MESSAGES)) == "only:m#4"
+    assert len(delays) == 3 and all(0 <= delay <= 0.02 for delay in delays)
+    assert endpoint.cooldown_until == 0.0
+
+    # 400/404 等客户端错误直接抛出,不重试
+    for error in (status_error(openai.BadRequestError, 400), status_error(openai.NotFoundError, 404)):
+        failing = make_endpoint("only", "m", errors=[error])
+        llm = make_llm(monkeypatch, [failing])
+        with pytest.raises(type(error)):
+            asyncio.run(llm.achat(MESSAGES))
+        assert failing.completions.calls == ["m"]
+
+    # 重试次数用完后抛出最后一次的错误
+    exhausted = make_endpoint("only", "m", fail=5)
+    llm = make_llm(monkeypatch, [exhausted])
+    llm.retry_base_delay = 0.001
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(llm.achat(MESSAGES))
+    assert len(exhausted.completions.calls) == llm.max_retries + 1
+
+def test_rate_limiter_and_endpoint_config(monkeypatch):
+    limiter = RateLimiter(rpm=60, burst=1)
+    assert limiter.wait_time() == 0
+    limiter.take()
+    assert 0.9 < limiter.wait_time() <= 1.0
+
+    monkeypatch.setenv("BACKUP_KEY", "secret")
+    endpoints = load_endpoints(
+        '[{"name": "a", "model": "big", "tier": "large", "weight": 3, "rpm": 120},'
+        ' {"model": "mini", "api_key_env": "BACKUP_KEY"}]',
+        max_concurrency=4
+    )
+    assert [(e.name, e.model, e.tier, e.weight) for e in endpoints] == [
+        ("a", "big", "large", 3.0), ("endpoint1", "mini", "default", 1.0)
+    ]
+    assert endpoints[1].api_key == "secret" and endpoints[0].limiter.rate == 2
+
+def test_response_cache_follows_agent_policy(monkeypatch, tmp_path):
+    endpoint = make_endpoint("main", "m")
+    path = str(tmp_path / "llm.db")
+    policy = dict(tool_ttl=60, agent_ttls={"AllocationAgent": 60, "PlannerAgent": 0}, disk_path=path)
+    llm = make_llm(monkeypatch, [endpoint], cache=LLMResponseCache(**policy))
+    tools = [{"type": "function", "function": {"name": "maps_weather", "parameters": {}}}]
+
+    async def drive():
+        dispatch = await asyncio.gather(*[
+            llm.achat_message(MESSAGES, tools=tools, agent="WeatherAgent") for _ in range(3)
+        ])
+        allocation = [await llm.achat(MESSAGES, agent="AllocationAgent") for _ in range(2)]
+        streamed = [chunk async for chunk in llm.astream(MESSAGES, agent="AllocationAgent")]
+        planner = [await llm.achat(MESSAGES, agent="PlannerAgent") for _ in range(2)]
+        return [m.content for m in dispatch], allocation, streamed, planner
+
+    dispatch, allocation, streamed, planner = asyncio.run(drive())
+    # 并发的相同工具调度轮次只请求一次
+    assert dispatch == ["main:m#1"] * 3
+    # 缓存的 Agent 使用温度0,流式调用与非流式调用共用缓存条目
+    assert allocation == ["main:m#2"] * 2 and streamed == ["main:m#2"]
+    assert [p["temperature"] for p in endpoint.completions.params[:2]] == [0.0, 0.0]
+    # 规划 Agent 不缓存,使用默认温度
+    assert planner == ["main:m#3", "main:m#4"]
+    assert endpoint.completions.params[-1]["temperature"] == 0.7
+
+    # 新实例(模拟重启)从磁盘层命中
+    restarted = make_llm(monkeypatch, [make_endpoint("main", "m")], cache=LLMResponseCache(**policy))
+    assert asyncio.run(restarted.achat(MESSAGES, agent="AllocationAgent")) == "main:m#2"
+    llm.cache.disk.close()
+    restarted.cache.disk.close()
+
+def test_mixed_model_tier_is_not_cached(monkeypatch):
+    """档位内模型不同时不缓存,避免一个模型的回复以另一个模型的 key 命中"""
+    endpoints = [make_endpoint("a", "m1"), make_endpoint("b", "m2")]
+    llm = make_llm(monkeypatch, endpoints, cache=LLMResponseCache(agent_ttls={"AllocationAgent": 60}))
+
+    async def drive():
+        return [await llm.achat(MESSAGES, agent="AllocationAgent") for _ in range(3)]
+
+    asyncio.run(drive())
+    assert sum(len(e.completions.calls) for e in endpoints) == 3
+    assert llm.router.shared_model("default") is None
@@ -0,0 +1,52 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from hello_agents.cache import ToolResultCache
+from hello_agents.mcp_broker import MCPBroker, MCPBrokerError, parse_address
+from hello_agents.tools import MCPTool
+
+FAKE_MCP_SERVER = os.path.join(BACKEND_DIR, "benchmarks", "fakes", "amap_mcp.py")
+
+def make_tool(**kwargs) -> MCPTool:
+    return MCPTool("amap_mcp", sys.executable, [FAKE_MCP_SERVER], {}, pool_size=1, **kwargs)
+
+def test_parse_address():
+    assert parse_address("127.0.0.1:9000") == ("tcp", ("127.0.0.1", 9000))
+    assert parse_address(".cache/mcp_broker.sock") == ("unix", ".cache/mcp_broker.sock")
+
+def test_workers_share_broker_session_and_cache(tmp_path):
+    """两个通过代理调用的工具集(模拟两个 worker)共用代理的会话和结果缓存"""
+    address = str(tmp_path / "broker.sock")
+
+    async def main():
+        broker = MCPBroker(make_tool(cache=ToolResultCache()), address)
+        await broker.start()
+        workers = [make_tool(broker_address=address) for _ in range(2)]
+        try:
+            for worker in workers:
+                specs = await worker.discover()
+                assert {spec.name for spec in specs} == {"maps_text_search", "maps_weather"}
+
+            args = {"keywords": "景点", "city": "北京"}
+            results = await asyncio.gather(*[
+                worker.view(["maps_text_search"])[0].fetch(args) for worker in workers for _ in range(3)
+            ])
+            assert len(set(results)) == 1
+            # 6 次调用只有 1 次到达MCP服务,其余由代理的结果缓存合并
+            assert broker.tool.cache.stats()["coalesced"] == 5
+
+            with pytest.raises(MCPBrokerError):
+                await workers[0].pool.call_tool("no_such_tool", {})
+        finally:
+            for worker in workers:
+                await worker.close()
+            await broker.close()
+        assert not os.path.exists(address)
+
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+import asyncio
+import subprocess
+import sys
+import os
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from hello_agents.tools import MCPSessionPool
+
+FAKE_MCP_SERVER = os.path.join(BACKEND_DIR, "benchmarks", "fakes", "amap_mcp.py")
+
+class FakeClient:
+    """只实现会话池用到的接口: 连接状态、ping 和关闭"""
+
+    def __init__(self, index):
+        self.index = index
+        self.connected = True
+        self.ping_ok = True
+        self.pings = 0
+        self.closed = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def ping(self):
+        self.pings += 1
+        if not self.ping_ok:
+            raise RuntimeError("server exited")
+
+    async def close(self):
+        self.closed = True
+        self.connected = False
+
+def make_pool(size=2, health_check_interval=30.0):
+    pool = MCPSessionPool({}, size=size, health_check_interval=health_check_interval)
+    spawned = []
+
+    async def connect():
+        client = FakeClient(len(spawned))
+        spawned.append(client)
+        pool._last_checked[id(client)] = time.monotonic()
+        return client
+
+    pool._connect = connect
+    return pool, spawned
+
+def test_checkout_reuses_sessions_up_to_pool_size():
+    async def main():
+        pool, spawned = make_pool(size=2)
+        assert await pool.warmup() == 2
+
+        async def use():
+            async with pool.session() as client:
+                await asyncio.sleep(0.01)
+                return client.index
+
+        used = await asyncio.gather(*[use() for _ in range(6)])
+        # 6 次并发调用只使用预热好的 2 个会话
+        assert len(spawned) == 2 and set(used) == {0, 1}
+        await pool.close()
+        assert all(client.closed for client in spawned)
+
+    asyncio.run(main())
+
+def test_dead_session_is_respawned():
+    async def main():
+        pool, spawned = make_pool(size=1)
+        await pool.warmup()
+        spawned[0].connected = False
+
+        async with pool.session() as client:
+            assert client is spawned[1]
+        assert spawned[0].closed and len(spawned) == 2
+        await pool.close()
+
+    asyncio.run(main())
+
+def test_health_check_pings_stale_and_failed_sessions():
+    async def main():
+        pool, spawned = make_pool(size=1, health_check_interval=60)
+        await pool.warmup()
+        async with pool.session():
+            pass
+        # 检查间隔内不 ping
+        assert spawned[0].pings == 0
+
+        # 调用失败后下次借出前强制 ping,ping 失败则丢弃并重新拉起
+        try:
+            async with pool.session():
+                raise ValueError("tool failed")
+        except ValueError:
+            pass
+        spawned[0].ping_ok = False
+        async with pool.session() as client:
+            assert client is spawned[1]
+        assert spawned[0].pings == 1 and spawned[0].closed
+        await pool.close()
+
+    asyncio.run(main())
+
+def _servers() -> int:
+    output = subprocess.run(["pgrep", "-f", FAKE_MCP_SERVER], capture_output=True, text=True).stdout
+    return len(output.split())
+
+def test_switching_event_loops_closes_old_server_processes():
+    config = {"mcpServers": {"amap": {"command": sys.executable, "args": [FAKE_MCP_SERVER], "env": {}}}}
+    pool = MCPSessionPool(config, size=1)
+    before = _servers()
+
+    # 旧事件循环停止但未关闭,其中的服务进程不会被自动清理
+    old_loop = asyncio.new_event_loop()
+    old_loop.run_until_complete(pool.warmup())
+    assert _servers() == before + 1
+
+    async def main():
+        async with pool.session() as client:
+            await client.list_tools()
+        deadline = time.monotonic() + 10
+        while _servers() > before + 1 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        assert _servers() == before + 1
+        await pool.close()
+        assert _servers() == before
+
+    try:
+        asyncio.run(main())
+    finally:
+        old_loop.close()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sys
+import os
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents.core import SimpleAgent
+from hello_agents.tools import MCPTool
+
+TOOLS = [
+    SimpleNamespace(name=name, description=f"{name} 工具", inputSchema={"type": "object", "properties": {}})
+    for name in ("maps_weather", "maps_text_search", "maps_geo")
+]
+
+class FakePool:
+    """只提供 list_tools 的会话池替身,记录查询次数"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.list_calls = 0
+
+    @asynccontextmanager
+    async def session(self):
+        async def list_tools():
+            self.list_calls += 1
+            await asyncio.sleep(self.delay)
+            return TOOLS
+
+        yield SimpleNamespace(list_tools=list_tools, server_info=SimpleNamespace(version="1.2.3"))
+
+    async def close(self):
+        pass
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def age_snapshot(path, key, seconds):
+    data = read_json(path)
+    data[key]["created_at"] -= seconds
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def make_tool(package="@amap/amap-maps-mcp-server", **options):
+    tool = MCPTool(name="amap", command="npx", args=["-y", package], env={}, **options)
+    tool.pool = FakePool()
+    return tool
+
+def test_discovery_runs_once_and_is_shared():
+    tool = make_tool()
+    notified = []
+    tool.subscribe(lambda catalog: notified.append(len(catalog)))
+    assert tool.view() == []
+
+    async def drive():
+        catalogs = await asyncio.gather(*[tool.discover() for _ in range(5)])
+        await tool.discover()
+        return catalogs
+
+    catalogs = asyncio.run(drive())
+    # 并发的发现请求只查询一次服务端,所有调用方拿到同一份目录
+    assert tool.pool.list_calls == 1
+    assert all(catalog is catalogs[0] for catalog in catalogs)
+    assert tool.server_version == "1.2.3"
+    assert notified == [3]
+
+    # 目录就绪后订阅的 Agent 立即注册工具
+    agent = SimpleAgent(name="WeatherAgent", llm=None, system_prompt="你是天气助手。")
+    agent.add_tool(tool, include=["maps_weather"])
+    assert list(agent.tools) == ["maps_weather"]
+
+def test_view_filters_by_name():
+    tool = make_tool()
+    asyncio.run(tool.discover())
+
+    assert [t.name for t in tool.view()] == ["maps_weather", "maps_text_search", "maps_geo"]
+    views = tool.view(["maps_geo", "maps_weather", "unknown"])
+    assert [t.name for t in views] == ["maps_weather", "maps_geo"]
+    # 工具视图共享同一个会话池,参数定义来自服务端
+    assert all(t.pool is tool.pool for t in views)
+    assert json.loads(views[0].args) == {"type": "object", "properties": {}}
+
+def test_snapshot_is_saved_loaded_and_expires(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    first = make_tool(snapshot_path=path, snapshot_max_age=60)
+    asyncio.run(first.discover())
+    entry = read_json(path)["amap:@amap/amap-maps-mcp-server"]
+    assert entry["version"] == "1.2.3" and len(entry["tools"]) == 3
+
+    # 重启后从快照加载,不查询服务端
+    restarted = make_tool(snapshot_path=path, snapshot_max_age=60)
+    assert [spec.name for spec in asyncio.run(restarted.discover())] == [t.name for t in TOOLS]
+    assert restarted.pool.list_calls == 0 and restarted.server_version == "1.2.3"
+
+    # 未固定版本的包的快照过期后重新查询
+    age_snapshot(path, "amap:@amap/amap-maps-mcp-server", 120)
+    expired = make_tool(snapshot_path=path, snapshot_max_age=60)
+    asyncio.run(expired.discover())
+    assert expired.pool.list_calls == 1
+
+    # 固定版本的包的快照不过期
+    pinned = make_tool(package="@amap/amap-maps-mcp-server@1.2.3", snapshot_path=path, snapshot_max_age=60)
+    asyncio.run(pinned.discover())
+    age_snapshot(path, "amap:@amap/amap-maps-mcp-server@1.2.3", 120)
+    reloaded = make_tool(package="@amap/amap-maps-mcp-server@1.2.3", snapshot_path=path, snapshot_max_age=60)
+    asyncio.run(reloaded.discover())
+    assert reloaded.pool.list_calls == 0
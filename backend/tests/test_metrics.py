@@ -0,0 +1,50 @@
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents import metrics
+from hello_agents.tools import Tool
+
+class FailingTool(Tool):
+    def __init__(self):
+        super().__init__(name="broken", description="总是失败", args="{}", config={})
+
+    async def _call(self, args):
+        raise RuntimeError("连接断开")
+
+def test_spans_feed_trace_and_registry():
+    async def request():
+        trace = metrics.start_trace()
+
+        async def stage(name):
+            with metrics.span(name):
+                await asyncio.sleep(0.01)
+
+        # 子任务继承同一个请求追踪
+        await asyncio.gather(stage("llm"), stage("llm"), stage("mcp.maps_weather"))
+        return trace
+
+    before = metrics.STAGE_SECONDS.count(stage="llm")
+    trace = asyncio.run(request())
+    breakdown = trace.breakdown()
+    assert breakdown["llm"][0] == 2
+    assert breakdown["mcp.maps_weather"][0] == 1
+    assert metrics.STAGE_SECONDS.count(stage="llm") == before + 2
+    assert trace.server_timing().startswith('llm;dur=')
+    assert "total;dur=" in trace.server_timing()
+
+    text = metrics.REGISTRY.render()
+    assert 'trip_stage_duration_seconds_count{stage="llm"}' in text
+    assert 'trip_stage_duration_seconds_bucket{stage="llm",le="+Inf"}' in text
+
+def test_tool_errors_are_counted():
+    before = metrics.STAGE_ERRORS.value(stage="mcp.broken")
+    result = asyncio.run(FailingTool().run({}))
+    assert result.startswith("执行 MCP 工具时出错")
+    assert metrics.STAGE_ERRORS.value(stage="mcp.broken") == before + 1
+
+if __name__ == "__main__":
+    test_spans_feed_trace_and_registry()
+    test_tool_errors_are_counted()
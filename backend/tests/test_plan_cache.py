@@ -0,0 +1,61 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import DayPlan, TripPlan, TripPlanRequest, WeatherInfo
+from app.services.plan_cache import PlanCache, redate_plan
+
+def make_request(start, end, days=3, **overrides):
+    fields = dict(
+        city="北京", start_date=start, end_date=end, days=days,
+        preferences="历史, 美食", budget="中等", transportation="地铁", accommodation="经济型酒店"
+    )
+    fields.update(overrides)
+    return TripPlanRequest(**fields)
+
+def make_plan(request):
+    return TripPlan(
+        city=request.city, start_date=request.start_date, end_date=request.end_date,
+        days=[
+            DayPlan(date=f"2026-10-0{i + 1}", day_index=i, description=f"第{i + 1}天",
+                    transportation="地铁", accommodation="酒店")
+            for i in range(request.days)
+        ],
+        weather_info=[
+            WeatherInfo(date="2026-10-01", day_weather="晴", night_weather="晴", day_temp=20, night_temp=10,
+                        wind_direction="北", wind_power="3级")
+        ],
+        overall_suggestions="ok"
+    )
+
+def test_key_depends_on_season_and_duration_not_exact_dates():
+    key = PlanCache.make_key(make_request("2026-10-01", "2026-10-03"))
+    # 同季节不同日期、偏好顺序和大小写不同的请求共用一个 key
+    assert PlanCache.make_key(make_request("2026-11-20", "2026-11-22", preferences="美食、历史")) == key
+    assert PlanCache.make_key(make_request("2026-07-01", "2026-07-03")) != key
+    assert PlanCache.make_key(make_request("2026-10-01", "2026-10-04", days=4)) != key
+    assert PlanCache.make_key(make_request("下周一", "下周三")) is None
+
+def test_redate_plan_shifts_days_on_a_copy_and_clears_weather():
+    original = make_plan(make_request("2026-10-01", "2026-10-03"))
+    request = make_request("2026-11-20", "2026-11-22")
+    redated = redate_plan(original, request)
+
+    assert [day.date for day in redated.days] == ["2026-11-20", "2026-11-21", "2026-11-22"]
+    assert (redated.start_date, redated.end_date) == ("2026-11-20", "2026-11-22")
+    assert redated.weather_info == []
+    # 原计划不受影响
+    assert original.days[0].date == "2026-10-01" and len(original.weather_info) == 1
+    redated.days[0].description = "已修改"
+    assert original.days[0].description == "第1天"
+
+def test_cache_hit_is_redated_for_the_new_request():
+    cache = PlanCache(max_size=4)
+    first = make_request("2026-10-01", "2026-10-03")
+    cache.set(first, make_plan(first))
+
+    hit = cache.get(make_request("2026-11-20", "2026-11-22"))
+    assert hit is not None and hit.days[0].date == "2026-11-20"
+    assert cache.get(make_request("2026-07-01", "2026-07-03")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
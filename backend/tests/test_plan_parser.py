@@ -0,0 +1,72 @@
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.plan_parser import PlanStreamParser, parse_plan, repair_json
+
+def make_day(index):
+    return {
+        "date": f"2026-10-0{index + 1}",
+        "day_index": index,
+        "description": "故宫、景山",
+        "transportation": "地铁",
+        "accommodation": "经济型酒店",
+        "attractions": [{
+            "name": "故宫",
+            "address": "景山前街4号",
+            "location": {"longitude": 116.397, "latitude": 39.918},
+            "visit_duration": 180,
+            "description": "明清皇宫{建筑群}",
+        }],
+        "meals": [],
+    }
+
+PLAN = {
+    "city": "北京",
+    "start_date": "2026-10-01",
+    "end_date": "2026-10-03",
+    "days": [make_day(i) for i in range(3)],
+    "weather_info": [{
+        "date": "2026-10-01", "day_weather": "晴", "night_weather": "多云",
+        "day_temp": "16°C", "night_temp": 5, "wind_direction": "北", "wind_power": "3级",
+    }],
+    "overall_suggestions": "注意防晒",
+    "budget": {"total": 1000},
+}
+
+def test_streaming_emits_days_before_end():
+    text = "好的,计划如下:\n```json\n" + json.dumps(PLAN, ensure_ascii=False, indent=2) + "\n```\n祝旅途愉快!"
+    parser = PlanStreamParser()
+    emitted = []
+    for i in range(0, len(text), 7):
+        for field, item in parser.feed(text[i:i + 7]):
+            emitted.append((field, i))
+
+    day_offsets = [offset for field, offset in emitted if field == "days"]
+    assert len(day_offsets) == 3
+    assert day_offsets[0] < text.index('"weather_info"')
+    plan = parser.finish()
+    assert [d.day_index for d in plan.days] == [0, 1, 2]
+    assert plan.weather_info[0].day_temp == 16
+
+def test_repairs_common_defects():
+    raw = json.dumps(PLAN, ensure_ascii=False).replace('"night_temp": 5', '"night_temp": 5°C')
+    raw = raw.replace('"meals": []', '"meals": [],')
+    assert "5°C" not in repair_json(raw)
+    plan = parse_plan(raw + "\n\n以上是 {额外} 内容")
+    assert plan.weather_info[0].night_temp == 5
+    assert len(plan.days) == 3
+
+def test_truncated_output_keeps_complete_days():
+    raw = json.dumps(PLAN, ensure_ascii=False)
+    truncated = raw[:raw.index('"day_index": 2') + 5]
+    plan = parse_plan(truncated, {"overall_suggestions": ""})
+    assert len(plan.days) == 2
+    assert plan.city == "北京"
+
+if __name__ == "__main__":
+    test_streaming_emits_days_before_end()
+    test_repairs_common_defects()
+    test_truncated_output_keeps_complete_days()
@@ -0,0 +1,55 @@
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents import metrics
+from hello_agents.core import estimate_tokens
+from app.services.amap_parser import parse_pois
+from app.services.poi_digest import build_digest, split_keywords
+
+def search_result(pois):
+    return json.dumps({"suggestion": {"keywords": [], "cities": []}, "count": str(len(pois)), "pois": pois}, ensure_ascii=False)
+
+PALACE = {"id": "B000A8UIN8", "name": "故宫博物院", "address": "景山前街4号", "location": "116.397029,39.917839",
+          "type": "风景名胜;风景名胜;国家级景点", "typecode": "110201", "biz_ext": {"rating": "4.9", "cost": []},
+          "tel": "010-85007938", "photos": [{"url": "http://example.com/1.jpg"}] * 3}
+
+def test_parse_pois_handles_amap_quirks():
+    pois = parse_pois(search_result([
+        PALACE,
+        {"id": "B1", "name": "无坐标景点", "address": [], "typecode": "110000"},
+        {"name": ""},
+    ]))
+    assert [p.name for p in pois] == ["故宫博物院", "无坐标景点"]
+    assert pois[0].location.longitude == 116.397029 and pois[0].rating == 4.9
+    assert pois[1].location is None and pois[1].address == "" and pois[1].type == "110000"
+    assert parse_pois("执行 MCP 工具时出错: timeout") == []
+
+def test_digest_dedupes_ranks_and_truncates():
+    history = search_result([
+        PALACE,
+        # 同一景区的另一个入口
+        {**PALACE, "id": "B2", "name": "故宫博物院-午门", "location": "116.397100,39.917900"},
+        {"id": "B3", "name": "天坛", "address": "天坛路", "location": "116.410886,39.881998", "biz_ext": {"rating": "4.8"}},
+        {"id": "B4", "name": "无坐标景点", "address": "某处"},
+    ])
+    food = search_result([
+        {"id": "B5", "name": "南锣鼓巷", "address": "东城区", "location": "116.403,39.937", "biz_ext": {"rating": "4.5"}},
+        {**PALACE},
+    ])
+
+    trace = metrics.start_trace()
+    raw_tokens = estimate_tokens(history) + estimate_tokens(food)
+    digest = build_digest([parse_pois(history), parse_pois(food)], limit=3, kind="attractions", raw_tokens=raw_tokens)
+
+    assert [p.name for p in digest.pois] == ["故宫博物院", "天坛", "南锣鼓巷"]
+    assert digest.text.splitlines()[1] == "故宫博物院|景山前街4号|116.397029,39.917839|国家级景点|4.9"
+    assert digest.digest_tokens < digest.raw_tokens
+    assert trace.notes["poi_tokens_saved.attractions"] == digest.raw_tokens - digest.digest_tokens
+    assert 'poi_tokens_saved.attractions;desc="' in trace.server_timing()
+
+def test_split_keywords():
+    assert split_keywords("历史文化、美食, 购物 公园", "景点") == ["历史文化", "美食", "购物"]
+    assert split_keywords("", "景点") == ["景点"]
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import POI, Location
+from app.services.poi_index import PoiIndex, _ring_cells
+
+def poi(name, longitude, latitude, type_=""):
+    return POI(id=name, name=name, location=Location(longitude=longitude, latitude=latitude), type=type_)
+
+def test_lookup_by_keyword_and_filter():
+    index = PoiIndex()
+    index.add("北京", "attractions", "历史文化", [
+        poi("故宫博物院", 116.397, 39.918, "风景名胜;博物馆"),
+        poi("天坛公园", 116.411, 39.882, "风景名胜;公园"),
+    ], raw_tokens=800)
+
+    pois, entry = index.lookup("北京", "attractions", "历史文化")
+    assert [p.name for p in pois] == ["故宫博物院", "天坛公园"] and entry.raw_tokens == 800
+    # 没有搜索过的关键词按名称/类型过滤,结果不足时视为未命中
+    pois, _ = index.lookup("北京", "attractions", "公园")
+    assert [p.name for p in pois] == ["天坛公园"]
+    assert index.lookup("北京", "attractions", "公园", min_results=2) is None
+    assert index.lookup("上海", "attractions", "历史文化") is None
+    assert index.stats() == {"hits": 2, "misses": 2, "refreshes": 0, "size": 2}
+
+def test_nearest_uses_grid_and_keyword():
+    index = PoiIndex()
+    hotels = [poi(f"酒店{i}", 116.30 + i * 0.013, 39.90 + (i % 7) * 0.011) for i in range(200)]
+    index.add("北京", "hotels", "经济型酒店", hotels)
+    index.add("北京", "hotels", "豪华酒店", [poi("豪华酒店", 116.5001, 39.9001)])
+
+    center = Location(longitude=116.5, latitude=39.9)
+    nearest = index.nearest("北京", "hotels", center, k=3, keyword="经济型酒店")
+    brute = sorted(hotels, key=lambda h: (h.location.longitude - 116.5) ** 2 + (h.location.latitude - 39.9) ** 2)
+    assert [h.name for h in nearest] == [h.name for h in brute[:3]]
+    assert index.nearest("北京", "hotels", center, k=1)[0].name == "豪华酒店"
+
+    start = time.perf_counter()
+    for _ in range(100):
+        index.nearest("北京", "hotels", center, k=3)
+    assert (time.perf_counter() - start) / 100 < 0.005
+
+def test_ring_cells_cover_each_perimeter_once():
+    for ring in range(4):
+        cells = list(_ring_cells(10, -5, ring))
+        expected = {
+            (x, y) for x in range(10 - ring, 11 + ring) for y in range(-5 - ring, -4 + ring)
+            if max(abs(x - 10), abs(y + 5)) == ring
+        }
+        assert len(cells) == len(expected) == max(1, 8 * ring)
+        assert set(cells) == expected
+
+def test_seed_roundtrip_and_background_refresh(tmp_path):
+    path = str(tmp_path / "poi_index.json")
+    path_seed = tmp_path / "seed.json"
+    path_seed.write_text(json.dumps({
+        "北京": {"attractions": {"历史文化": [{"name": "故宫博物院", "location": {"longitude": 116.397, "latitude": 39.918}}]}}
+    }, ensure_ascii=False), encoding="utf-8")
+
+    index = PoiIndex(refresh_after=3600)
+    assert index.load_seed(str(path_seed)) == 1
+    pois, entry = index.lookup("北京", "attractions", "历史文化")
+    # 种子数据没有获取时间,视为过期,返回的同时在后台刷新
+    assert index.is_stale(entry)
+
+    async def refresh():
+        async def fetch():
+            await asyncio.sleep(0.01)
+            index.add("北京", "attractions", "历史文化", pois + [poi("天坛公园", 116.411, 39.882)])
+
+        index.refresh("北京", "attractions", "历史文化", fetch)
+        index.refresh("北京", "attractions", "历史文化", fetch)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(refresh())
+    assert index.refreshes == 1
+    pois, entry = index.lookup("北京", "attractions", "历史文化")
+    assert len(pois) == 2 and not index.is_stale(entry)
+
+    index.save(path)
+    restored = PoiIndex(refresh_after=3600)
+    assert restored.load_seed(path) == 2
+    assert not restored.is_stale(restored.lookup("北京", "attractions", "历史文化")[1])
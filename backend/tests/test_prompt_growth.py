@@ -0,0 +1,158 @@
+import asyncio
+import json
+import sys
+import os
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents.core import SimpleAgent
+from hello_agents.tools import Tool
+
+class RecordingLLM:
+    """记录每次请求的系统提示词，首轮返回一次工具调用，拿到工具结果后直接作答"""
+
+    def __init__(self):
+        self.system_prompts = []
+
+    async def achat(self, messages, agent=None):
+        self.system_prompts.append(messages[0]["content"])
+        if messages[-1]["role"] == "user" and "输出:" in messages[-1]["content"]:
+            return "完成"
+        return "[TOOL_CALL:echo:text=hi]"
+
+    async def achat_message(self, messages, tools=None, **kwargs):
+        self.system_prompts.append(messages[0]["content"])
+        if messages[-1]["role"] == "tool":
+            return SimpleNamespace(content="完成", tool_calls=None)
+        call = SimpleNamespace(
+            id="call_0",
+            function=SimpleNamespace(name="echo", arguments=json.dumps({"text": "hi"})),
+            model_dump=lambda: {"id": "call_0", "type": "function",
+                                "function": {"name": "echo", "arguments": '{"text": "hi"}'}}
+        )
+        return SimpleNamespace(content=None, tool_calls=[call])
+
+class EchoTool(Tool):
+    def __init__(self):
+        super().__init__(name="echo", description="回显输入", args='{"type": "object", "properties": {"text": {"type": "string"}}}', config={})
+
+    async def run(self, args):
+        return args.get("text", "")
+
+def test_prompt_size_constant(n_requests: int = 50):
+    for tool_mode in ("text", "native"):
+        llm = RecordingLLM()
+        agent = SimpleAgent(name="BenchAgent", llm=llm, system_prompt="你是测试助手。", tool_mode=tool_mode)
+        agent.register_tool(EchoTool())
+
+        async def drive():
+            for i in range(n_requests):
+                assert await agent.run(f"请求 {i}") == "完成"
+
+        asyncio.run(drive())
+
+        sizes = {len(prompt) for prompt in llm.system_prompts}
+        print(f"[{tool_mode}] {n_requests} 次请求, 系统提示词长度: {sizes}, 约 {agent.prompt_tokens} tokens")
+        assert len(llm.system_prompts) == n_requests * 2
+        assert sizes == {len(agent.prompt)}
+        assert agent.system_prompt == "你是测试助手。"
+        assert agent.prompt_tokens <= agent.prompt_token_budget
+
+class RejectingLLM(RecordingLLM):
+    """原生工具调用时返回给定的 400 错误"""
+
+    def __init__(self, message, code=None, param=None):
+        super().__init__()
+        body = {"message": message, "code": code, "param": param}
+        response = httpx.Response(400, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+        self.error = openai.BadRequestError(message, response=response, body=body)
+
+    async def achat_message(self, messages, tools=None, **kwargs):
+        raise self.error
+
+def test_text_fallback_only_when_tools_unsupported():
+    async def drive(llm):
+        agent = SimpleAgent(name="BenchAgent", llm=llm, system_prompt="你是测试助手。", tool_mode="native")
+        agent.register_tool(EchoTool())
+        result = await agent.run("请求")
+        return agent, result
+
+    llm = RejectingLLM("This model does not support tools")
+    agent, result = asyncio.run(drive(llm))
+    assert result == "完成"
+    # 回退只对本次调用生效,共享的 Agent 仍使用原生工具调用
+    assert agent.tool_mode == "native" and "TOOL_CALL" not in agent.prompt
+    assert "TOOL_CALL" in llm.system_prompts[0]
+
+    llm = RejectingLLM("Unrecognized request argument", code="unsupported_parameter", param="tools")
+    assert asyncio.run(drive(llm))[1] == "完成"
+
+    # 上下文超长等其他 400 错误直接抛出
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(drive(RejectingLLM("This model's maximum context length is 8192 tokens", code="context_length_exceeded")))
+
+def tool_call(index, text):
+    arguments = json.dumps({"text": text})
+    return SimpleNamespace(
+        id=f"call_{index}",
+        function=SimpleNamespace(name="echo", arguments=arguments),
+        model_dump=lambda: {"id": f"call_{index}", "type": "function",
+                            "function": {"name": "echo", "arguments": arguments}}
+    )
+
+class LoopingLLM:
+    """每轮都返回多个工具调用,直到被要求 tool_choice="none" 时才作答"""
+
+    def __init__(self, calls_per_turn=3):
+        self.calls_per_turn = calls_per_turn
+        self.requests = []
+
+    async def achat_message(self, messages, tools=None, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("tool_choice") == "none":
+            results = [m["content"] for m in messages if m["role"] == "tool"]
+            return SimpleNamespace(content=",".join(results), tool_calls=None)
+        turn = len(self.requests)
+        return SimpleNamespace(
+            content=None,
+            tool_calls=[tool_call(i, f"{turn}-{i}") for i in range(self.calls_per_turn)]
+        )
+
+class SlowEchoTool(EchoTool):
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.max_running = 0
+
+    async def run(self, args):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return args.get("text", "")
+
+def test_native_tool_calls_run_concurrently_within_step_limit():
+    llm = LoopingLLM(calls_per_turn=3)
+    tool = SlowEchoTool()
+    agent = SimpleAgent(name="BenchAgent", llm=llm, system_prompt="你是测试助手。", tool_mode="native", max_tool_steps=2)
+    agent.register_tool(tool)
+
+    async def drive():
+        start = asyncio.get_running_loop().time()
+        result = await agent.run("请求")
+        return result, asyncio.get_running_loop().time() - start
+
+    result, elapsed = asyncio.run(drive())
+    # 同一轮的3个工具调用并发执行,两轮共约0.1秒而不是串行的0.3秒
+    assert tool.max_running == 3 and elapsed < 0.25
+    # 最多执行 max_tool_steps 轮工具调用,最后一轮强制不再调用工具
+    assert [request.get("tool_choice") for request in llm.requests] == [None, None, "none"]
+    assert result == "1-0,1-1,1-2,2-0,2-1,2-2"
+
+if __name__ == "__main__":
+    test_prompt_size_constant()
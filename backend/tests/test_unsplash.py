@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import os
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.unsplash_service import UnsplashService
+from benchmarks.fakes.unsplash import create_app
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """转发到 Unsplash 替身并记录查询词;fail 次数内返回 503"""
+
+    def __init__(self, latency=0.05, fail=0):
+        self.inner = httpx.ASGITransport(app=create_app(latency=latency))
+        self.fail = fail
+        self.queries = []
+
+    async def handle_async_request(self, request):
+        self.queries.append(request.url.params["query"])
+        if self.fail:
+            self.fail -= 1
+            return httpx.Response(503, request=request)
+        return await self.inner.handle_async_request(request)
+
+def make_service(transport):
+    service = UnsplashService("test-key")
+    service._client = httpx.AsyncClient(base_url="http://unsplash.test", transport=transport)
+    return service
+
+def test_batch_dedupes_queries_and_fetches_concurrently():
+    transport = CountingTransport(latency=0.05)
+    service = make_service(transport)
+
+    async def drive():
+        start = asyncio.get_running_loop().time()
+        urls = await service.get_photo_urls(["故宫", "天坛", "故宫", "", "颐和园"])
+        elapsed = asyncio.get_running_loop().time() - start
+        await service.aclose()
+        return urls, elapsed
+
+    urls, elapsed = asyncio.run(drive())
+    assert list(urls) == ["故宫", "天坛", "颐和园"]
+    assert all(url.startswith("https://images.example.com/") for url in urls.values())
+    # 重复和空的查询词不请求,3个查询并发完成
+    assert sorted(transport.queries) == sorted(["故宫", "天坛", "颐和园"])
+    assert elapsed < 0.14
+
+def test_cached_urls_are_not_fetched_again():
+    transport = CountingTransport(latency=0)
+    service = make_service(transport)
+
+    async def drive():
+        first = await service.aget_photo_url("故宫")
+        concurrent = await asyncio.gather(*[service.aget_photo_url("天坛") for _ in range(3)])
+        again = await service.get_photo_urls(["故宫", "天坛"])
+        await service.aclose()
+        return first, concurrent, again
+
+    first, concurrent, again = asyncio.run(drive())
+    assert len(set(concurrent)) == 1
+    assert again == {"故宫": first, "天坛": concurrent[0]}
+    # 同一查询的并发请求和之后的请求都命中缓存
+    assert transport.queries == ["故宫", "天坛"]
+
+def test_failures_are_not_cached():
+    transport = CountingTransport(latency=0, fail=1)
+    service = make_service(transport)
+
+    async def drive():
+        failed = await service.aget_photo_url("故宫")
+        retried = await service.aget_photo_url("故宫")
+        await service.aclose()
+        return failed, retried
+
+    failed, retried = asyncio.run(drive())
+    assert failed is None and retried is not None
+    assert transport.queries == ["故宫", "故宫"]
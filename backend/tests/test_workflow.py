@@ -0,0 +1,82 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hello_agents.workflow import Step, StepFailedError, Workflow
+
+def value(result, delay=0.0, log=None, name=None):
+    async def func(inputs):
+        if log is not None:
+            log.append(("start", name, dict(inputs)))
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(("done", name))
+        return result
+    return func
+
+def test_dependencies_run_first_and_independent_steps_overlap():
+    log = []
+    workflow = Workflow([
+        Step("plan", value("计划", log=log, name="plan"), deps=["weather", "attractions"]),
+        Step("attractions", value("景点", 0.05, log, "attractions")),
+        Step("weather", value("天气", 0.05, log, "weather")),
+    ])
+    done = []
+    result = asyncio.run(workflow.run(lambda name, value, error: done.append(name)))
+
+    assert result["plan"] == "计划"
+    # 无依赖的两个步骤并发启动,依赖步骤拿到两者的结果
+    assert [entry[0] for entry in log[:2]] == ["start", "start"]
+    assert {entry[1] for entry in log[:2]} == {"attractions", "weather"}
+    assert ("start", "plan", {"weather": "天气", "attractions": "景点"}) in log
+    assert done[-1] == "plan"
+
+def test_optional_step_timeout_uses_fallback():
+    workflow = Workflow([
+        Step("weather", value("天气", delay=1), timeout=0.05, required=False, fallback=[]),
+        Step("plan", lambda inputs: value(f"计划:{inputs['weather']}")(inputs), deps=["weather"]),
+    ])
+    errors = {}
+    result = asyncio.run(workflow.run(lambda name, value, error: errors.setdefault(name, error)))
+
+    assert result["weather"] == [] and result.failed("weather")
+    assert isinstance(result.failures["weather"], asyncio.TimeoutError)
+    assert isinstance(errors["weather"], asyncio.TimeoutError)
+    assert result["plan"] == "计划:[]"
+    assert result.durations["weather"] < 0.5
+
+def test_required_step_failure_raises_and_cancels_others():
+    cancelled = []
+
+    async def broken(inputs):
+        raise RuntimeError("服务不可用")
+
+    async def slow(inputs):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    workflow = Workflow([
+        Step("attractions", broken),
+        Step("hotels", slow),
+        Step("plan", value("计划"), deps=["attractions", "hotels"]),
+    ])
+    with pytest.raises(StepFailedError) as error:
+        asyncio.run(workflow.run())
+    assert error.value.step_name == "attractions"
+    assert isinstance(error.value.cause, RuntimeError)
+    assert cancelled == ["slow"]
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        Workflow([Step("a", value(1), deps=["b"]), Step("b", value(2), deps=["a"])])
+    with pytest.raises(ValueError):
+        Workflow([Step("a", value(1), deps=["missing"])])
+    with pytest.raises(ValueError):
+        Workflow([Step("a", value(1)), Step("a", value(2))])
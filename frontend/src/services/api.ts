@@ -1,9 +1,12 @@
 import axios from 'axios'
-import type { TripPlanRequest, TripPlan } from '../types'
+import type { TripPlanRequest, TripPlan, TripPlanJob } from '../types'
+
+const API_BASE_URL = 'http://localhost:8000/api'
 
 const api = axios.create({
-    baseURL: 'http://localhost:8000/api',
-    timeout: 1200000, // 20 minutes timeout
+    baseURL: API_BASE_URL,
+    // Plans are generated by background jobs, so no request needs to stay open for long
+    timeout: 60000,
     headers: {
         'Content-Type': 'application/json'
     }
@@ -30,8 +33,68 @@ api.interceptors.response.use(
     }
 )
 
-// Generate trip plan
-export const generateTripPlan = async (request: TripPlanRequest): Promise<TripPlan> => {
-    const response = await api.post<TripPlan>('/trip/plan', request)
+// Long-poll window per status request (seconds); the server caps it at 30
+const JOB_POLL_WAIT = 25
+
+const newIdempotencyKey = (): string =>
+    globalThis.crypto?.randomUUID?.() ?? `${Date.now()}-${Math.random().toString(36).slice(2)}`
+
+// Submit a planning job; retrying with the same idempotency key returns the same job
+export const submitTripPlanJob = async (
+    request: TripPlanRequest,
+    idempotencyKey: string = newIdempotencyKey()
+): Promise<TripPlanJob> => {
+    const response = await api.post<TripPlanJob>('/trip/jobs', request, {
+        headers: { 'Idempotency-Key': idempotencyKey }
+    })
+    return response.data
+}
+
+// Fetch job status; with wait > 0 the server holds the request until the job changes
+export const getTripPlanJob = async (jobId: string, wait = 0): Promise<TripPlanJob> => {
+    const response = await api.get<TripPlanJob>(`/trip/jobs/${jobId}`, { params: { wait } })
+    return response.data
+}
+
+// Fetch the finished plan of a job (can be re-fetched at any time until the job expires)
+export const getTripPlanJobResult = async (jobId: string): Promise<TripPlan> => {
+    const response = await api.get<TripPlan>(`/trip/jobs/${jobId}/result`)
     return response.data
 }
+
+// Generate trip plan: submit a job and long-poll until it finishes
+export const generateTripPlan = async (
+    request: TripPlanRequest,
+    onProgress?: (job: TripPlanJob) => void
+): Promise<TripPlan> => {
+    const idempotencyKey = newIdempotencyKey()
+    let job = await submitTripPlanJob(request, idempotencyKey)
+    while (job.status === 'queued' || job.status === 'running') {
+        onProgress?.(job)
+        try {
+            job = await getTripPlanJob(job.job_id, JOB_POLL_WAIT)
+        } catch (error) {
+            if (axios.isAxiosError(error) && error.response?.status === 404) throw error
+            // A dropped poll does not lose the job: wait briefly and poll again
+            console.warn('Polling trip plan job failed, retrying:', error)
+            await new Promise(resolve => setTimeout(resolve, 2000))
+        }
+    }
+    onProgress?.(job)
+    if (job.status === 'failed' || !job.result) {
+        throw new Error(job.error || 'Trip plan job failed')
+    }
+    return job.result
+}
+
+// Resolve photos for many POIs in one round trip: returns { name: photo_url }
+export const getPoiPhotos = async (names: string[], city: string): Promise<Record<string, string | null>> => {
+    const response = await api.post<{ success: boolean; data?: { photos: Record<string, string | null> }; error?: string }>(
+        '/poi/photos',
+        { names, city }
+    )
+    if (!response.data.success || !response.data.data) {
+        throw new Error(response.data.error || 'Failed to load photos')
+    }
+    return response.data.data.photos
+}
@@ -1,13 +1,37 @@
 import { defineStore } from 'pinia'
 import { ref } from 'vue'
-import type { TripPlan } from '../types'
+import type { DayPlan, TripPlan, TripPlanRequest } from '../types'
 
 export const useTripStore = defineStore('trip', () => {
     const tripPlan = ref<TripPlan | null>(null)
+    // True while days are still arriving from a running plan job
+    const streaming = ref(false)
 
     function setTripPlan(plan: TripPlan) {
         tripPlan.value = plan
+        streaming.value = false
     }
 
-    return { tripPlan, setTripPlan }
+    function startStreaming(request: TripPlanRequest) {
+        tripPlan.value = {
+            city: request.city,
+            start_date: request.start_date,
+            end_date: request.end_date,
+            days: [],
+            weather_info: [],
+            overall_suggestions: ''
+        }
+        streaming.value = true
+    }
+
+    function setDays(days: DayPlan[]) {
+        // The job reports every day generated so far, already sorted by day_index
+        if (tripPlan.value) tripPlan.value.days = days
+    }
+
+    function stopStreaming() {
+        streaming.value = false
+    }
+
+    return { tripPlan, streaming, setTripPlan, startStreaming, setDays, stopStreaming }
 })
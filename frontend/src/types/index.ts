@@ -84,3 +84,17 @@ export interface TripPlanRequest {
     transportation: string
     accommodation: string
 }
+
+export interface TripPlanJob {
+    job_id: string
+    status: 'queued' | 'running' | 'succeeded' | 'failed'
+    stage: string | null
+    request: TripPlanRequest
+    // Days generated so far, sorted by day_index; filled in before the job finishes
+    days: DayPlan[]
+    result: TripPlan | null
+    error: string | null
+    idempotency_key: string | null
+    created_at: number
+    updated_at: number
+}